@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -82,9 +86,76 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Transakcija odmah uzima write lock, pa istovremene narudžbine čekaju
+        # jedna drugu umesto da padnu na "database is locked" pri upisu.
+        # Čitanja rade u autocommit-u (nema ATOMIC_REQUESTS), pa ovo važi samo
+        # za transakcije koje ionako pišu. Zahteva Django 5.1+.
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # Testovi sa više niti trebaju pravu datoteku (deljena baza u memoriji
+        # zaključava celu tabelu i ne poštuje timeout); van stabla izvornog koda
+        'TEST': {'NAME': Path(tempfile.gettempdir()) / 'gvozdjara_test.sqlite3'},
+    }
+}
+
+
+# Cache
+# Za više worker-a koristiti deljeni keš, npr:
+# 'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+# 'LOCATION': 'redis://127.0.0.1:6379',
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+SHOP_CACHE_ALIAS = 'default'
+SHOP_CATALOG_CACHE_TIMEOUT = 300  # sekundi
+SHOP_ADMIN_STATS_CACHE_TIMEOUT = 30  # sekundi
+SHOP_PRECOMPUTED_CACHE_TIMEOUT = 24 * 60 * 60  # sekundi; ključevi su verzionisani
+SHOP_FEATURED_PRODUCTS_LIMIT = 12
+SHOP_FACET_PRICE_BUCKETS = 10
+SHOP_SEARCH_BACKEND = 'auto'  # 'fts5' (SQLite), 'memory' ili 'auto'
+SHOP_SEARCH_LIMIT = 500  # najviše rezultata pretrage po upitu (više: X-Search-Truncated)
+SHOP_SUGGEST_LIMIT = 5  # predloga po vrsti
+
+# Notifikacije: zahtev upisuje u outbox, šalje ih `manage.py process_outbox`
+SHOP_ORDER_NOTIFICATION_EMAILS = ['office@betapack.co.rs']
+SHOP_OUTBOX_MAX_ATTEMPTS = 8
+SHOP_OUTBOX_RETRY_DELAY = 30  # sekundi; udvostručuje se posle svakog neuspeha
+SHOP_OUTBOX_MAX_RETRY_DELAY = 60 * 60  # sekundi
+SHOP_OUTBOX_LEASE = 5 * 60  # sekundi; posle toga poruku može da preuzme drugi worker
+
+# Ponovljen POST /api/orders/ sa istim Idempotency-Key vraća prvi odgovor
+SHOP_IDEMPOTENCY_KEY_TTL = 24 * 60 * 60  # sekundi; istekle briše `manage.py purge_idempotency_keys`
+
+# Izveštaji prodaje (shop.reports) čitaju dnevne zbirove; najduži opseg po zahtevu
+SHOP_REPORT_MAX_DAYS = 366
+
+# Završene i otkazane narudžbine bez izmena ovoliko dana `manage.py archive_orders` premešta u arhivu
+SHOP_ARCHIVE_AFTER_DAYS = 180
+
+# SMS kupcu i vlasnicima (shop.sms); u produkciji 'shop.sms.HTTPGatewayBackend'
+SHOP_SMS_BACKEND = 'shop.sms.ConsoleBackend'
+SHOP_ORDER_NOTIFICATION_PHONES = []  # brojevi vlasnika
+# SMS kupcu posle promene statusa ({id}, {total}); za ostale statuse nema poruke
+SHOP_ORDER_STATUS_SMS = {
+    'confirmed': 'Vasa narudzbina #{id} je potvrdjena. Ukupno {total} RSD.',
+    'cancelled': 'Vasa narudzbina #{id} je otkazana.',
+}
+# Adresa i token gateway-a iz okruženja; bez njih HTTPGatewayBackend ne šalje
+SHOP_SMS_GATEWAY = {
+    'URL': os.environ.get('SHOP_SMS_GATEWAY_URL', ''),
+    'TOKEN': os.environ.get('SHOP_SMS_GATEWAY_TOKEN', ''),
+    'SENDER': 'Bravarija',
+    'BATCH_SIZE': 100,  # poruka po zahtevu
+    'RATE_LIMIT': 10,  # poruka u sekundi, za sve niti procesa
+    'TIMEOUT': 10,  # sekundi
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -139,8 +210,15 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'shop.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
+# Brza serijalizacija lista kataloga (shop.fastpath) umesto DRF serializera
+SHOP_FAST_SERIALIZATION = True
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=5),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
@@ -154,6 +232,10 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+
+CORS_EXPOSE_HEADERS = ['X-Search-Truncated']
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'  # ili drugi SMTP server
@@ -1,7 +1,8 @@
 from django.contrib import admin
+from django.utils import timezone
 from .models import (
     Category, Subcategory, Product, ProductVariant,
-    ProductImage, Order, OrderItem
+    ProductImage, Order, OrderItem, OutboxMessage, ArchivedOrder, ArchivedOrderItem
 )
 
 
@@ -28,6 +29,7 @@ class SubcategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'category', 'created_at']
     list_filter = ['category']
     search_fields = ['name', 'category__name']
+    list_select_related = ['category']
 
 
 @admin.register(Product)
@@ -35,6 +37,7 @@ class ProductAdmin(admin.ModelAdmin):
     list_display = ['name', 'category', 'subcategory', 'price', 'on_sale', 'sale_price', 'featured', 'in_stock']
     list_filter = ['category', 'on_sale', 'featured', 'in_stock']
     search_fields = ['name', 'description']
+    list_select_related = ['category', 'subcategory__category']
     inlines = [ProductVariantInline, ProductImageInline]
 
 
@@ -43,6 +46,7 @@ class ProductVariantAdmin(admin.ModelAdmin):
     list_display = ['product', 'name', 'price_adjustment', 'final_price', 'in_stock', 'stock_quantity']
     list_filter = ['product__category', 'in_stock']
     search_fields = ['product__name', 'name', 'sku']
+    list_select_related = ['product']
 
 
 @admin.register(ProductImage)
@@ -50,6 +54,7 @@ class ProductImageAdmin(admin.ModelAdmin):
     list_display = ['product', 'image', 'is_primary', 'order', 'created_at']
     list_filter = ['is_primary']
     search_fields = ['product__name', 'alt_text']
+    list_select_related = ['product']
 
 
 class OrderItemInline(admin.TabularInline):
@@ -85,3 +90,44 @@ class OrderAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    extra = 0
+    can_delete = False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """Arhiva je samo za čitanje; puni je komanda archive_orders"""
+    list_display = ['id', 'customer_name', 'customer_phone', 'status', 'total_amount', 'created_at', 'archived_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['customer_name', 'customer_phone', 'customer_email']
+    inlines = [ArchivedOrderItemInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'order', 'status', 'attempts', 'available_at', 'sent_at']
+    list_filter = ['status', 'kind']
+    readonly_fields = ['payload', 'attempts', 'last_error', 'locked_until', 'lock_token', 'created_at', 'sent_at']
+    actions = ['retry_now']
+
+    @admin.action(description='Pošalji ponovo odmah')
+    def retry_now(self, request, queryset):
+        queryset.exclude(status='sent').update(
+            status='pending', available_at=timezone.now(), locked_until=None, lock_token=''
+        )
@@ -0,0 +1,97 @@
+"""
+Arhiviranje starih narudžbina (ArchivedOrder, ArchivedOrderItem).
+
+Završene i otkazane narudžbine koje se nisu menjale SHOP_ARCHIVE_AFTER_DAYS
+dana premeštaju se iz shop_order/shop_orderitem u arhivske tabele, sa istim
+ID-jevima. Jedna serija je jedna transakcija (INSERT u arhivu, DELETE iz
+aktivnih tabela), pa prekid ne ostavlja narudžbinu napola premeštenu, a
+ponovno pokretanje nastavlja od preostalih. Dnevni zbirovi izveštaja se ne
+menjaju: arhivirana narudžbina ostaje u svom danu i statusu.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .cache import bump_version
+from .models import ArchivedOrder, ArchivedOrderItem, IdempotencyKey, Order, OrderItem, OutboxMessage
+
+STATUSES = ['completed', 'cancelled']
+BATCH_SIZE = 500  # narudžbina po transakciji
+
+ORDER_FIELDS = [field.attname for field in Order._meta.concrete_fields]
+ITEM_FIELDS = [field.attname for field in OrderItem._meta.concrete_fields]
+
+
+def cutoff(days=None):
+    if days is None:
+        days = getattr(settings, 'SHOP_ARCHIVE_AFTER_DAYS', 180)
+    return timezone.now() - timedelta(days=days)
+
+
+def candidates(before):
+    """Narudžbine za arhivu; one čije poruke još čekaju u outbox-u ostaju"""
+    pending = OutboxMessage.objects.filter(order=OuterRef('pk'), status='pending')
+    return Order.objects.filter(status__in=STATUSES, updated_at__lt=before).exclude(Exists(pending))
+
+
+def _delete_archived(after_id, last_id):
+    """
+    Briše iz aktivnih tabela narudžbine (after_id, last_id] koje su upravo
+    prepisane u arhivu: jedan DELETE po tabeli, bez učitavanja redova
+    """
+    qn = connection.ops.quote_name
+    archived = (
+        f'SELECT {qn("id")} FROM {qn(ArchivedOrder._meta.db_table)} '
+        f'WHERE {qn("id")} > %s AND {qn("id")} <= %s'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {qn(OrderItem._meta.db_table)} WHERE {qn("order_id")} IN ({archived})',
+            [after_id, last_id]
+        )
+        cursor.execute(
+            f'DELETE FROM {qn(Order._meta.db_table)} WHERE {qn("id")} IN ({archived})',
+            [after_id, last_id]
+        )
+
+
+def archive_batch(before, after_id=0, batch_size=BATCH_SIZE):
+    """
+    Premešta do batch_size narudžbina sa id > after_id, redom po ID-ju;
+    vraća (narudžbina, stavki, poslednji ID), a (0, 0, None) kada nema više
+    """
+    with transaction.atomic():
+        orders = list(
+            candidates(before).filter(id__gt=after_id).select_for_update()
+            .order_by('id').values(*ORDER_FIELDS)[:batch_size]
+        )
+        if not orders:
+            return 0, 0, None
+        ids = [row['id'] for row in orders]
+        items = list(OrderItem.objects.filter(order_id__in=ids).values(*ITEM_FIELDS))
+
+        ArchivedOrder.objects.bulk_create([ArchivedOrder(**row) for row in orders])
+        ArchivedOrderItem.objects.bulk_create([ArchivedOrderItem(**row) for row in items])
+
+        # on_delete=SET_NULL, ručno jer se brisanje ispod radi mimo Collector-a
+        OutboxMessage.objects.filter(order_id__in=ids).update(order=None)
+        IdempotencyKey.objects.filter(order_id__in=ids).update(order=None)
+        _delete_archived(after_id, ids[-1])
+        # Umesto post_delete signala, koje delete() šalje red po red
+        bump_version('orders')
+    return len(orders), len(items), ids[-1]
+
+
+def archive(before, batch_size=BATCH_SIZE, max_batches=None):
+    """Serije jednu po jednu (svaka u svojoj transakciji); daje rezultat archive_batch za svaku"""
+    after_id = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        orders, items, after_id = archive_batch(before, after_id, batch_size)
+        if not orders:
+            return
+        batches += 1
+        yield orders, items, after_id
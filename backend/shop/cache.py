@@ -0,0 +1,220 @@
+"""
+Verzionisani keš kataloga. Signali (shop.signals) podižu verziju pri svakoj
+izmeni, pa stari ključevi više nisu dostupni i sami ističu.
+"""
+import datetime
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+KEY_PREFIX = 'shop'
+
+
+def get_cache():
+    return caches[getattr(settings, 'SHOP_CACHE_ALIAS', 'default')]
+
+
+def _version_key(namespace):
+    return f'{KEY_PREFIX}:version:{namespace}'
+
+
+def get_version(namespace='catalog'):
+    cache = get_cache()
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        # Početna vrednost je vreme u ms, da se posle izbacivanja ključa
+        # nikad ne vrati neka ranije korišćena verzija
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _incr(key, initial):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, initial, timeout=None)
+
+
+def _touch(namespace):
+    cache = get_cache()
+    cache.set(f'{KEY_PREFIX}:bumped:{namespace}', int(time.time()), timeout=None)
+    _incr(_version_key(namespace), int(time.time() * 1000))
+
+
+def bump_version(namespace='catalog'):
+    """
+    Podiže verziju odmah (da proces vidi svoje izmene) i još jednom posle
+    commit-a, da se odbaci sve što su drugi zahtevi keširali u međuvremenu.
+    """
+    _touch(namespace)
+    transaction.on_commit(lambda: _touch(namespace))
+
+
+def _max_updated_at(models):
+    """Najnoviji updated_at iz svih tabela, jednim upitom"""
+    qn = connection.ops.quote_name
+    union = ' UNION ALL '.join(
+        f'SELECT MAX({qn("updated_at")}) AS ts FROM {qn(model._meta.db_table)}'
+        for model in models
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT MAX(ts) FROM ({union}) AS t')
+        value = cursor.fetchone()[0]
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        # SQLite vraća tekst za agregat nad datetime kolonom
+        value = parse_datetime(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, datetime.timezone.utc)
+    return int(value.timestamp())
+
+
+def get_last_modified(namespace='catalog'):
+    """
+    Vreme poslednje izmene kataloga (unix sekunde). Računa se iz updated_at
+    kolona jednom po verziji; vreme poslednjeg bump-a pokriva brisanja.
+    """
+    from .signals import CATALOG_MODELS
+
+    cache = get_cache()
+    key = f'{KEY_PREFIX}:modified:{namespace}:{get_version(namespace)}'
+    modified = cache.get(key)
+    if modified is None:
+        bumped = cache.get(f'{KEY_PREFIX}:bumped:{namespace}') or 0
+        modified = max(_max_updated_at(CATALOG_MODELS), bumped)
+        cache.set(key, modified, timeout=None)
+    return modified
+
+
+def record_hit(hit):
+    _incr(f'{KEY_PREFIX}:stats:{"hits" if hit else "misses"}', 1)
+
+
+def cache_stats():
+    cache = get_cache()
+    hits = cache.get(f'{KEY_PREFIX}:stats:hits') or 0
+    misses = cache.get(f'{KEY_PREFIX}:stats:misses') or 0
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else None,
+        'catalog_version': get_version('catalog'),
+    }
+
+
+def precomputed_key(name, namespace='catalog'):
+    return f'{KEY_PREFIX}:precomputed:{name}:{get_version(namespace)}'
+
+
+def get_precomputed(key, builder):
+    """
+    Podaci koji žive do sledeće izmene namespace-a: ključ sadrži verziju,
+    pa se builder poziva samo posle izmene (ili izbacivanja iz keša)
+    """
+    cache = get_cache()
+    data = cache.get(key)
+    if data is None:
+        data = builder()
+        cache.set(key, data, getattr(settings, 'SHOP_PRECOMPUTED_CACHE_TIMEOUT', 24 * 60 * 60))
+    return data
+
+
+def make_cache_key(namespace, *parts, params=None):
+    """Ključ = namespace + verzija + normalizovani query parametri"""
+    normalized = []
+    if params is not None:
+        normalized = sorted(
+            (key, sorted(v for v in values if v != ''))
+            for key, values in params.lists()
+        )
+        normalized = [(key, values) for key, values in normalized if values]
+    raw = repr((parts, normalized)).encode()
+    digest = hashlib.sha1(raw).hexdigest()
+    return f'{KEY_PREFIX}:{namespace}:{get_version(namespace)}:{digest}'
+
+
+class CatalogCacheMixin:
+    """
+    Kešira odgovore list/retrieve akcija kataloških ViewSet-ova.
+    Keširaju se već serijalizovani podaci (response.data), ne model instance.
+    """
+    cache_namespace = 'catalog'
+
+    def get_cache_timeout(self):
+        return getattr(settings, 'SHOP_CATALOG_CACHE_TIMEOUT', 300)
+
+    def get_cache_key(self, request, **kwargs):
+        return make_cache_key(
+            self.cache_namespace,
+            self.basename, self.action, request.get_host(), sorted(kwargs.items()),
+            params=request.query_params
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        cache = get_cache()
+        key = self.get_cache_key(request, **kwargs)
+
+        # Conditional GET pre bilo kakve serijalizacije
+        etag = quote_etag(hashlib.sha1(key.encode()).hexdigest())
+        last_modified = get_last_modified(self.cache_namespace)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        data = cache.get(key)
+        if data is not None:
+            record_hit(True)
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+        else:
+            record_hit(False)
+            response = handler(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, self.get_cache_timeout())
+            response['X-Cache'] = 'MISS'
+
+        if response.status_code == 200:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def precomputed_response(self, request, name, builder, namespace=None, finalize=None):
+        """
+        Odgovor iz unapred izračunatih podataka; ETag zavisi samo od verzije.
+        finalize(data, request) dodaje ono što zavisi od zahteva (npr. host u URL-ovima).
+        """
+        key = precomputed_key(name, namespace or self.cache_namespace)
+        etag = quote_etag(hashlib.sha1(key.encode()).hexdigest())
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        data = get_precomputed(key, builder)
+        if finalize is not None:
+            data = finalize(data, request)
+        response = Response(data)
+        response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(self.build_list_response, request, *args, **kwargs)
+
+    def build_list_response(self, request, *args, **kwargs):
+        """Odgovor liste bez keša; ViewSet-ovi ga mogu zameniti bržom putanjom"""
+        return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,112 @@
+"""
+Izvoz narudžbina i stavki (CSV ili JSON Lines) za knjigovodstvo.
+
+Redovi se čitaju sa iterator() (fetchmany u serijama, bez keša QuerySet-a i
+bez instanci modela) i kodiraju odmah u delove od po nekoliko stotina redova,
+pa memorija ne raste sa brojem redova. Isti generator koriste endpoint
+(StreamingHttpResponse) i komanda export_orders.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+try:
+    import orjson
+except ImportError:  # orjson je opciona zavisnost
+    orjson = None
+
+# (kolona, polje za values_list)
+ORDER_COLUMNS = [
+    ('id', 'id'),
+    ('created_at', 'created_at'),
+    ('status', 'status'),
+    ('customer_name', 'customer_name'),
+    ('customer_phone', 'customer_phone'),
+    ('customer_email', 'customer_email'),
+    ('delivery_address', 'delivery_address'),
+    ('notes', 'notes'),
+    ('total_amount', 'total_amount'),
+    ('email_sent', 'email_sent'),
+    ('sms_sent', 'sms_sent'),
+]
+ITEM_COLUMNS = [
+    ('order_id', 'order_id'),
+    ('order_created_at', 'order__created_at'),
+    ('order_status', 'order__status'),
+    ('customer_name', 'order__customer_name'),
+    ('item_id', 'id'),
+    ('product_id', 'product_id'),
+    ('variant_id', 'variant_id'),
+    ('product_name', 'product_name'),
+    ('variant_name', 'variant_name'),
+    ('quantity', 'quantity'),
+    ('unit_price', 'unit_price'),
+    ('total_price', 'total_price'),
+]
+TABLES = {'orders': ORDER_COLUMNS, 'items': ITEM_COLUMNS}
+FORMATS = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson'}
+
+CHUNK_SIZE = 2000  # redova po fetchmany
+WRITE_SIZE = 500  # redova po delu izlaza
+
+
+def rows(orders, table='orders', chunk_size=CHUNK_SIZE):
+    """
+    Torke vrednosti redom kao kolone; orders je (filtriran) QuerySet
+    narudžbina, aktivnih ili arhiviranih
+    """
+    fields = [field for _, field in TABLES[table]]
+    if table == 'items':
+        # Stavke jednim upitom (JOIN na narudžbinu), redom po narudžbini
+        item_model = orders.model.items.field.model
+        queryset = item_model.objects.filter(order__in=orders.values('id')).order_by('order_id', 'id')
+    else:
+        queryset = orders.order_by('id')
+    return queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def encode_csv(header, values):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # Excel prepoznaje UTF-8 (č, ć, š...) samo uz BOM
+    buffer.write('\ufeff')
+    writer.writerow(header)
+    for n, row in enumerate(values, start=1):
+        writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+        if n % WRITE_SIZE == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def encode_jsonl(header, values):
+    if orjson is not None:
+        # Decimal kao string, kao u API-ju; datetime orjson formatira sam
+        default = DjangoJSONEncoder().default
+        dumps = lambda obj: orjson.dumps(obj, default=default)  # noqa: E731
+    else:
+        dumps = lambda obj: json.dumps(obj, cls=DjangoJSONEncoder, ensure_ascii=False).encode()  # noqa: E731
+    lines = []
+    for row in values:
+        lines.append(dumps(dict(zip(header, row))))
+        if len(lines) == WRITE_SIZE:
+            yield b'\n'.join(lines) + b'\n'
+            lines = []
+    if lines:
+        yield b'\n'.join(lines) + b'\n'
+
+
+def stream(orders, table='orders', fmt='csv', chunk_size=CHUNK_SIZE):
+    """Bajtovi izvoza, deo po deo"""
+    header = [column for column, _ in TABLES[table]]
+    encode = encode_csv if fmt == 'csv' else encode_jsonl
+    return encode(header, rows(orders, table, chunk_size))
+
+
+def filename(table, fmt):
+    return f'narudzbine-{table}-{timezone.localdate():%Y-%m-%d}.{fmt}'
@@ -0,0 +1,95 @@
+"""
+Facet brojači za sidebar prodavnice, nad istim filterima kao lista proizvoda.
+Sve se računa u dva agregatna upita: sažetak (broj, akcija, lager, raspon
+cena) i GROUP BY po kategoriji, potkategoriji i razredu cene. Python prolazi
+samo kroz grupe, nikad kroz proizvode.
+"""
+from decimal import Decimal, ROUND_FLOOR
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Count, F, Max, Min, Q, Value
+from django.db.models.functions import Floor, Round
+
+from .fastpath import decimal_str
+
+CENT = Decimal('0.01')
+
+
+def bucket_width(low, high, buckets):
+    """Zaokružena širina razreda (1, 2 ili 5 × 10^n) tako da raspon stane u ~buckets razreda"""
+    span = (high - low) / buckets
+    if span <= CENT:
+        return CENT if span > 0 else Decimal(1)
+    base = Decimal(1).scaleb(span.adjusted())
+    for step in (1, 2, 5, 10):
+        if base * step >= span:
+            return base * step
+
+
+def compute_facets(queryset, buckets=None):
+    """queryset: proizvodi, već filtrirani"""
+    buckets = buckets or getattr(settings, 'SHOP_FACET_PRICE_BUCKETS', 10)
+    queryset = queryset.order_by()
+
+    summary = queryset.aggregate(
+        count=Count('id'),
+        on_sale=Count('id', filter=Q(on_sale=True)),
+        in_stock=Count('id', filter=Q(in_stock=True)),
+        min_price=Min('effective_price'),
+        max_price=Max('effective_price'),
+    )
+    facets = {
+        'count': summary['count'],
+        'on_sale': summary['on_sale'],
+        'in_stock': summary['in_stock'],
+        'categories': [],
+        'subcategories': [],
+        'price': {'min': None, 'max': None, 'buckets': []},
+    }
+    if not summary['count']:
+        return facets
+
+    low, high = Decimal(str(summary['min_price'])), Decimal(str(summary['max_price']))
+    width = bucket_width(low, high, buckets)
+    low = (low / width).to_integral_value(rounding=ROUND_FLOOR) * width
+    count = int((high - low) // width) + 1
+
+    # Razred se računa u celim parama, da SQLite float deljenje ne promaši granicu
+    cents = Round(F('effective_price') * 100, output_field=models.IntegerField())
+    price_bucket = Floor(
+        (cents - Value(int(low * 100))) / Value(int(width * 100)),
+        output_field=models.IntegerField()
+    )
+    rows = queryset.annotate(price_bucket=price_bucket).values(
+        'category_id', 'category__name', 'subcategory_id', 'subcategory__name', 'price_bucket'
+    ).annotate(count=Count('id'))
+
+    categories = {}
+    subcategories = {}
+    histogram = [0] * count
+    for row in rows:
+        category = categories.setdefault(
+            row['category_id'],
+            {'id': row['category_id'], 'name': row['category__name'], 'count': 0}
+        )
+        category['count'] += row['count']
+        if row['subcategory_id'] is not None:
+            subcategory = subcategories.setdefault(row['subcategory_id'], {
+                'id': row['subcategory_id'], 'name': row['subcategory__name'],
+                'category': row['category_id'], 'count': 0,
+            })
+            subcategory['count'] += row['count']
+        histogram[min(max(int(row['price_bucket']), 0), count - 1)] += row['count']
+
+    facets['categories'] = sorted(categories.values(), key=lambda c: c['name'])
+    facets['subcategories'] = sorted(subcategories.values(), key=lambda s: s['name'])
+    facets['price'] = {
+        'min': decimal_str(summary['min_price']),
+        'max': decimal_str(summary['max_price']),
+        'buckets': [
+            {'min': decimal_str(low + i * width), 'max': decimal_str(low + (i + 1) * width), 'count': n}
+            for i, n in enumerate(histogram)
+        ],
+    }
+    return facets
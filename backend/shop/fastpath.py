@@ -0,0 +1,233 @@
+"""
+Brza read-only serijalizacija za liste kataloga.
+
+Gradi isti izlaz kao ProductListSerializer / CategorySerializer, ali direktno
+iz .values() redova: bez model instanci i bez prolaska kroz DRF polja za
+svaki atribut. Varijante i slike se čitaju jednim upitom po tabeli, a cene
+se računaju iz anotirane efektivne cene proizvoda.
+"""
+import decimal
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils.encoding import filepath_to_uri
+from rest_framework import serializers
+
+from .models import Subcategory, ProductVariant, ProductImage
+
+# DRF polje koristimo kao formater, da izlaz bude identičan
+_datetime = serializers.DateTimeField()
+
+# Isto zaokruživanje kao serializers.DecimalField(max_digits=10, decimal_places=2)
+_TWO_PLACES = decimal.Decimal('0.01')
+_DECIMAL_CONTEXT = decimal.Context(prec=10, rounding=decimal.ROUND_HALF_EVEN)
+
+# Polje u izlazu -> kolona/anotacija u .values()
+PRODUCT_COLUMNS = {
+    'id': 'id',
+    'name': 'name',
+    'description': 'description',
+    'price': 'price',
+    'on_sale': 'on_sale',
+    'sale_price': 'sale_price',
+    'category': 'category_id',
+    'category_name': 'category__name',
+    'subcategory': 'subcategory_id',
+    'subcategory_name': 'subcategory__name',
+    'current_price': 'effective_price',
+    'featured': 'featured',
+    'in_stock': 'in_stock',
+    'stock_quantity': 'stock_quantity',
+    'primary_image': 'primary_image',
+    'variant_count': 'variant_count',
+    'min_final_price': 'min_final_price',
+    'max_final_price': 'max_final_price',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+
+DECIMAL_FIELDS = {'price', 'sale_price', 'current_price', 'min_final_price', 'max_final_price'}
+DATETIME_FIELDS = {'created_at', 'updated_at'}
+
+
+def is_enabled():
+    return getattr(settings, 'SHOP_FAST_SERIALIZATION', True)
+
+
+def decimal_str(value):
+    if value is None:
+        return None
+    if not isinstance(value, decimal.Decimal):
+        value = decimal.Decimal(str(value).strip())
+    return f'{value.quantize(_TWO_PLACES, context=_DECIMAL_CONTEXT):f}'
+
+
+def datetime_str(value):
+    return None if value is None else _datetime.to_representation(value)
+
+
+class MediaURL:
+    """Apsolutni URL slike, isto kao serializers.ImageField sa request-om"""
+
+    def __init__(self, request):
+        self.request = request
+        self.host = request.build_absolute_uri('/')[:-1] if request is not None else None
+        # FileSystemStorage.url() je urljoin(base_url, ime); za obična imena to je spajanje
+        self.base_url = None
+        if isinstance(default_storage, FileSystemStorage) and default_storage.base_url.endswith('/'):
+            self.base_url = default_storage.base_url
+
+    def __call__(self, name):
+        if not name:
+            return None
+        if self.base_url is not None and '..' not in name and '//' not in name:
+            url = self.base_url + filepath_to_uri(name).lstrip('/')
+        else:
+            url = default_storage.url(name)
+        return self.absolute(url)
+
+    def absolute(self, url):
+        """URL iz storage-a (/media/...) -> apsolutni za ovaj zahtev"""
+        if self.request is None or url is None:
+            return url
+        if url.startswith('/') and not url.startswith('//'):
+            return self.host + url
+        return self.request.build_absolute_uri(url)
+
+
+def absolute_media(products, request):
+    """
+    Proizvodi iz serialize_products() bez request-a (unapred izračunati
+    podaci), sa URL-ovima slika apsolutnim za ovaj zahtev, kao u listi
+    """
+    absolute = MediaURL(request).absolute
+    data = []
+    for product in products:
+        product = dict(product)
+        if 'primary_image' in product:
+            product['primary_image'] = absolute(product['primary_image'])
+        if 'images' in product:
+            product['images'] = [{**image, 'image': absolute(image['image'])} for image in product['images']]
+        data.append(product)
+    return data
+
+
+def product_columns(field_names):
+    """Kolone za .values(); id i created_at trebaju i za keyset cursor"""
+    columns = {'id', 'created_at'}
+    columns.update(PRODUCT_COLUMNS[name] for name in field_names if name in PRODUCT_COLUMNS)
+    if 'subcategory_name' in field_names:
+        columns.add('subcategory_id')
+    return sorted(columns)
+
+
+def _variants_by_product(product_ids):
+    grouped = defaultdict(list)
+    rows = ProductVariant.objects.filter(product_id__in=product_ids).order_by(
+        'product_id', *ProductVariant._meta.ordering
+    ).values(
+        'id', 'product_id', 'name', 'price_adjustment', 'effective_price', 'sku',
+        'in_stock', 'stock_quantity', 'created_at'
+    )
+    for row in rows:
+        grouped[row['product_id']].append({
+            'id': row['id'],
+            'name': row['name'],
+            'price_adjustment': decimal_str(row['price_adjustment']),
+            'final_price': decimal_str(row['effective_price']),
+            'sku': row['sku'],
+            'in_stock': row['in_stock'],
+            'stock_quantity': row['stock_quantity'],
+            'created_at': datetime_str(row['created_at']),
+        })
+    return grouped
+
+
+def _images_by_product(product_ids, media_url):
+    grouped = defaultdict(list)
+    rows = ProductImage.objects.filter(product_id__in=product_ids).order_by(
+        'product_id', *ProductImage._meta.ordering
+    ).values('id', 'product_id', 'image', 'alt_text', 'is_primary', 'order', 'created_at')
+    for row in rows:
+        grouped[row['product_id']].append({
+            'id': row['id'],
+            'image': media_url(row['image']),
+            'alt_text': row['alt_text'],
+            'is_primary': row['is_primary'],
+            'order': row['order'],
+            'created_at': datetime_str(row['created_at']),
+        })
+    return grouped
+
+
+def serialize_products(rows, field_names, request=None):
+    """
+    rows: .values(*product_columns(field_names)) redovi, već filtrirani,
+    sortirani i paginirani. field_names: polja serializera za ovaj zahtev.
+    """
+    rows = list(rows)
+    product_ids = [row['id'] for row in rows]
+    media_url = MediaURL(request)
+
+    variants = images = None
+    if 'variants' in field_names:
+        variants = _variants_by_product(product_ids)
+    if 'images' in field_names:
+        images = _images_by_product(product_ids, media_url)
+
+    data = []
+    for row in rows:
+        item = {}
+        for name in field_names:
+            if name == 'variants':
+                item[name] = variants.get(row['id'], [])
+            elif name == 'images':
+                item[name] = images.get(row['id'], [])
+            elif name == 'primary_image':
+                item[name] = media_url(row['primary_image'])
+            elif name == 'subcategory_name':
+                # DRF preskače polje kada proizvod nema potkategoriju
+                if row['subcategory_id'] is not None:
+                    item[name] = row['subcategory__name']
+            elif name in DECIMAL_FIELDS:
+                item[name] = decimal_str(row[PRODUCT_COLUMNS[name]])
+            elif name in DATETIME_FIELDS:
+                item[name] = datetime_str(row[PRODUCT_COLUMNS[name]])
+            else:
+                item[name] = row[PRODUCT_COLUMNS[name]]
+        data.append(item)
+    return data
+
+
+def serialize_categories(queryset):
+    """Isti izlaz kao CategorySerializer(many=True); queryset anotiran sa product_count"""
+    rows = list(queryset.values('id', 'name', 'description', 'product_count', 'created_at'))
+
+    subcategories = defaultdict(list)
+    sub_rows = Subcategory.objects.filter(
+        category_id__in=[row['id'] for row in rows]
+    ).order_by(*Subcategory._meta.ordering).values(
+        'id', 'name', 'description', 'category_id', 'category__name', 'created_at'
+    )
+    for row in sub_rows:
+        subcategories[row['category_id']].append({
+            'id': row['id'],
+            'name': row['name'],
+            'description': row['description'],
+            'category': row['category_id'],
+            'category_name': row['category__name'],
+            'created_at': datetime_str(row['created_at']),
+        })
+
+    return [
+        {
+            'id': row['id'],
+            'name': row['name'],
+            'description': row['description'],
+            'subcategories': subcategories.get(row['id'], []),
+            'product_count': row['product_count'],
+            'created_at': datetime_str(row['created_at']),
+        }
+        for row in rows
+    ]
@@ -0,0 +1,219 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import CharField, Q, Value
+from django.db.models.functions import Cast, Concat, StrIndex
+from django.utils import timezone
+from rest_framework import filters, serializers
+
+from . import search
+from .models import Order, phone_search_key
+
+MAX_BATCH_IDS = 100
+
+
+def parse_id_list(value, param, max_ids=MAX_BATCH_IDS):
+    """'1,2,3' -> [1, 2, 3] (bez duplikata, redosled sačuvan); None ako parametar nije poslat"""
+    if value is None or value == '':
+        return None
+    try:
+        ids = list(dict.fromkeys(int(part) for part in value.split(',') if part.strip()))
+    except ValueError:
+        raise serializers.ValidationError({param: 'Očekuje se lista ID-jeva odvojenih zarezom.'})
+    if len(ids) > max_ids:
+        raise serializers.ValidationError({param: f'Najviše {max_ids} ID-jeva po zahtevu.'})
+    return ids
+
+
+class ProductFilterSerializer(serializers.Serializer):
+    """
+    Validacija query parametara za listu proizvoda
+    """
+    ids = serializers.CharField(required=False)
+    category = serializers.IntegerField(required=False, min_value=1)
+    subcategory = serializers.IntegerField(required=False, min_value=1)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    on_sale = serializers.BooleanField(required=False)
+    featured = serializers.BooleanField(required=False)
+    in_stock = serializers.BooleanField(required=False)
+
+    def validate(self, attrs):
+        min_price = attrs.get('min_price')
+        max_price = attrs.get('max_price')
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise serializers.ValidationError("min_price ne može biti veći od max_price.")
+        return attrs
+
+
+class ProductFilterBackend(filters.BaseFilterBackend):
+    """
+    Filtriranje proizvoda u bazi (kategorija, potkategorija, cena, flagovi)
+    """
+    boolean_fields = ['on_sale', 'featured', 'in_stock']
+
+    def filter_queryset(self, request, queryset, view):
+        params = {
+            key: value for key, value in request.query_params.items()
+            if key in ProductFilterSerializer._declared_fields and value != ''
+        }
+        serializer = ProductFilterSerializer(data=params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        ids = parse_id_list(data.get('ids'), 'ids')
+        if ids is not None:
+            queryset = queryset.filter(id__in=ids)
+        if 'category' in data:
+            queryset = queryset.filter(category_id=data['category'])
+        if 'subcategory' in data:
+            queryset = queryset.filter(subcategory_id=data['subcategory'])
+
+        for field in self.boolean_fields:
+            if field in data:
+                queryset = queryset.filter(**{field: data[field]})
+
+        # Cena se filtrira po efektivnoj ceni (akcijska ako postoji)
+        if 'min_price' in data:
+            queryset = queryset.filter(effective_price__gte=data['min_price'])
+        if 'max_price' in data:
+            queryset = queryset.filter(effective_price__lte=data['max_price'])
+
+        return queryset
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    ?search= preko indeksa pretrage (shop.search): bez dijakritika, sa
+    prefiksima i padežima. Anotira search_rank (manji = relevantniji).
+    Ulaze samo SHOP_SEARCH_LIMIT najrelevantnijih proizvoda, i pre filtera i
+    sortiranja; ProductViewSet tada šalje X-Search-Truncated.
+    """
+
+    def get_query(self, request):
+        return request.query_params.get(self.search_param, '').replace('\x00', '')
+
+    def filter_queryset(self, request, queryset, view):
+        query = self.get_query(request)
+        if not search.query_terms(query):
+            return queryset
+        ranked = [pk for pk, score in search.search(query)]
+        # Rang = pozicija ID-ja u ",3,17,5," (jedan parametar umesto CASE sa stotinama grana)
+        positions = ',' + ','.join(map(str, ranked)) + ','
+        return queryset.filter(id__in=ranked).annotate(search_rank=StrIndex(
+            Value(positions), Concat(Value(','), Cast('id', CharField()), Value(','))
+        ))
+
+
+class ProductOrderingFilter(filters.OrderingFilter):
+    """
+    OrderingFilter koji prihvata current_price kao alias za kolonu effective_price.
+    Rezultati pretrage bez ?ordering idu po relevantnosti.
+    """
+    ordering_aliases = {'current_price': 'effective_price'}
+
+    def get_ordering(self, request, queryset, view):
+        params = request.query_params.get(self.ordering_param)
+        if params:
+            fields = []
+            for param in params.split(','):
+                param = param.strip()
+                prefix = '-' if param.startswith('-') else ''
+                name = param.lstrip('-')
+                fields.append(prefix + self.ordering_aliases.get(name, name))
+            ordering = self.remove_invalid_fields(queryset, fields, view, request)
+            if ordering:
+                # Stabilan redosled kada više proizvoda ima istu vrednost
+                return ordering + ['-id']
+        if 'search_rank' in queryset.query.annotations:
+            return ['search_rank']
+        return self.get_default_ordering(view)
+
+
+class OrderFilterSerializer(serializers.Serializer):
+    """
+    Validacija query parametara za listu narudžbina (admin)
+    """
+    status = serializers.CharField(required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    phone = serializers.CharField(required=False)
+    search = serializers.CharField(required=False)
+
+    def validate_status(self, value):
+        statuses = [part.strip() for part in value.split(',') if part.strip()]
+        invalid = set(statuses) - set(dict(Order.STATUS_CHOICES))
+        if invalid:
+            raise serializers.ValidationError(f"Nepoznat status: {', '.join(sorted(invalid))}.")
+        return statuses
+
+    def validate(self, attrs):
+        if 'date_from' in attrs and 'date_to' in attrs and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError("date_from ne može biti posle date_to.")
+        return attrs
+
+
+def day_start(date):
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+def phone_prefix_filter(value):
+    """
+    Početak broja kao opseg nad customer_phone_digits (indeks), ne LIKE:
+    '064 12' -> '6412' <= broj < '6413'. None ako nema cifara.
+    """
+    key = phone_search_key(value)
+    if not key:
+        return None
+    # Cifre su uzastopni znakovi, pa je gornja granica prefiks sa uvećanim poslednjim znakom
+    upper = key[:-1] + chr(ord(key[-1]) + 1)
+    return Q(customer_phone_digits__gte=key, customer_phone_digits__lt=upper)
+
+
+def order_search_condition(term):
+    if term.startswith('#') and term[1:].isdigit():
+        return Q(id=int(term[1:]))
+    if term.lstrip('+').replace(' ', '').replace('-', '').replace('/', '').isdigit():
+        return phone_prefix_filter(term) or Q(pk__in=[])
+    return Q(customer_name__icontains=term) | Q(customer_email__icontains=term)
+
+
+def filter_orders(queryset, params):
+    """
+    Filtriranje narudžbina po parametrima iz OrderFilterSerializer-a; prazne
+    vrednosti se ignorišu, neispravne podižu ValidationError. Koriste ga lista
+    i izvoz (API i komanda).
+    """
+    params = {
+        key: value for key, value in params.items()
+        if key in OrderFilterSerializer._declared_fields and value is not None and str(value).strip() != ''
+    }
+    serializer = OrderFilterSerializer(data=params)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+
+    if data.get('status'):
+        queryset = queryset.filter(status__in=data['status'])
+    # Granice dana kao opseg nad created_at, da se koristi indeks
+    if 'date_from' in data:
+        queryset = queryset.filter(created_at__gte=day_start(data['date_from']))
+    if 'date_to' in data:
+        queryset = queryset.filter(created_at__lt=day_start(data['date_to'] + timedelta(days=1)))
+
+    if 'phone' in data:
+        condition = phone_prefix_filter(data['phone'])
+        queryset = queryset.filter(condition) if condition else queryset.none()
+
+    if 'search' in data:
+        queryset = queryset.filter(order_search_condition(data['search'].strip()))
+    return queryset
+
+
+class OrderFilterBackend(filters.BaseFilterBackend):
+    """
+    Filtriranje narudžbina: ?status=pending,confirmed, ?date_from / ?date_to
+    (YYYY-MM-DD, uključivo), ?phone= (početak broja u bilo kom zapisu) i
+    ?search= (ime ili email kupca; broj sa # je ID narudžbine, samo cifre su telefon)
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        return filter_orders(queryset, request.query_params)
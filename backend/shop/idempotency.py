@@ -0,0 +1,96 @@
+"""
+Idempotentno kreiranje narudžbina (zaglavlje Idempotency-Key).
+
+Ključ se upisuje kao prvi red u transakciji koja kreira narudžbinu, a
+odgovor se čuva uz njega pre commit-a. Unique indeks na ključu spaja
+istovremene duplikate: drugi zahtev čeka na indeksu dok prvi ne završi,
+dobija IntegrityError i vraća sačuvani odgovor. Ako kreiranje ne uspe
+(npr. 400), ključ se vraća zajedno sa narudžbinom i može se ponovo koristiti.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def fingerprint(data):
+    body = json.dumps(data, sort_keys=True, separators=(',', ':'), cls=DjangoJSONEncoder)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def replay(record, digest):
+    if record.fingerprint != digest:
+        return Response(
+            {'error': f'{HEADER} je već iskorišćen za drugačiji zahtev.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    return Response(record.response, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+def lookup(key):
+    """Važeći zapis za ključ ili None; istekli zapis se briše, pa se ključ može ponovo koristiti"""
+    record = IdempotencyKey.objects.filter(key=key).first()
+    if record is not None and record.expires_at <= timezone.now():
+        IdempotencyKey.objects.filter(id=record.id).delete()
+        return None
+    return record
+
+
+def run(request, handler):
+    """
+    handler(request) -> (Response, order). Bez zaglavlja samo poziva handler;
+    sa zaglavljem vraća sačuvani odgovor ili kreira i pamti novi.
+    """
+    key = request.headers.get(HEADER)
+    if key is None:
+        return handler(request)[0]
+    if not 0 < len(key) <= MAX_LENGTH:
+        raise ValidationError({HEADER: f'Ključ mora imati 1 do {MAX_LENGTH} znakova.'})
+
+    digest = fingerprint(request.data)
+    record = lookup(key)
+    if record is not None:
+        return replay(record, digest)
+
+    ttl = timedelta(seconds=getattr(settings, 'SHOP_IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                key=key, fingerprint=digest, expires_at=timezone.now() + ttl
+            )
+            response, order = handler(request)
+            record.order = order
+            record.status_code = response.status_code
+            record.response = response.data
+            record.save(update_fields=['order', 'status_code', 'response'])
+    except IntegrityError:
+        # Istovremeni duplikat je završio prvi
+        record = IdempotencyKey.objects.filter(key=key).first()
+        if record is None:
+            raise
+        return replay(record, digest)
+    return response
+
+
+def purge(batch_size=5000, now=None):
+    """Briše istekle ključeve u serijama (kratke transakcije); vraća broj obrisanih"""
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        # Bez kaskada i signala, pa je delete() jedan DELETE
+        deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,154 @@
+"""
+Zalihe pri narudžbinama.
+
+Stavka sa varijantom troši zalihu varijante, stavka bez varijante zalihu
+proizvoda. stock_quantity = 0 dok je in_stock uključen znači da se zaliha
+ne prati (neograničeno). Isto pravilo važi i za varijante, jer nova
+varijanta dobija stock_quantity = 0: postojeće varijante se prodaju kao i
+pre, a zaliha varijante se prati čim joj admin upiše količinu. Zaliha
+proizvoda se za stavke sa varijantom ne gleda. Kada prodaja spusti praćenu zalihu na 0, in_stock
+se isključuje u istom UPDATE-u, pa 0 posle prodaje znači "nema na stanju".
+Stavka to pamti (stock_sold_out), pa otkazivanje ponovo uključuje samo
+in_stock koji je isključila ta prodaja.
+
+Rezervacija je jedan uslovni UPDATE po tabeli za celu narudžbinu:
+WHERE stock_quantity >= tražena količina. Dve istovremene narudžbine ne mogu
+obe da uzmu poslednji komad; ona koja ne prođe uslov dobija grešku i njena
+transakcija se vraća.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from rest_framework import serializers
+
+from .cache import bump_version
+from .models import Product, ProductVariant
+
+
+def is_tracked(stock):
+    """Proizvod ili varijanta; 0 bez in_stock je rasprodato, ne neograničeno"""
+    return stock.stock_quantity > 0 or not stock.in_stock
+
+
+def check_available(stock, quantity):
+    """Provera nad već učitanim objektom (pre transakcije); konačna je u reserve()"""
+    if not stock.in_stock:
+        raise serializers.ValidationError({'items': f'{stock} trenutno nije na stanju.'})
+    if is_tracked(stock) and stock.stock_quantity < quantity:
+        raise serializers.ValidationError(
+            {'items': f'{stock}: na stanju je još {stock.stock_quantity} kom.'}
+        )
+
+
+def _quantity_case(quantities):
+    return Case(
+        *[When(id=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+        output_field=IntegerField()
+    )
+
+
+def _take(model, quantities):
+    """Uslovno skida zalihe; vraća ID-jeve za koje nije bilo dovoljno (tada ne skida ništa)"""
+    if not quantities:
+        return set()
+    wanted = _quantity_case(quantities)
+    available = model.objects.filter(id__in=quantities, in_stock=True, stock_quantity__gte=wanted)
+    # Savepoint: ako neki red ne prođe uslov, delimičan UPDATE se poništava,
+    # pa se redovi koji fale traže istim uslovom nad neizmenjenim zalihama
+    with transaction.atomic():
+        updated = available.update(
+            stock_quantity=F('stock_quantity') - wanted,
+            in_stock=Case(When(stock_quantity=wanted, then=Value(False)), default=F('in_stock')),
+            updated_at=timezone.now(),
+        )
+        if updated == len(quantities):
+            return set()
+        transaction.set_rollback(True)
+    # Retko (neko je u međuvremenu kupio); obrisan red takođe fali
+    return set(quantities) - set(available.values_list('id', flat=True))
+
+
+def _sold_out(model, quantities):
+    """
+    Redovi koje je upravo izvršena prodaja spustila na 0: pre nje su svi bili
+    na stanju, a u transakciji ih niko drugi ne menja
+    """
+    if not quantities:
+        return set()
+    return set(model.objects.filter(id__in=quantities, in_stock=False).values_list('id', flat=True))
+
+
+def _give_back(model, quantities, reopen):
+    if not quantities:
+        return
+    returned = _quantity_case(quantities)
+    # Ponovo na stanju samo ono što je isključila ova prodaja, i to ako je
+    # zaliha i dalje 0; ručno isključen proizvod ostaje isključen
+    in_stock = F('in_stock')
+    if reopen:
+        in_stock = Case(When(id__in=reopen, stock_quantity=0, then=Value(True)), default=in_stock)
+    model.objects.filter(id__in=quantities).update(
+        stock_quantity=F('stock_quantity') + returned,
+        in_stock=in_stock,
+        updated_at=timezone.now(),
+    )
+
+
+def reserve(items):
+    """
+    items: OrderItem objekti (sa učitanim product/variant), još nesnimljeni ili
+    snimljeni. Postavlja item.stock_reserved i item.stock_sold_out. Mora se
+    zvati u transakciji.
+    """
+    products, variants = Counter(), Counter()
+    for item in items:
+        stock = item.variant or item.product
+        item.stock_reserved = item.quantity if is_tracked(stock) else 0
+        if item.stock_reserved:
+            (variants if item.variant else products)[stock.id] += item.quantity
+
+    short, sold_out = {}, {}
+    for model, quantities in [(Product, products), (ProductVariant, variants)]:
+        missing = _take(model, quantities)
+        if missing:
+            short[model] = missing
+        elif not short:
+            sold_out[model] = _sold_out(model, quantities)
+    if short:
+        names = [
+            str(item.variant or item.product) for item in items
+            if (item.variant or item.product).id in short.get(type(item.variant or item.product), ())
+        ]
+        raise serializers.ValidationError(
+            {'items': f'Nema dovoljno na stanju: {", ".join(dict.fromkeys(names))}.'}
+        )
+
+    for item in items:
+        stock = item.variant or item.product
+        item.stock_sold_out = bool(item.stock_reserved) and stock.id in sold_out.get(type(stock), ())
+
+    # UPDATE zaobilazi signale; lager se vidi u katalogu
+    if products or variants:
+        bump_version('catalog')
+
+
+def release(items):
+    """Vraća rezervisane količine (otkazivanje); mora se zvati u transakciji"""
+    products, variants = Counter(), Counter()
+    reopen_products, reopen_variants = set(), set()
+    for item in items:
+        if item.stock_reserved:
+            if item.variant_id:
+                variants[item.variant_id] += item.stock_reserved
+                if item.stock_sold_out:
+                    reopen_variants.add(item.variant_id)
+            else:
+                products[item.product_id] += item.stock_reserved
+                if item.stock_sold_out:
+                    reopen_products.add(item.product_id)
+    _give_back(Product, products, reopen_products)
+    _give_back(ProductVariant, variants, reopen_variants)
+    if products or variants:
+        bump_version('catalog')
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import archive
+
+
+class Command(BaseCommand):
+    help = (
+        'Premešta završene i otkazane narudžbine starije od SHOP_ARCHIVE_AFTER_DAYS u arhivu '
+        '(pokretati periodično; prekinuto pokretanje se nastavlja sledećim)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Starije od ovoliko dana od poslednje izmene')
+        parser.add_argument('--batch', type=int, default=archive.BATCH_SIZE, help='Narudžbina po transakciji')
+        parser.add_argument('--max-batches', type=int, help='Stani posle ovoliko serija')
+        parser.add_argument('--dry-run', action='store_true', help='Samo prebroj narudžbine za arhivu')
+
+    def handle(self, *args, **options):
+        if options['days'] is not None and options['days'] < 0:
+            raise CommandError('--days ne može biti negativan')
+        if options['batch'] < 1:
+            raise CommandError('--batch mora biti pozitivan')
+        before = archive.cutoff(options['days'])
+
+        if options['dry_run']:
+            count = archive.candidates(before).count()
+            self.stdout.write(f'Za arhivu: {count} narudžbina (izmenjene pre {before:%Y-%m-%d %H:%M})')
+            return
+
+        total_orders = total_items = 0
+        for orders, items, last_id in archive.archive(before, options['batch'], options['max_batches']):
+            total_orders += orders
+            total_items += items
+            self.stdout.write(f'{orders} narudžbina, {items} stavki (do #{last_id})')
+        self.stdout.write(f'Arhivirano: {total_orders} narudžbina, {total_items} stavki')
@@ -0,0 +1,401 @@
+import logging
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F, Max, Min
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from shop import reports, search, suggest
+from shop.models import (
+    Category, Subcategory, Product, ProductVariant, ProductImage, Order, OrderItem, OutboxMessage
+)
+from shop.pagination import KeysetPagination
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Merenje performansi API-ja nad privremeno generisanim podacima (vraćaju se rollback-om). '
+        'Scenario checkout commit-uje narudžbine u podešenu bazu i posle ih briše, pa se pokreće '
+        'samo uz --allow-commit, nad posebnom (test) bazom'
+    )
+
+    scenarios = ['pagination', 'serialization', 'facets', 'prices', 'search', 'suggest', 'checkout', 'export', 'reports']
+    # Niti ne vide podatke iz tuđe transakcije; ovi scenariji commit-uju i sami brišu svoje podatke
+    committed = {'checkout'}
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=self.scenarios)
+        parser.add_argument('--size', type=int, nargs='+', default=[25000], help='Broj proizvoda (može više)')
+        parser.add_argument('--repeat', type=int, default=5, help='Broj ponavljanja merenja')
+        parser.add_argument('--threads', type=int, default=8, help='Broj istovremenih kupaca (checkout)')
+        parser.add_argument(
+            '--allow-commit', action='store_true',
+            help='Dozvoli scenarije koji commit-uju u bazu (checkout); ne pokretati nad produkcijom'
+        )
+
+    def handle(self, *args, **options):
+        if options['scenario'] in self.committed and not options['allow_commit']:
+            raise CommandError(
+                f"Scenario {options['scenario']} upisuje narudžbine u bazu {connection.settings_dict['NAME']}; "
+                'pokrenuti nad posebnom bazom uz --allow-commit'
+            )
+        self.repeat = options['repeat']
+        self.threads = options['threads']
+        self.client = APIClient()
+        handler = getattr(self, f"scenario_{options['scenario']}")
+
+        # Keš kataloga bi merio keš umesto baze i serijalizacije
+        with override_settings(ALLOWED_HOSTS=['*'], SHOP_CATALOG_CACHE_TIMEOUT=0):
+            for size in options['size']:
+                if options['scenario'] in self.committed:
+                    try:
+                        handler(size)
+                    finally:
+                        self.cleanup()
+                    continue
+                try:
+                    with transaction.atomic():
+                        handler(size)
+                        raise Rollback
+                except Rollback:
+                    pass
+
+    # Pomoćne funkcije
+
+    def seed_products(self, size, variants=0, images=0, categories=1):
+        category = Category.objects.create(name='Benchmark kategorija')
+        # Dodatne kategorije sa po dve potkategorije; proizvodi se raspoređuju redom
+        groups = [(category, None)]
+        for c in range(1, categories):
+            extra = Category.objects.create(name=f'Benchmark kategorija {c}')
+            groups += [
+                (extra, Subcategory.objects.create(name=f'Benchmark potkategorija {c}.{s}', category=extra))
+                for s in range(2)
+            ]
+        products = Product.objects.bulk_create(
+            [
+                Product(
+                    name=f'Benchmark proizvod {i}', description='Opis proizvoda',
+                    price=Decimal(100 + i % 900), category=groups[i % len(groups)][0],
+                    subcategory=groups[i % len(groups)][1], on_sale=i % 7 == 0,
+                    sale_price=Decimal(90 + i % 800) if i % 7 == 0 else None, in_stock=i % 11 != 0
+                )
+                for i in range(size)
+            ],
+            batch_size=1000
+        )
+        ProductVariant.objects.bulk_create(
+            [
+                ProductVariant(product=product, name=f'{v + 1}0×{v + 1}0mm', price_adjustment=Decimal(v * 25))
+                for product in products
+                for v in range(variants)
+            ],
+            batch_size=1000
+        )
+        ProductImage.objects.bulk_create(
+            [
+                ProductImage(product=product, image=f'products/{product.pk}-{i}.jpg', order=i, is_primary=i == 0)
+                for product in products
+                for i in range(images)
+            ],
+            batch_size=1000
+        )
+        self.stdout.write(f'\nGenerisano proizvoda: {size} (varijanti po proizvodu: {variants}, slika: {images})')
+        return category
+
+    def cleanup(self):
+        orders = Order.objects.filter(customer_name='Benchmark kupac')
+        # FK je SET_NULL: bez ovoga bi process_outbox zaista poslao email i SMS
+        OutboxMessage.objects.filter(order__in=orders).delete()
+        days = orders.aggregate(first=Min('created_at'), last=Max('created_at'))
+        orders.delete()
+        # Dnevni zbirovi su ih već sabrali (reports.order_created); računaju se ponovo bez njih
+        if days['first']:
+            reports.rebuild(timezone.localdate(days['first']), timezone.localdate(days['last']))
+        Product.objects.filter(category__name__startswith='Benchmark kategorija').delete()
+        Category.objects.filter(name__startswith='Benchmark kategorija').delete()
+
+    def measure(self, label, url, settings=None):
+        timings = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries, override_settings(**(settings or {})):
+                response = self.client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, (url, response.status_code)
+        self.stdout.write(
+            f'{label:<40} median {statistics.median(timings):8.2f} ms   '
+            f'p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:8.2f} ms   '
+            f'upita {len(queries)}   {len(response.content) / 1024:9.1f} KiB'
+        )
+        return statistics.median(timings)
+
+    # Scenariji
+
+    def scenario_pagination(self, size):
+        self.seed_products(size)
+        page_size = 20
+        deep_page = min(1000, size // page_size)
+
+        # Cursor za duboku stranu uzimamo direktno, bez prolaska kroz sve strane
+        anchor = Product.objects.order_by(*KeysetPagination.ordering)[(deep_page - 1) * page_size - 1]
+        cursor = KeysetPagination.encode_cursor(anchor)
+
+        first = self.measure('keyset strana 1', f'/api/products/?cursor=&page_size={page_size}')
+        deep = self.measure(
+            f'keyset strana {deep_page}',
+            f'/api/products/?cursor={cursor}&page_size={page_size}'
+        )
+        self.measure('offset strana 1', f'/api/products/?page=1&page_size={page_size}')
+        self.measure(
+            f'offset strana {deep_page}',
+            f'/api/products/?page={deep_page}&page_size={page_size}'
+        )
+        self.stdout.write(f'keyset strana {deep_page} / strana 1: {deep / first:.2f}x')
+
+    def scenario_serialization(self, size):
+        self.seed_products(size, variants=3, images=1)
+        for label, url in [
+            ('lista', '/api/products/'),
+            ('lista + varijante + slike', '/api/products/?expand=description,variants,images'),
+        ]:
+            slow = self.measure(f'DRF serializer, {label}', url, {'SHOP_FAST_SERIALIZATION': False})
+            fast = self.measure(f'fast path, {label}', url, {'SHOP_FAST_SERIALIZATION': True})
+            self.stdout.write(f'ubrzanje ({label}): {slow / fast:.1f}x')
+        self.measure('DRF serializer, kategorije', '/api/categories/', {'SHOP_FAST_SERIALIZATION': False})
+        self.measure('fast path, kategorije', '/api/categories/', {'SHOP_FAST_SERIALIZATION': True})
+
+    def scenario_facets(self, size):
+        category = self.seed_products(size, categories=10)
+        for label, url in [
+            ('faceti, ceo katalog', '/api/products/facets/'),
+            ('faceti, kategorija', f'/api/products/facets/?category={category.pk}'),
+            ('faceti, cena + akcija', '/api/products/facets/?min_price=200&max_price=600&on_sale=true'),
+            ('faceti, pretraga', '/api/products/facets/?search=proizvod 12'),
+        ]:
+            self.measure(label, url)
+        self.measure('faceti, keširano', '/api/products/facets/', {'SHOP_CATALOG_CACHE_TIMEOUT': 300})
+
+    def scenario_prices(self, size):
+        category = self.seed_products(size, variants=3, categories=10)
+        for label, url in [
+            ('cena od-do', '/api/products/?min_price=200&max_price=300&page_size=24'),
+            ('sortirano po ceni', '/api/products/?ordering=current_price&page_size=24'),
+            ('kategorija, sortirano po ceni', f'/api/products/?category={category.pk}&ordering=-current_price&page_size=24'),
+        ]:
+            self.measure(label, url)
+        # Promena cene cele kategorije, sa varijantama
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            changed = Product.objects.filter(category=category).update(price=F('price') + 10)
+        self.stdout.write(
+            f'poskupljenje kategorije ({changed} proizvoda): '
+            f'{(time.perf_counter() - start) * 1000:.0f} ms, {len(queries)} upita'
+        )
+
+    def scenario_search(self, size):
+        self.seed_products(size, variants=2, categories=10)
+        # bulk_create zaobilazi signale, pa se FTS5 indeks gradi ručno
+        start = time.perf_counter()
+        search.FTS5Backend().rebuild()
+        self.stdout.write(f'FTS5 indeks izgrađen za {(time.perf_counter() - start) * 1000:.0f} ms')
+        start = time.perf_counter()
+        search.MemoryBackend().rebuild()
+        self.stdout.write(f'memorijski indeks izgrađen za {(time.perf_counter() - start) * 1000:.0f} ms')
+
+        for backend in ['fts5', 'memory']:
+            for label, query in [
+                ('retka reč', f'proizvod {size - 1}'),
+                ('česta reč', 'proizvod'),
+                ('prefiks + padež', 'benchmark kategorij 3'),
+            ]:
+                self.measure(
+                    f'{backend}, {label}', f'/api/products/?search={query}&page_size=24',
+                    {'SHOP_SEARCH_BACKEND': backend}
+                )
+
+    def scenario_suggest(self, size):
+        self.seed_products(size, variants=3, categories=10)
+        start = time.perf_counter()
+        suggest.rebuild()
+        self.stdout.write(f'indeks predloga izgrađen za {(time.perf_counter() - start) * 1000:.0f} ms')
+
+        # Svaki prefiks kao da korisnik kuca slovo po slovo
+        words = ['benchmark proizvod 4711', 'kategorija 7', '20×20', 'potkategorija 3.1', 'nema takvog']
+        prefixes = [word[:n] for word in words for n in range(1, len(word) + 1)]
+        timings = []
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(self.repeat):
+                for prefix in prefixes:
+                    start = time.perf_counter()
+                    response = self.client.get('/api/products/suggest/', {'q': prefix})
+                    timings.append((time.perf_counter() - start) * 1000)
+                    assert response.status_code == 200
+        timings.sort()
+        self.stdout.write(
+            f'{"suggest, " + str(len(timings)) + " zahteva":<40} median {statistics.median(timings):8.2f} ms   '
+            f'p99 {timings[int(len(timings) * 0.99) - 1]:8.2f} ms   upita {len(queries)}'
+        )
+
+    def scenario_checkout(self, size):
+        self.seed_products(size)
+        # Mali broj traženih proizvoda sa praćenom zalihom: kupci se otimaju o iste redove
+        hot = list(Product.objects.filter(
+            category__name='Benchmark kategorija', in_stock=True
+        ).values_list('id', flat=True)[:20])
+        Product.objects.filter(id__in=hot).update(stock_quantity=50)
+        initial = 50 * len(hot)
+
+        timings, statuses = [], []
+
+        def customer(seed):
+            client = APIClient()
+            rng = random.Random(seed)
+            try:
+                while True:
+                    items = [
+                        {'product_id': pk, 'quantity': rng.randint(1, 3)}
+                        for pk in rng.sample(hot, rng.randint(1, 3))
+                    ]
+                    start = time.perf_counter()
+                    response = client.post('/api/orders/', {
+                        'customer_name': 'Benchmark kupac', 'customer_phone': '0641234567', 'items': items,
+                    }, format='json')
+                    timings.append((time.perf_counter() - start) * 1000)
+                    statuses.append(response.status_code)
+                    assert response.status_code in (201, 400), response.status_code
+                    if not Product.objects.filter(id__in=hot, in_stock=True).exists():
+                        break
+            finally:
+                connection.close()
+
+        # Notifikacije samo ulaze u outbox (cleanup ih briše); odbijene narudžbine ne loguju se kao upozorenja
+        logger = logging.getLogger('django.request')
+        level = logger.level
+        logger.setLevel(logging.ERROR)
+        try:
+            start = time.perf_counter()
+            workers = [threading.Thread(target=customer, args=(n,)) for n in range(self.threads)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            logger.setLevel(level)
+
+        remaining = sum(Product.objects.filter(id__in=hot).values_list('stock_quantity', flat=True))
+        sold = sum(
+            item.stock_reserved
+            for order in Order.objects.filter(customer_name='Benchmark kupac').prefetch_related('items')
+            for item in order.items.all()
+        )
+        timings.sort()
+        self.stdout.write(
+            f'{"checkout, " + str(self.threads) + " niti":<40} median {statistics.median(timings):8.2f} ms   '
+            f'p95 {timings[int(len(timings) * 0.95) - 1]:8.2f} ms   '
+            f'{statuses.count(201) / elapsed:7.1f} narudžbina/s'
+        )
+        self.stdout.write(
+            f'uspešnih {statuses.count(201)}, odbijenih {statuses.count(400)}; '
+            f'zaliha {initial} = prodato {sold} + ostalo {remaining}'
+        )
+        assert sold + remaining == initial and remaining >= 0
+
+    def scenario_export(self, size):
+        """size je broj narudžbina, svaka sa po 5 stavki"""
+        self.seed_products(1)
+        product = Product.objects.get(category__name='Benchmark kategorija')
+        orders = Order.objects.bulk_create(
+            [
+                Order(customer_name='Benchmark kupac', customer_phone='0641234567', total_amount=Decimal('500.00'))
+                for _ in range(size)
+            ],
+            batch_size=1000
+        )
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(
+                    order=order, product=product, quantity=1, unit_price=Decimal('100.00'),
+                    total_price=Decimal('100.00'), product_name=product.name
+                )
+                for order in orders
+                for _ in range(5)
+            ],
+            batch_size=1000
+        )
+        self.stdout.write(f'Generisano narudžbina: {size}, stavki: {size * 5}')
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark')
+        )
+
+        for params in ['rows=orders&type=csv', 'rows=items&type=csv', 'rows=items&type=jsonl']:
+            tracemalloc.start()
+            start = time.perf_counter()
+            response = self.client.get(f'/api/orders/export/?{params}')
+            written = sum(len(chunk) for chunk in response.streaming_content)
+            elapsed = (time.perf_counter() - start) * 1000
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.stdout.write(
+                f'{"izvoz, " + params:<40} {elapsed:8.0f} ms   {written / 1024 / 1024:8.1f} MiB   '
+                f'vrh memorije {peak / 1024 / 1024:6.1f} MiB'
+            )
+        self.client.force_authenticate(None)
+
+    def scenario_reports(self, size):
+        """size je broj dana istorije, sa po 50 narudžbina dnevno"""
+        self.seed_products(200)
+        products = list(Product.objects.filter(category__name='Benchmark kategorija'))
+        now = timezone.now()
+        orders = Order.objects.bulk_create(
+            [
+                Order(
+                    customer_name='Benchmark kupac', customer_phone='0641234567', total_amount=Decimal('300.00'),
+                    status=['pending', 'completed', 'cancelled'][n % 3]
+                )
+                for n in range(size * 50)
+            ],
+            batch_size=1000
+        )
+        for n, order in enumerate(orders):
+            order.created_at = now - timedelta(days=n // 50)
+        Order.objects.bulk_update(orders, ['created_at'], batch_size=1000)
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(
+                    order=order, product=products[(n + i) % len(products)], quantity=1,
+                    unit_price=Decimal('100.00'), total_price=Decimal('100.00'),
+                    product_name=products[(n + i) % len(products)].name
+                )
+                for n, order in enumerate(orders)
+                for i in range(3)
+            ],
+            batch_size=1000
+        )
+        start = time.perf_counter()
+        reports.rebuild()
+        self.stdout.write(
+            f'Istorija: {size} dana, {len(orders)} narudžbina; rebuild {(time.perf_counter() - start) * 1000:.0f} ms'
+        )
+
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark')
+        )
+        for group in reports.GROUPS:
+            self.measure(f'izveštaj 30 dana, {group}', f'/api/reports/sales/?group={group}')
+        self.client.force_authenticate(None)
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from shop import export
+from shop.filters import filter_orders
+from shop.models import ArchivedOrder, Order
+
+
+class Command(BaseCommand):
+    help = 'Izvoz narudžbina ili stavki u CSV / JSON Lines (strimovano, za bilo koji broj redova)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', choices=list(export.TABLES), default='orders', help='Narudžbine ili stavke')
+        parser.add_argument('--type', choices=list(export.FORMATS), default='csv', help='Format izlaza')
+        parser.add_argument('--status', help='Statusi odvojeni zarezom, npr. confirmed,completed')
+        parser.add_argument('--date-from', help='Od datuma (YYYY-MM-DD, uključivo)')
+        parser.add_argument('--date-to', help='Do datuma (YYYY-MM-DD, uključivo)')
+        parser.add_argument('--output', '-o', help='Putanja fajla; bez nje ispis na stdout')
+        parser.add_argument('--archived', action='store_true', help='Iz arhive (shop.archive)')
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE, help='Redova po čitanju iz baze')
+
+    def handle(self, *args, **options):
+        try:
+            model = ArchivedOrder if options['archived'] else Order
+            orders = filter_orders(model.objects.all(), {
+                'status': options['status'],
+                'date_from': options['date_from'],
+                'date_to': options['date_to'],
+            })
+        except ValidationError as exc:
+            raise CommandError(exc.detail)
+
+        chunks = export.stream(orders, options['rows'], options['type'], options['chunk_size'])
+        if not options['output']:
+            # Delovi se završavaju na kraju reda, pa se svaki može dekodirati zasebno
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending='')
+            return
+
+        written = 0
+        with open(options['output'], 'wb') as stream:
+            for chunk in chunks:
+                written += stream.write(chunk)
+        self.stderr.write(f"Upisano {written / 1024:.1f} KiB u {options['output']}")
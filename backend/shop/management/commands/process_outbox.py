@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop import notifications
+
+
+class Command(BaseCommand):
+    help = 'Šalje notifikacije iz outbox tabele (email i SMS o novim narudžbinama)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Broj niti za slanje')
+        parser.add_argument('--batch', type=int, default=50, help='Broj poruka preuzetih odjednom')
+        parser.add_argument('--interval', type=float, default=5, help='Pauza u sekundama kada nema poruka')
+        parser.add_argument('--once', action='store_true', help='Pošalji sve što je na redu i izađi')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = notifications.drain(threads=options['threads'], batch=options['batch'])
+            if sent or failed or options['once']:
+                self.stdout.write(f'Poslato: {sent}, neuspelo: {failed}')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
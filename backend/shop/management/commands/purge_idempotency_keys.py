@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from shop import idempotency
+
+
+class Command(BaseCommand):
+    help = 'Briše istekle Idempotency-Key zapise (pokretati periodično, npr. iz cron-a)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=5000, help='Broj zapisa po DELETE-u')
+
+    def handle(self, *args, **options):
+        deleted = idempotency.purge(batch_size=options['batch'])
+        self.stdout.write(f'Obrisano isteklih ključeva: {deleted}')
@@ -0,0 +1,52 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from shop import reports
+from shop.models import DailyItemSales, DailyOrderStats
+
+
+class Command(BaseCommand):
+    help = 'Računa dnevne zbirove prodaje ispočetka iz narudžbina (backfill ili popravka)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', type=date.fromisoformat, help='Od datuma (YYYY-MM-DD, uključivo)')
+        parser.add_argument('--date-to', type=date.fromisoformat, help='Do datuma (YYYY-MM-DD, uključivo)')
+        parser.add_argument('--days', type=int, default=31, help='Broj dana po transakciji')
+
+    def handle(self, *args, **options):
+        # Prva i poslednja narudžbina, aktivne ili arhivirane
+        bounds = [
+            order_model.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+            for order_model, _ in reports.SOURCES
+        ]
+        first = min((row['first'] for row in bounds if row['first']), default=None)
+        last = max((row['last'] for row in bounds if row['last']), default=None)
+        if first is None and not (options['date_from'] and options['date_to']):
+            # Nema narudžbina: brišu se i eventualni zaostali zbirovi
+            reports.rebuild(options['date_from'], options['date_to'])
+            self.stdout.write('Nema narudžbina.')
+            return
+        date_from = options['date_from'] or timezone.localdate(first)
+        date_to = options['date_to'] or timezone.localdate(last)
+        if date_from > date_to:
+            raise CommandError('--date-from ne može biti posle --date-to')
+
+        if not (options['date_from'] or options['date_to']):
+            # Zbirovi za dane bez ijedne narudžbine (npr. obrisane)
+            for model in (DailyOrderStats, DailyItemSales):
+                model.objects.exclude(date__range=(date_from, date_to)).delete()
+
+        # Kratke transakcije: narudžbine se primaju i dok rebuild traje
+        start = date_from
+        total_stats = total_sales = 0
+        while start <= date_to:
+            end = min(start + timedelta(days=options['days'] - 1), date_to)
+            stats, sales = reports.rebuild(start, end)
+            total_stats += stats
+            total_sales += sales
+            self.stdout.write(f'{start} - {end}: {stats} redova po statusu, {sales} redova prodaje')
+            start = end + timedelta(days=1)
+        self.stdout.write(f'Ukupno: {total_stats} redova po statusu, {total_sales} redova prodaje')
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from shop import search
+from shop.cache import bump_version
+
+
+class Command(BaseCommand):
+    help = 'Ponovo gradi indeks pretrage proizvoda (posle bulk uvoza koji zaobilazi signale)'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with transaction.atomic():
+            search.rebuild()
+            bump_version('search')
+        self.stdout.write(self.style.SUCCESS(
+            f'Indeks pretrage ({search.get_backend().name}) izgrađen za {time.perf_counter() - start:.2f} s'
+        ))
@@ -0,0 +1,90 @@
+import re
+import unicodedata
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+# Kopija normalizacije iz shop.search u trenutku ove migracije, da kasnije
+# izmene modula ne menjaju istoriju; indeks se posle izmena gradi
+# komandom rebuild_search_index
+TABLE = 'shop_product_search'
+
+_CYRILLIC = dict(zip(
+    'абвгдђежзијклљмнњопрстћуфхцчџш',
+    ['a', 'b', 'v', 'g', 'd', 'dj', 'e', 'z', 'z', 'i', 'j', 'k', 'l', 'lj', 'm', 'n', 'nj',
+     'o', 'p', 'r', 's', 't', 'c', 'u', 'f', 'h', 'c', 'c', 'dz', 's']
+))
+_FOLD = str.maketrans({'đ': 'dj', **_CYRILLIC})
+_TOKEN = re.compile(r'\w+')
+SUFFIXES = sorted(
+    ['ovima', 'evima', 'ama', 'ima', 'ovi', 'evi', 'ova', 'eva', 'om', 'em', 'a', 'e', 'i', 'o', 'u'],
+    key=len, reverse=True
+)
+MIN_STEM = 3
+
+
+def tokenize(text):
+    text = unicodedata.normalize('NFKD', (text or '').lower().translate(_FOLD))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    tokens = []
+    for token in _TOKEN.findall(text):
+        if token.isalpha():
+            for suffix in SUFFIXES:
+                if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM:
+                    token = token[:-len(suffix)]
+                    break
+        tokens.append(token)
+    return ' '.join(tokens)
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 postoji samo na SQLite-u; bez njega shop.search koristi indeks u memoriji
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {TABLE} USING fts5("
+            f"name, category, body, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+    except OperationalError:
+        return
+
+    Product = apps.get_model('shop', 'Product')
+    ProductVariant = apps.get_model('shop', 'ProductVariant')
+    variants = defaultdict(list)
+    for variant in ProductVariant.objects.order_by().values('product_id', 'name', 'sku').iterator():
+        variants[variant['product_id']] += [variant['name'], variant['sku']]
+
+    rows = []
+    products = Product.objects.order_by().values(
+        'id', 'name', 'description', 'category__name', 'subcategory__name'
+    )
+    for product in products.iterator():
+        body = [product['description'], *variants[product['id']]]
+        rows.append((
+            product['id'],
+            tokenize(product['name']),
+            tokenize(f"{product['category__name']} {product['subcategory__name'] or ''}"),
+            tokenize(' '.join(filter(None, body))),
+        ))
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, name, category, body) VALUES (%s, %s, %s, %s)', rows
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_composite_index_plan'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
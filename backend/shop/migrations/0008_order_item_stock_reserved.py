@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='stock_reserved',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='productvariant',
+            name='stock_quantity',
+            field=models.IntegerField(default=0, help_text='Količina na lageru (0 = neograničeno)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_outbox_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='reference',
+            field=models.CharField(blank=True, help_text='ID poruke kod SMS gateway-a', max_length=100),
+        ),
+    ]
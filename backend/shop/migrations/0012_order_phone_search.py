@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:42
+
+from django.db import migrations, models
+
+
+def phone_search_key(phone):
+    # Kopija shop.models.phone_search_key u trenutku ove migracije
+    phone = (phone or '').strip()
+    digits = ''.join(ch for ch in phone if ch.isdigit())
+    if phone.startswith('+') and digits.startswith('381'):
+        digits = digits[3:]
+    elif digits.startswith('00381'):
+        digits = digits[5:]
+    return digits.lstrip('0')
+
+
+def fill_phone_digits(apps, schema_editor):
+    Order = apps.get_model('shop', 'Order')
+    orders = list(Order.objects.only('id', 'customer_phone'))
+    for order in orders:
+        order.customer_phone_digits = phone_search_key(order.customer_phone)
+    Order.objects.bulk_update(orders, ['customer_phone_digits'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='customer_phone_digits',
+            field=models.CharField(blank=True, editable=False, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer_phone_digits', '-created_at'], name='order_phone_created_idx'),
+        ),
+        migrations.RunPython(fill_phone_digits, migrations.RunPython.noop),
+    ]
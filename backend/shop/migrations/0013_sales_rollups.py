@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_order_phone_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyItemSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('product_id', models.BigIntegerField()),
+                ('variant_id', models.BigIntegerField(default=0, help_text='0 = bez varijante')),
+                ('category_id', models.BigIntegerField(blank=True, null=True)),
+                ('product_name', models.CharField(max_length=200)),
+                ('variant_name', models.CharField(blank=True, max_length=100)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'ordering': ['date', 'product_id', 'variant_id'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'product_id', 'variant_id'), name='daily_item_sales_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyOrderStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Na čekanju'), ('confirmed', 'Potvrđena'), ('processing', 'U obradi'), ('completed', 'Završena'), ('cancelled', 'Otkazana')], max_length=20)),
+                ('order_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'ordering': ['date', 'status'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'status'), name='daily_order_stats_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:02
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('customer_name', models.CharField(max_length=200)),
+                ('customer_phone', models.CharField(help_text='Obavezan broj telefona', max_length=20, validators=[django.core.validators.RegexValidator(message='Unesite ispravan broj telefona (npr: 0641234567 ili +381641234567)', regex='^(\\+381|0)[0-9]{8,9}$')])),
+                ('customer_email', models.EmailField(blank=True, help_text='Opciono', max_length=254)),
+                ('customer_phone_digits', models.CharField(blank=True, editable=False, max_length=20)),
+                ('delivery_address', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('pending', 'Na čekanju'), ('confirmed', 'Potvrđena'), ('processing', 'U obradi'), ('completed', 'Završena'), ('cancelled', 'Otkazana')], default='pending', max_length=20)),
+                ('notes', models.TextField(blank=True, help_text='Napomena kupca')),
+                ('admin_notes', models.TextField(blank=True, help_text='Interne napomene')),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('sms_sent', models.BooleanField(default=False)),
+                ('email_sent', models.BooleanField(default=False)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'abstract': False,
+                'indexes': [models.Index(fields=['-created_at', '-id'], name='archived_order_created_id_idx'), models.Index(fields=['status', '-created_at'], name='archived_order_status_idx'), models.Index(fields=['customer_phone_digits', '-created_at'], name='archived_order_phone_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('product_name', models.CharField(max_length=200)),
+                ('variant_name', models.CharField(blank=True, max_length=100)),
+                ('stock_reserved', models.PositiveIntegerField(default=0)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='shop.archivedorder')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_order_items', to='shop.product')),
+                ('variant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='archived_order_items', to='shop.productvariant')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
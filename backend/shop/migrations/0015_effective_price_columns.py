@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:06
+
+from django.db import migrations, models
+from django.db.models import Case, F, OuterRef, Q, Subquery, When
+
+
+def fill_effective_prices(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    ProductVariant = apps.get_model('shop', 'ProductVariant')
+    # Pravilo cene u trenutku ove migracije (shop.models.EFFECTIVE_PRICE)
+    Product.objects.update(effective_price=Case(
+        When(Q(on_sale=True, sale_price__isnull=False) & ~Q(sale_price=0), then=F('sale_price')),
+        default=F('price'),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2)
+    ))
+    product_price = Product.objects.filter(pk=OuterRef('product_id')).values('effective_price')[:1]
+    ProductVariant.objects.update(effective_price=F('price_adjustment') + Subquery(product_price))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_order_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='productvariant',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(fill_effective_prices, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['effective_price', 'id'], name='product_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'effective_price'], name='product_category_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(fields=['product', 'effective_price'], name='variant_product_price_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0016_order_item_stock_sold_out'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedorderitem',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_order_items', to='shop.product'),
+        ),
+        migrations.AlterField(
+            model_name='archivedorderitem',
+            name='variant',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_order_items', to='shop.productvariant'),
+        ),
+    ]
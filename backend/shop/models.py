@@ -1,11 +1,18 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Min, Max, OuterRef, Q, Subquery, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import RegexValidator
 
+from .cache import bump_version
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = 'Categories'
@@ -24,6 +31,7 @@ class Subcategory(models.Model):
     )
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = 'Subcategories'
@@ -34,6 +42,77 @@ class Subcategory(models.Model):
         return f"{self.category.name} - {self.name}"
 
 
+# Polja od kojih zavisi effective_price proizvoda, odnosno varijante
+PRODUCT_PRICE_FIELDS = {'price', 'on_sale', 'sale_price'}
+VARIANT_PRICE_FIELDS = {'price_adjustment', 'product', 'product_id'}
+PRICE_SYNC_BATCH = 500  # ID-jeva po UPDATE-u
+
+# Cena koju kupac plaća, u SQL-u (isto pravilo kao Product.current_price)
+EFFECTIVE_PRICE = Case(
+    When(Q(on_sale=True, sale_price__isnull=False) & ~Q(sale_price=0), then=F('sale_price')),
+    default=F('price'),
+    output_field=models.DecimalField(max_digits=10, decimal_places=2)
+)
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    update(), bulk_create() i bulk_update() održavaju effective_price
+    proizvoda i njegovih varijanti, kao i save()
+    """
+
+    def update(self, **kwargs):
+        if not PRODUCT_PRICE_FIELDS & kwargs.keys():
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            # Posle izmene filter možda više ne pogađa iste redove
+            ids = list(self.values_list('pk', flat=True))
+            count = super().update(**kwargs)
+            sync_effective_prices(ids)
+        return count
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.effective_price = obj.current_price
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if not PRODUCT_PRICE_FIELDS & set(fields):
+            return super().bulk_update(objs, fields, *args, **kwargs)
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            count = super().bulk_update(objs, fields, *args, **kwargs)
+            sync_effective_prices([obj.pk for obj in objs])
+        for obj in objs:
+            obj.effective_price = obj.current_price
+        return count
+
+    def with_list_summary(self):
+        """
+        Anotacije za kompaktnu listu: glavna slika, broj varijanti i raspon
+        finalnih cena varijanti.
+        Korelisani podupiti umesto JOIN + GROUP BY, pa COUNT za paginaciju
+        ostaje običan indeksni upit nad proizvodima.
+        """
+        decimal_field = models.DecimalField(max_digits=10, decimal_places=2)
+        primary_image = ProductImage.objects.filter(
+            product=OuterRef('pk')
+        ).order_by(*ProductImage._meta.ordering).values('image')[:1]
+        variants = ProductVariant.objects.filter(product=OuterRef('pk')).order_by().values('product')
+
+        def variant_aggregate(aggregate, output_field):
+            return Subquery(variants.annotate(value=aggregate).values('value'), output_field=output_field)
+
+        # Bez varijanti raspon je cena proizvoda
+        return self.annotate(
+            primary_image=Subquery(primary_image),
+            variant_count=Coalesce(variant_aggregate(Count('id'), models.IntegerField()), 0),
+            min_final_price=Coalesce(variant_aggregate(Min('effective_price'), decimal_field), F('effective_price')),
+            max_final_price=Coalesce(variant_aggregate(Max('effective_price'), decimal_field), F('effective_price')),
+        )
+
+
 class Product(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField()
@@ -68,15 +147,62 @@ class Product(models.Model):
     in_stock = models.BooleanField(default=True)
     stock_quantity = models.IntegerField(default=0, help_text="Količina na lageru (0 = neograničeno)")
 
+    # current_price u koloni, za filtriranje i sortiranje po ceni u bazi
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['category', '-created_at'], name='product_category_created_idx'),
+            models.Index(fields=['subcategory', '-created_at'], name='product_subcat_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='product_created_id_idx'),
+            # Flagovi su retki i SQLite ih poredi kao goli izraz ("featured"),
+            # pa parcijalni indeksi rade i na SQLite i na PostgreSQL
+            models.Index(
+                fields=['-created_at', '-id'], condition=Q(featured=True),
+                name='product_featured_idx'
+            ),
+            models.Index(
+                fields=['-created_at', '-id'], condition=Q(on_sale=True),
+                name='product_on_sale_idx'
+            ),
+            models.Index(
+                fields=['-created_at', '-id'], condition=Q(in_stock=False),
+                name='product_out_of_stock_idx'
+            ),
+            # ?min_price / ?max_price i ?ordering=current_price
+            models.Index(fields=['effective_price', 'id'], name='product_price_idx'),
+            models.Index(fields=['category', 'effective_price'], name='product_category_price_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Cena iz baze: save() menja varijante samo kada se ona promeni
+        instance._saved_effective_price = instance.__dict__.get('effective_price')
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not PRODUCT_PRICE_FIELDS & set(update_fields):
+            return super().save(*args, **kwargs)
+        self.effective_price = self.current_price
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'effective_price'}
+        changed = not self._state.adding and self.effective_price != getattr(self, '_saved_effective_price', None)
+        super().save(*args, **kwargs)
+        if changed:
+            self.variants.update(effective_price=F('price_adjustment') + self.effective_price)
+        self._saved_effective_price = self.effective_price
+
     @property
     def current_price(self):
         if self.on_sale and self.sale_price:
@@ -84,6 +210,45 @@ class Product(models.Model):
         return self.price
 
 
+class ProductVariantQuerySet(models.QuerySet):
+    """update(), bulk_create() i bulk_update() održavaju effective_price, kao i save()"""
+
+    def update(self, **kwargs):
+        if not VARIANT_PRICE_FIELDS & kwargs.keys():
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            ids = list(self.values_list('pk', flat=True))
+            count = super().update(**kwargs)
+            for start in range(0, len(ids), PRICE_SYNC_BATCH):
+                ProductVariant.objects.filter(pk__in=ids[start:start + PRICE_SYNC_BATCH]).update(
+                    effective_price=variant_effective_price()
+                )
+            # update() zaobilazi post_save
+            bump_version('catalog')
+        return count
+
+    def set_effective_prices(self, objs):
+        """Cena proizvoda iz učitanog product-a ili jednim upitom za sve ostale"""
+        field = ProductVariant._meta.get_field('product')
+        missing = {obj.product_id for obj in objs if not field.is_cached(obj)}
+        prices = dict(Product.objects.filter(pk__in=missing).values_list('pk', 'effective_price')) if missing else {}
+        for obj in objs:
+            base = obj.product.effective_price if field.is_cached(obj) else prices[obj.product_id]
+            obj.effective_price = base + obj.price_adjustment
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        self.set_effective_prices(objs)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if not VARIANT_PRICE_FIELDS & set(fields):
+            return super().bulk_update(objs, fields, *args, **kwargs)
+        objs = list(objs)
+        self.set_effective_prices(objs)
+        return super().bulk_update(objs, [*fields, 'effective_price'], *args, **kwargs)
+
+
 class ProductVariant(models.Model):
     """
     Varijante proizvoda - npr. različite dimenzije za isti proizvod
@@ -109,22 +274,58 @@ class ProductVariant(models.Model):
 
     # Stock za varijantu
     in_stock = models.BooleanField(default=True)
-    stock_quantity = models.IntegerField(default=0)
+    stock_quantity = models.IntegerField(default=0, help_text="Količina na lageru (0 = neograničeno)")
+
+    # Cena proizvoda + price_adjustment; proizvod je menja kada mu se promeni cena
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProductVariantQuerySet.as_manager()
 
     class Meta:
         ordering = ['name']
+        # unique_together već daje indeks (product, name) za liste varijanti
         unique_together = ['product', 'name']
+        indexes = [
+            models.Index(fields=['sku'], name='variant_sku_idx'),
+            # Raspon cena varijanti po proizvodu (min/max_final_price)
+            models.Index(fields=['product', 'effective_price'], name='variant_product_price_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.name}"
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or VARIANT_PRICE_FIELDS & set(update_fields):
+            # Bez cene u update_fields (npr. samo lager) proizvod se ne čita
+            self.effective_price = self.product.effective_price + self.price_adjustment
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'effective_price'}
+        super().save(*args, **kwargs)
+
     @property
     def final_price(self):
-        """Finalna cena varijante = osnovna cena proizvoda + adjustment"""
-        base_price = self.product.current_price
-        return base_price + self.price_adjustment
+        """Finalna cena varijante = osnovna cena proizvoda + adjustment (bez čitanja proizvoda)"""
+        return self.effective_price
+
+
+def variant_effective_price():
+    """effective_price varijante u SQL-u, iz kolone proizvoda"""
+    product_price = Product.objects.filter(pk=OuterRef('product_id')).values('effective_price')[:1]
+    return F('price_adjustment') + Subquery(product_price, output_field=models.DecimalField(max_digits=10, decimal_places=2))
+
+
+def sync_effective_prices(product_ids):
+    """Preračunava effective_price proizvoda i njihovih varijanti (posle update() mimo save())"""
+    for start in range(0, len(product_ids), PRICE_SYNC_BATCH):
+        ids = product_ids[start:start + PRICE_SYNC_BATCH]
+        Product.objects.filter(pk__in=ids).update(effective_price=EFFECTIVE_PRICE)
+        ProductVariant.objects.filter(product__in=ids).update(effective_price=variant_effective_price())
+    # update() zaobilazi post_save
+    bump_version('catalog')
 
 
 class ProductImage(models.Model):
@@ -142,9 +343,17 @@ class ProductImage(models.Model):
     order = models.IntegerField(default=0, help_text="Redosled prikaza")
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-is_primary', 'order', 'created_at']
+        indexes = [
+            # Pokriva Meta.ordering po proizvodu (glavna slika, prefetch, batch)
+            models.Index(
+                fields=['product', '-is_primary', 'order', 'created_at'],
+                name='image_product_order_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - Image {self.id}"
@@ -152,23 +361,40 @@ class ProductImage(models.Model):
     def save(self, *args, **kwargs):
         # Ako je ova slika primary, ostale za isti proizvod više nisu
         if self.is_primary:
-            ProductImage.objects.filter(
+            updated = ProductImage.objects.filter(
                 product=self.product,
                 is_primary=True
-            ).exclude(id=self.id).update(is_primary=False)
+            ).exclude(id=self.id).update(is_primary=False, updated_at=timezone.now())
+            # update() ne šalje signale, pa keš kataloga invalidiramo ručno
+            if updated:
+                bump_version('catalog')
         super().save(*args, **kwargs)
 
 
 # Validator za srpski broj telefona
+def phone_search_key(phone):
+    """
+    Broj bez pozivnog broja zemlje i vodeće nule, samo cifre:
+    '064 123-4567' i '+381641234567' -> '641234567'. Isto važi za deo broja u pretrazi.
+    """
+    phone = (phone or '').strip()
+    digits = ''.join(ch for ch in phone if ch.isdigit())
+    if phone.startswith('+') and digits.startswith('381'):
+        digits = digits[3:]
+    elif digits.startswith('00381'):
+        digits = digits[5:]
+    return digits.lstrip('0')
+
+
 phone_validator = RegexValidator(
     regex=r'^(\+381|0)[0-9]{8,9}$',
     message="Unesite ispravan broj telefona (npr: 0641234567 ili +381641234567)"
 )
 
 
-class Order(models.Model):
+class OrderBase(models.Model):
     """
-    Narudžbine
+    Polja narudžbine, zajednička za aktivne (Order) i arhivirane (ArchivedOrder)
     """
     STATUS_CHOICES = [
         ('pending', 'Na čekanju'),
@@ -186,6 +412,8 @@ class Order(models.Model):
         help_text="Obavezan broj telefona"
     )
     customer_email = models.EmailField(blank=True, help_text="Opciono")
+    # phone_search_key(customer_phone), za pretragu po početku broja preko indeksa
+    customer_phone_digits = models.CharField(max_length=20, blank=True, editable=False)
 
     # Opciono: adresa dostave
     delivery_address = models.TextField(blank=True)
@@ -207,13 +435,67 @@ class Order(models.Model):
     email_sent = models.BooleanField(default=False)
 
     class Meta:
+        abstract = True
         ordering = ['-created_at']
 
     def __str__(self):
         return f"Narudžbina #{self.id} - {self.customer_name}"
 
+    def save(self, *args, **kwargs):
+        self.customer_phone_digits = phone_search_key(self.customer_phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'customer_phone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'customer_phone_digits'}
+        super().save(*args, **kwargs)
 
-class OrderItem(models.Model):
+
+class Order(OrderBase):
+    """
+    Narudžbine. Završene i otkazane starije od SHOP_ARCHIVE_AFTER_DAYS
+    komanda archive_orders premešta u ArchivedOrder.
+    """
+
+    class Meta(OrderBase.Meta):
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='order_created_id_idx'),
+            models.Index(fields=['status', '-created_at'], name='order_status_created_idx'),
+            models.Index(fields=['customer_phone_digits', '-created_at'], name='order_phone_created_idx'),
+        ]
+
+
+class OrderItemBase(models.Model):
+    """
+    Polja stavke narudžbine, zajednička za aktivne i arhivirane stavke
+    """
+    quantity = models.PositiveIntegerField(default=1)
+
+    # Snapshot cene u momentu narudžbine
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    # Snapshot naziva (ako se proizvod obriše kasnije)
+    product_name = models.CharField(max_length=200)
+    variant_name = models.CharField(max_length=100, blank=True)
+
+    # Koliko je skinuto sa lagera (0 ako se zaliha ne prati); vraća se pri otkazivanju
+    stock_reserved = models.PositiveIntegerField(default=0)
+    # Prodaja ove stavke je spustila zalihu na 0 i isključila in_stock
+    stock_sold_out = models.BooleanField(default=False)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        variant_info = f" ({self.variant_name})" if self.variant_name else ""
+        return f"{self.product_name}{variant_info} x{self.quantity}"
+
+    def save(self, *args, **kwargs):
+        # Auto-calculate total_price
+        self.total_price = self.unit_price * self.quantity
+        super().save(*args, **kwargs)
+
+
+class OrderItem(OrderItemBase):
     """
     Stavke narudžbine
     """
@@ -236,21 +518,168 @@ class OrderItem(models.Model):
         help_text="Odabrana varijanta/dimenzija"
     )
 
-    quantity = models.PositiveIntegerField(default=1)
 
-    # Snapshot cene u momentu narudžbine
-    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
-    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+class ArchivedOrder(OrderBase):
+    """
+    Arhivirane narudžbine (shop.archive): iste kolone i isti ID kao u Order,
+    samo za čitanje. Vremena su prepisana iz narudžbine, ne postavljaju se sama.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
 
-    # Snapshot naziva (ako se proizvod obriše kasnije)
+    class Meta(OrderBase.Meta):
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='archived_order_created_id_idx'),
+            models.Index(fields=['status', '-created_at'], name='archived_order_status_idx'),
+            models.Index(fields=['customer_phone_digits', '-created_at'], name='archived_order_phone_idx'),
+        ]
+
+
+class ArchivedOrderItem(OrderItemBase):
+    """
+    Stavke arhiviranih narudžbina, sa istim ID-jem kao u OrderItem.
+    Proizvod i varijanta su bez ograničenja u bazi: arhiva ne sprečava
+    brisanje proizvoda, a ID ostaje (kao u DailyItemSales), uz nazive iz
+    snapshot-a.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(
+        ArchivedOrder,
+        on_delete=models.CASCADE,
+        related_name='items'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='archived_order_items'
+    )
+    variant = models.ForeignKey(
+        ProductVariant,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name='archived_order_items'
+    )
+
+
+class OutboxMessage(models.Model):
+    """
+    Notifikacije koje se šalju van zahteva. Upisuju se u istoj transakciji
+    kao narudžbina, a šalje ih komanda process_outbox.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Na čekanju'),
+        ('sent', 'Poslata'),
+        ('failed', 'Neuspela'),
+    ]
+
+    kind = models.CharField(max_length=30, help_text="Npr: order_email")
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='outbox_messages'
+    )
+    payload = models.JSONField(default=dict)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    reference = models.CharField(max_length=100, blank=True, help_text="ID poruke kod SMS gateway-a")
+
+    # Sledeći pokušaj (backoff) i zakup: worker koji je preuzeo poruku drži je do locked_until
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    lock_token = models.CharField(max_length=32, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # Worker čita samo poruke na čekanju, najstarije prve
+            models.Index(
+                fields=['available_at', 'id'], condition=Q(status='pending'),
+                name='outbox_pending_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Ključ iz zaglavlja Idempotency-Key za POST /api/orders/. Ponovljen zahtev
+    sa istim ključem dobija sačuvani odgovor umesto nove narudžbine.
+    """
+    key = models.CharField(max_length=100, unique=True)
+    # SHA-256 tela zahteva; isti ključ sa drugim sadržajem je greška klijenta
+    fingerprint = models.CharField(max_length=64)
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='idempotency_keys'
+    )
+    status_code = models.PositiveSmallIntegerField(default=201)
+    response = models.JSONField(encoder=DjangoJSONEncoder, default=dict)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.key
+
+
+class DailyOrderStats(models.Model):
+    """
+    Broj narudžbina i prihod po danu kreiranja i trenutnom statusu. Održava
+    ga shop.reports pri kreiranju narudžbine i promeni statusa; komanda
+    rebuild_reports ga računa iz narudžbina.
+    """
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['date', 'status']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'status'], name='daily_order_stats_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.status}: {self.order_count}"
+
+
+class DailyItemSales(models.Model):
+    """
+    Prodato po danu, proizvodu i varijanti, bez otkazanih narudžbina.
+    Bez stranih ključeva: zbir ostaje i kada se proizvod obriše, a nazivi
+    su oni iz poslednje prodaje.
+    """
+    date = models.DateField()
+    product_id = models.BigIntegerField()
+    variant_id = models.BigIntegerField(default=0, help_text="0 = bez varijante")
+    category_id = models.BigIntegerField(null=True, blank=True)
     product_name = models.CharField(max_length=200)
     variant_name = models.CharField(max_length=100, blank=True)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
 
-    def __str__(self):
-        variant_info = f" ({self.variant_name})" if self.variant_name else ""
-        return f"{self.product_name}{variant_info} x{self.quantity}"
+    class Meta:
+        ordering = ['date', 'product_id', 'variant_id']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product_id', 'variant_id'], name='daily_item_sales_key'),
+        ]
 
-    def save(self, *args, **kwargs):
-        # Auto-calculate total_price
-        self.total_price = self.unit_price * self.quantity
-        super().save(*args, **kwargs)
+    def __str__(self):
+        return f"{self.date} {self.product_name}: {self.quantity}"
@@ -0,0 +1,234 @@
+"""
+Notifikacije preko outbox tabele (email vlasniku, SMS kupcu i vlasniku).
+
+Zahtev za narudžbinu samo upisuje OutboxMessage u istoj transakciji kao
+narudžbinu (nema mrežnog poziva u zahtevu, a poruka postoji ako i samo ako
+postoji narudžbina). Komanda process_outbox preuzima poruke u serijama,
+šalje ih iz niza niti (SMS-ove jednim pozivom gateway-a po seriji) i beleži ishod; neuspeh se ponavlja sa eksponencijalnim
+backoff-om, a posle SHOP_OUTBOX_MAX_ATTEMPTS pokušaja poruka ostaje 'failed'.
+
+Preuzimanje je zakup (locked_until + lock_token): poruku koju je worker
+preuzeo drugi ne diraju dok zakup ne istekne, a ako worker padne, poruka
+se posle isteka ponovo šalje. Isporuka je zato "bar jednom".
+"""
+import logging
+import random
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import close_old_connections, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from . import sms
+from .models import Order, OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+# kind -> (funkcija, polje narudžbine, serijski). Obična funkcija šalje jednu
+# poruku i izuzetkom javlja neuspeh; serijska dobija listu poruka i vraća
+# listu rezultata (None ili izuzetak). Polje narudžbine se uključuje kada su
+# sve poruke te vrste za narudžbinu poslate.
+HANDLERS = {}
+
+
+def handler(kind, flag=None, batch=False):
+    def register(func):
+        HANDLERS[kind] = (func, flag, batch)
+        return func
+    return register
+
+
+def setting(name, default):
+    return getattr(settings, f'SHOP_OUTBOX_{name}', default)
+
+
+# Upis (u transakciji narudžbine)
+
+def render_order_email(order):
+    """Tekst emaila vlasniku; stavke moraju biti već učitane"""
+    message = f"""
+Nova narudžbina je primljena!
+
+Narudžbina: #{order.id}
+Kupac: {order.customer_name}
+Telefon: {order.customer_phone}
+Email: {order.customer_email or 'Nije ostavljen'}
+Ukupno: {order.total_amount} RSD
+
+Stavke:
+"""
+    for item in order.items.all():
+        variant_info = f" ({item.variant_name})" if item.variant_name else ""
+        message += f"- {item.product_name}{variant_info} x{item.quantity} = {item.total_price} RSD\n"
+
+    if order.notes:
+        message += f"\nNapomena kupca: {order.notes}"
+
+    return {
+        'subject': f'Nova narudžbina #{order.id}',
+        'body': message,
+        'recipients': list(getattr(settings, 'SHOP_ORDER_NOTIFICATION_EMAILS', [])),
+    }
+
+
+def order_created(order):
+    """Poruke za novu narudžbinu; poziva se unutar transakcije koja je kreira"""
+    OutboxMessage.objects.bulk_create([
+        OutboxMessage(kind='order_email', order=order, payload=render_order_email(order)),
+    ] + [
+        OutboxMessage(kind='order_sms', order=order, payload={'to': phone, 'text': text})
+        for phone, text in sms.render_order_sms(order)
+    ])
+
+
+def status_changed(orders, status):
+    """SMS kupcima o novom statusu, jednim INSERT-om; poziva se u transakciji promene"""
+    messages = []
+    for order in orders:
+        rendered = sms.render_status_sms(order, status)
+        if rendered:
+            phone, text = rendered
+            messages.append(OutboxMessage(kind='order_sms', order=order, payload={'to': phone, 'text': text}))
+    OutboxMessage.objects.bulk_create(messages)
+
+
+# Slanje
+
+@handler('order_email', flag='email_sent')
+def send_order_email(message):
+    payload = message.payload
+    send_mail(
+        payload['subject'],
+        payload['body'],
+        settings.DEFAULT_FROM_EMAIL,
+        payload['recipients'],
+    )
+
+
+@handler('order_sms', flag='sms_sent', batch=True)
+def send_order_sms(messages):
+    texts = [sms.SMSMessage(message.payload['to'], message.payload['text']) for message in messages]
+    results = sms.get_connection().send_messages(texts)
+    for message, text in zip(messages, texts):
+        message.reference = text.reference
+    return results
+
+
+def retry_delay(attempts):
+    """Eksponencijalni backoff sa do 10% slučajnog odstupanja, da se ponovni pokušaji ne poklope"""
+    base = setting('RETRY_DELAY', 30)
+    delay = min(base * 2 ** (attempts - 1), setting('MAX_RETRY_DELAY', 60 * 60))
+    return timedelta(seconds=delay * random.uniform(1, 1.1))
+
+
+def claim(limit):
+    """Preuzima do limit poruka koje su na redu; vraća samo one koje je ovaj poziv zakupio"""
+    now = timezone.now()
+    free = Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    ids = list(
+        OutboxMessage.objects.filter(free, status='pending', available_at__lte=now)
+        .order_by('available_at', 'id').values_list('id', flat=True)[:limit]
+    )
+    if not ids:
+        return []
+
+    # Uslovni UPDATE: ako je drugi worker u međuvremenu uzeo neku poruku, ona se preskače
+    token = uuid.uuid4().hex
+    OutboxMessage.objects.filter(free, id__in=ids, status='pending').update(
+        locked_until=now + timedelta(seconds=setting('LEASE', 5 * 60)), lock_token=token
+    )
+    return list(OutboxMessage.objects.filter(id__in=ids, lock_token=token))
+
+
+def deliver(messages):
+    """
+    Šalje preuzete poruke iste vrste i beleži ishod; vraća (poslato, neuspelo).
+    Mrežni pozivi su van transakcije, da ne drže bazu zaključanom.
+    """
+    send, flag, batch = HANDLERS[messages[0].kind]
+    if batch:
+        try:
+            errors = send(messages)
+        except Exception as exc:
+            errors = [exc] * len(messages)
+    else:
+        errors = []
+        for message in messages:
+            try:
+                send(message)
+                errors.append(None)
+            except Exception as exc:
+                errors.append(exc)
+
+    sent = [message for message, error in zip(messages, errors) if error is None]
+    now = timezone.now()
+    with transaction.atomic():
+        # Sve poruke iz jednog claim() imaju isti token
+        if sent:
+            OutboxMessage.objects.filter(id__in=[m.id for m in sent], lock_token=messages[0].lock_token).update(
+                status='sent', sent_at=now, attempts=F('attempts') + 1,
+                locked_until=None, lock_token='', last_error=''
+            )
+            referenced = [message for message in sent if message.reference]
+            if referenced:
+                OutboxMessage.objects.bulk_update(referenced, ['reference'])
+
+        for message, error in zip(messages, errors):
+            if error is None:
+                continue
+            attempts = message.attempts + 1
+            logger.warning('Outbox poruka %s nije poslata (pokušaj %s): %s', message.id, attempts, error)
+            OutboxMessage.objects.filter(id=message.id, lock_token=message.lock_token).update(
+                status='failed' if attempts >= setting('MAX_ATTEMPTS', 8) else 'pending',
+                attempts=attempts, available_at=now + retry_delay(attempts),
+                locked_until=None, lock_token='', last_error=f'{type(error).__name__}: {error}'
+            )
+
+        order_ids = {message.order_id for message in sent if message.order_id}
+        if flag and order_ids:
+            unsent = OutboxMessage.objects.filter(order=OuterRef('pk'), kind=messages[0].kind).exclude(status='sent')
+            Order.objects.filter(id__in=order_ids).exclude(Exists(unsent)).update(**{flag: True})
+    return len(sent), len(messages) - len(sent)
+
+
+def _deliver_in_thread(messages):
+    try:
+        return deliver(messages)
+    finally:
+        # Kao posle HTTP zahteva: konekcija niti se zatvara ili ostaje po CONN_MAX_AGE
+        close_old_connections()
+
+
+def tasks(messages):
+    """Email se šalje poruku po poruku (paralelno), serijske vrste jednim pozivom"""
+    groups = defaultdict(list)
+    for message in messages:
+        groups[message.kind].append(message)
+    for kind, group in groups.items():
+        if HANDLERS[kind][2]:
+            yield group
+        else:
+            yield from ([message] for message in group)
+
+
+def drain(threads=1, batch=50):
+    """Šalje sve poruke koje su na redu; vraća (poslato, neuspelo)"""
+    sent = failed = 0
+    pool = ThreadPoolExecutor(max_workers=threads) if threads > 1 else None
+    try:
+        while True:
+            messages = claim(batch)
+            if not messages:
+                return sent, failed
+            work = list(tasks(messages))
+            for ok, failures in pool.map(_deliver_in_thread, work) if pool else map(deliver, work):
+                sent += ok
+                failed += failures
+    finally:
+        if pool:
+            pool.shutdown()
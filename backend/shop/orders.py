@@ -0,0 +1,128 @@
+"""
+Promene statusa narudžbina, pojedinačno (update_status) i grupno (bulk_status).
+Grupne promene poštuju ALLOWED_TRANSITIONS; pojedinačna je ručna ispravka
+admina i dozvoljava svaki prelaz.
+
+Za svaki ciljni status ide jedan uslovni UPDATE (id i stari status), a
+propratne izmene su grupne: zaliha otkazanih jednim UPDATE-om po modelu,
+dnevni zbirovi jednim upsertom po tabeli i SMS-ovi kupcima jednim INSERT-om
+u outbox. Samo vraćanje iz otkazanih uzima zalihu posebno za svaku
+narudžbinu, da nedostatak kod jedne ne poništi ostale.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import inventory, notifications, reports
+from .cache import bump_version
+from .models import Order, OrderItem
+
+# Stari status -> dozvoljeni novi statusi, za grupne promene; pojedinačna
+# promena (update_status) dozvoljava svaki prelaz, kao i ranije
+ALLOWED_TRANSITIONS = {
+    'pending': {'confirmed', 'processing', 'completed', 'cancelled'},
+    'confirmed': {'pending', 'processing', 'completed', 'cancelled'},
+    'processing': {'confirmed', 'completed', 'cancelled'},
+    'completed': {'processing'},
+    'cancelled': {'pending', 'confirmed'},
+}
+MAX_BULK = 500  # narudžbina po zahtevu
+
+
+def change_statuses(changes, validate_transitions=True):
+    """
+    changes: {order_id: novi status}. Vraća listu rezultata istim redom,
+    {'id', 'from', 'to', 'result'} uz 'error' za neuspele; result je updated,
+    unchanged, not_found, invalid_status, invalid_transition ili out_of_stock.
+    Bez validate_transitions prelazi se ne proveravaju (zaliha se i dalje
+    vraća ili ponovo uzima pri prelazu preko otkazanog).
+    """
+    labels = dict(Order.STATUS_CHOICES)
+    results = {order_id: {'id': order_id, 'from': None, 'to': status} for order_id, status in changes.items()}
+
+    with transaction.atomic():
+        # Redovi se zaključavaju (PostgreSQL); SQLite drži upis od početka transakcije
+        orders = Order.objects.select_for_update().in_bulk(list(changes))
+        targets = defaultdict(list)
+        for order_id, new_status in changes.items():
+            result = results[order_id]
+            order = orders.get(order_id)
+            if not isinstance(new_status, str) or new_status not in labels:
+                result.update(result='invalid_status', error=f'Nepoznat status: {new_status}.')
+            elif order is None:
+                result.update(result='not_found', error='Narudžbina ne postoji.')
+            elif order.status == new_status:
+                result.update({'from': order.status, 'result': 'unchanged'})
+            elif validate_transitions and new_status not in ALLOWED_TRANSITIONS[order.status]:
+                result.update({
+                    'from': order.status, 'result': 'invalid_transition',
+                    'error': f'Prelaz {labels[order.status]} -> {labels[new_status]} nije dozvoljen.',
+                })
+            else:
+                result['from'] = order.status
+                targets[new_status].append(order)
+
+        # Stavke narudžbina koje se otkazuju ili vraćaju iz otkazanih, jednim upitom
+        crossing = [
+            order.id for new_status, group in targets.items() for order in group
+            if 'cancelled' in (order.status, new_status)
+        ]
+        items = defaultdict(list)
+        if crossing:
+            for item in OrderItem.objects.filter(order_id__in=crossing).select_related('product', 'variant'):
+                items[item.order_id].append(item)
+
+        now = timezone.now()
+        for new_status, group in targets.items():
+            if new_status != 'cancelled':
+                group = _reserve_restored(group, items, results)
+            if not group:
+                continue
+
+            sources = defaultdict(list)
+            for order in group:
+                sources[order.status].append(order.id)
+            condition = Q()
+            for old_status, ids in sources.items():
+                condition |= Q(status=old_status, id__in=ids)
+            changed = Order.objects.filter(condition).update(status=new_status, updated_at=now)
+            if changed != len(group):
+                # Redovi su zaključani, pa se ovo ne očekuje; zbirovi ne smeju ostati napola
+                raise RuntimeError(f'Promenjeno {changed} od {len(group)} narudžbina')
+
+            group_items = [item for order in group for item in items.get(order.id, ())]
+            if new_status == 'cancelled':
+                inventory.release(group_items)
+            reports.status_changed(group, new_status, group_items)
+            notifications.status_changed(group, new_status)
+            for order in group:
+                results[order.id]['result'] = 'updated'
+
+        if targets:
+            # update() zaobilazi post_save
+            bump_version('orders')
+    return list(results.values())
+
+
+def _reserve_restored(group, items, results):
+    """
+    Narudžbine koje se vraćaju iz otkazanih ponovo uzimaju zalihu, svaka u
+    svom savepoint-u; vraća narudžbine koje mogu da promene status
+    """
+    kept, reserved = [], []
+    for order in group:
+        if order.status == 'cancelled':
+            try:
+                with transaction.atomic():
+                    inventory.reserve(items[order.id])
+            except serializers.ValidationError as exc:
+                results[order.id].update(result='out_of_stock', error=str(exc.detail['items']))
+                continue
+            reserved += items[order.id]
+        kept.append(order)
+    if reserved:
+        OrderItem.objects.bulk_update(reserved, ['stock_reserved', 'stock_sold_out'])
+    return kept
@@ -0,0 +1,111 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class OptionalPageNumberPagination(PageNumberPagination):
+    """
+    Paginacija se uključuje samo kada klijent pošalje ?page ili ?page_size,
+    tako da postojeći klijenti i dalje dobijaju kompletnu listu.
+    """
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_page_size(self, request):
+        params = request.query_params
+        if self.page_size_query_param not in params and self.page_query_param not in params:
+            return None
+        return super().get_page_size(request)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) paginacija po (created_at, id) opadajuće. Svaka strana je
+    jedan indeksni seek, bez OFFSET-a, pa je strana 1000 jednako jeftina kao
+    strana 1, a nove stavke ne pomeraju strane tokom skrolovanja.
+    Uključuje se sa ?cursor= (prazan cursor = prva strana).
+    """
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+    # False: i bez ?cursor vraća se prva strana
+    optional = True
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    @staticmethod
+    def encode_cursor(instance):
+        # Radi i sa model instancama i sa .values() redovima
+        if isinstance(instance, dict):
+            created_at, pk = instance['created_at'], instance['id']
+        else:
+            created_at, pk = instance.created_at, instance.pk
+        raw = f'{created_at.isoformat()}|{pk}'
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(token):
+        try:
+            raw = base64.urlsafe_b64decode(token.encode()).decode()
+            created_at, pk = raw.rsplit('|', 1)
+            created_at = parse_datetime(created_at)
+            if created_at is None:
+                raise ValueError
+            return created_at, int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError, binascii.Error):
+            raise NotFound('Neispravan cursor.')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.optional and self.cursor_query_param not in request.query_params:
+            return None
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        token = request.query_params.get(self.cursor_query_param)
+
+        queryset = queryset.order_by(*self.ordering)
+        if token:
+            created_at, pk = self.decode_cursor(token)
+            # Prvi uslov je range nad indeksom, drugi razrešava isti created_at
+            queryset = queryset.filter(created_at__lte=created_at).filter(
+                Q(created_at__lt=created_at) | Q(id__lt=pk)
+            )
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class OrderPagination(KeysetPagination):
+    """Lista narudžbina raste bez ograničenja, pa je uvek paginirana"""
+    optional = False
+    page_size = 50
@@ -0,0 +1,49 @@
+"""
+Unapred izračunati podaci za početnu stranu: izdvojeni proizvodi i stablo
+kategorija. Grade se jednom po verziji keša i do sledeće izmene se samo čitaju.
+URL-ovi slika se čuvaju relativni (/media/...), jer isti podaci služe svim
+hostovima; odgovor ih pretvara u apsolutne (fastpath.absolute_media), kao u
+listi proizvoda.
+"""
+from django.conf import settings
+from django.db.models import Count
+
+from .models import Category, Subcategory, Product
+from .serializers import ProductListSerializer
+from . import fastpath
+
+
+def build_featured_products():
+    """Izdvojeni proizvodi u kompaktnoj reprezentaciji liste"""
+    limit = getattr(settings, 'SHOP_FEATURED_PRODUCTS_LIMIT', 12)
+    field_names = list(ProductListSerializer().fields)
+    rows = Product.objects.with_list_summary().filter(
+        featured=True
+    ).order_by('-created_at', '-id').values(*fastpath.product_columns(field_names))[:limit]
+    return fastpath.serialize_products(rows, field_names)
+
+
+def build_category_tree():
+    """Kategorije -> potkategorije sa brojem proizvoda, iz dva agregatna upita"""
+    subcategories = {}
+    rows = Subcategory.objects.annotate(
+        product_count=Count('products')
+    ).order_by('category_id', 'name').values('id', 'name', 'category_id', 'product_count')
+    for row in rows:
+        subcategories.setdefault(row['category_id'], []).append({
+            'id': row['id'],
+            'name': row['name'],
+            'product_count': row['product_count'],
+        })
+
+    return [
+        {
+            'id': row['id'],
+            'name': row['name'],
+            'product_count': row['product_count'],
+            'subcategories': subcategories.get(row['id'], []),
+        }
+        for row in Category.objects.annotate(
+            product_count=Count('products')
+        ).order_by('name').values('id', 'name', 'product_count')
+    ]
@@ -0,0 +1,287 @@
+"""
+Dnevni zbirovi prodaje za izveštaje (DailyOrderStats, DailyItemSales).
+
+Zbirovi se menjaju u istoj transakciji kao narudžbina: order_created pri
+kreiranju, status_changed pri promeni statusa. Izmena je jedan
+INSERT ... ON CONFLICT DO UPDATE po tabeli koji dodaje razliku na postojeći
+red, pa broj upita ne zavisi od broja stavki, a istovremene narudžbine ne
+gaze jedna drugu. Izveštaj čita samo redove iz traženog opsega dana, pa
+vreme odgovora ne zavisi od dužine istorije.
+
+Dan je datum kreiranja narudžbine (TIME_ZONE); narudžbina ostaje u svom
+danu i kada joj se kasnije promeni status. Komanda rebuild_reports računa
+zbirove ispočetka iz narudžbina (posle izmena mimo API-ja), aktivnih i
+arhiviranih (shop.archive).
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import fastpath
+from .filters import day_start
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, Category, DailyItemSales, DailyOrderStats, Order, OrderItem, Product
+)
+
+GROUPS = ['day', 'status', 'category', 'product', 'variant']
+# Narudžbine i stavke iz kojih rebuild računa zbirove
+SOURCES = [(Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)]
+UPSERT_BATCH = 500  # redova po INSERT-u
+
+
+def order_day(order):
+    return timezone.localdate(order.created_at)
+
+
+def upsert(model, key, rows, add, replace=()):
+    """
+    Dodaje redove jednim INSERT ... ON CONFLICT (key) DO UPDATE po seriji
+    (SQLite >= 3.24, PostgreSQL): polja iz add se sabiraju sa postojećim
+    redom, polja iz replace se prepisuju. Ključevi u rows moraju biti jedinstveni.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    meta = model._meta
+    table = quote(meta.db_table)
+    fields = [meta.get_field(name) for name in (*key, *add, *replace)]
+    updates = [f'{quote(name)} = {table}.{quote(name)} + excluded.{quote(name)}' for name in add]
+    updates += [f'{quote(name)} = excluded.{quote(name)}' for name in replace]
+    placeholder = f"({', '.join(['%s'] * len(fields))})"
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH):
+            batch = rows[start:start + UPSERT_BATCH]
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(quote(field.column) for field in fields)}) "
+                f"VALUES {', '.join([placeholder] * len(batch))} "
+                f"ON CONFLICT ({', '.join(quote(name) for name in key)}) DO UPDATE SET {', '.join(updates)}",
+                [field.get_db_prep_save(row[field.name], connection) for row in batch for field in fields]
+            )
+
+
+class Changes:
+    """Razlike zbirova, skupljene u memoriji pa upisane jednim upitom po tabeli"""
+
+    def __init__(self):
+        self.orders = {}
+        self.items = {}
+
+    def add_order(self, order, status, sign):
+        day = order_day(order)
+        row = self.orders.setdefault((day, status), {
+            'date': day, 'status': status, 'order_count': 0, 'revenue': Decimal(0),
+        })
+        row['order_count'] += sign
+        row['revenue'] += sign * order.total_amount
+
+    def add_item(self, day, item, sign):
+        variant_id = item.variant_id or 0
+        row = self.items.setdefault((day, item.product_id, variant_id), {
+            'date': day, 'product_id': item.product_id, 'variant_id': variant_id,
+            'category_id': item.product.category_id,
+            'product_name': item.product_name, 'variant_name': item.variant_name,
+            'quantity': 0, 'revenue': Decimal(0),
+        })
+        row['quantity'] += sign * item.quantity
+        row['revenue'] += sign * item.total_price
+
+    def save(self):
+        upsert(
+            DailyOrderStats, ['date', 'status'],
+            [row for row in self.orders.values() if row['order_count'] or row['revenue']],
+            add=['order_count', 'revenue']
+        )
+        upsert(
+            DailyItemSales, ['date', 'product_id', 'variant_id'],
+            [row for row in self.items.values() if row['quantity'] or row['revenue']],
+            add=['quantity', 'revenue'], replace=['category_id', 'product_name', 'variant_name']
+        )
+
+
+def order_created(order, items):
+    """Poziva se u transakciji koja kreira narudžbinu; stavke moraju imati učitan proizvod"""
+    changes = Changes()
+    changes.add_order(order, order.status, 1)
+    if order.status != 'cancelled':
+        day = order_day(order)
+        for item in items:
+            changes.add_item(day, item, 1)
+    changes.save()
+
+
+def status_changed(orders, new_status, items=()):
+    """
+    Poziva se u transakciji koja menja status; order.status je još stari.
+    items su stavke (sa učitanim proizvodom) narudžbina koje se otkazuju ili
+    vraćaju iz otkazanih, jer samo tada menjaju prodaju po proizvodima.
+    """
+    changes = Changes()
+    by_id = {}
+    for order in orders:
+        if order.status == new_status:
+            continue
+        by_id[order.id] = order
+        changes.add_order(order, order.status, -1)
+        changes.add_order(order, new_status, 1)
+    for item in items:
+        order = by_id.get(item.order_id)
+        if order is None or 'cancelled' not in (order.status, new_status):
+            continue
+        changes.add_item(order_day(order), item, -1 if new_status == 'cancelled' else 1)
+    changes.save()
+
+
+# Rebuild
+
+def rebuild(date_from=None, date_to=None):
+    """
+    Briše i ponovo računa zbirove za dane u opsegu (uključivo; bez granica
+    ceo period) u jednoj transakciji; vraća (redova po danu i statusu, redova prodaje)
+    """
+    stats = DailyOrderStats.objects.all()
+    sales = DailyItemSales.objects.all()
+    if date_from:
+        stats, sales = stats.filter(date__gte=date_from), sales.filter(date__gte=date_from)
+    if date_to:
+        stats, sales = stats.filter(date__lte=date_to), sales.filter(date__lte=date_to)
+
+    with transaction.atomic():
+        stats.delete()
+        sales.delete()
+        order_rows, item_rows = {}, {}
+        # Posebno, ne JOIN-om: arhivirane stavke mogu imati obrisan proizvod
+        categories = dict(Product.objects.values_list('id', 'category_id'))
+        for order_model, item_model in SOURCES:
+            orders = order_model.objects.all()
+            if date_from:
+                orders = orders.filter(created_at__gte=day_start(date_from))
+            if date_to:
+                orders = orders.filter(created_at__lt=day_start(date_to + timedelta(days=1)))
+
+            for row in (
+                orders.annotate(day=TruncDate('created_at')).order_by()
+                .values('day', 'status').annotate(count=Count('id'), revenue=Sum('total_amount'))
+            ):
+                total = order_rows.setdefault((row['day'], row['status']), DailyOrderStats(
+                    date=row['day'], status=row['status'], order_count=0, revenue=Decimal(0)
+                ))
+                total.order_count += row['count']
+                total.revenue += row['revenue']
+
+            for row in (
+                item_model.objects.filter(order__in=orders.exclude(status='cancelled').values('id'))
+                .annotate(day=TruncDate('order__created_at')).order_by()
+                .values('day', 'product_id', 'variant_id')
+                .annotate(
+                    quantity=Sum('quantity'), revenue=Sum('total_price'),
+                    product_name=Max('product_name'), variant_name=Max('variant_name'),
+                )
+            ):
+                variant_id = row['variant_id'] or 0
+                total = item_rows.setdefault((row['day'], row['product_id'], variant_id), DailyItemSales(
+                    date=row['day'], product_id=row['product_id'], variant_id=variant_id,
+                    category_id=categories.get(row['product_id']), product_name=row['product_name'],
+                    variant_name=row['variant_name'], quantity=0, revenue=Decimal(0),
+                ))
+                total.quantity += row['quantity']
+                total.revenue += row['revenue']
+
+        created_stats = DailyOrderStats.objects.bulk_create(order_rows.values(), batch_size=1000)
+        created_sales = DailyItemSales.objects.bulk_create(item_rows.values(), batch_size=1000)
+    return len(created_stats), len(created_sales)
+
+
+# Izveštaj
+
+class SalesReportSerializer(serializers.Serializer):
+    """Parametri izveštaja; bez datuma poslednjih 30 dana"""
+    group = serializers.ChoiceField(choices=GROUPS, default='day')
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=50)
+
+    def validate(self, attrs):
+        attrs.setdefault('date_to', timezone.localdate())
+        attrs.setdefault('date_from', attrs['date_to'] - timedelta(days=29))
+        if attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError("date_from ne može biti posle date_to.")
+        max_days = getattr(settings, 'SHOP_REPORT_MAX_DAYS', 366)
+        if (attrs['date_to'] - attrs['date_from']).days >= max_days:
+            raise serializers.ValidationError(f"Opseg može imati najviše {max_days} dana.")
+        return attrs
+
+
+def sales_report(group, date_from, date_to, limit=50):
+    stats = DailyOrderStats.objects.filter(date__gte=date_from, date__lte=date_to)
+    sales = DailyItemSales.objects.filter(date__gte=date_from, date__lte=date_to).order_by()
+    # Otkazane narudžbine ne ulaze u prihod
+    totals = stats.exclude(status='cancelled').aggregate(orders=Sum('order_count'), revenue=Sum('revenue'))
+
+    if group == 'day':
+        days = {
+            row['date']: row
+            for row in stats.exclude(status='cancelled').order_by().values('date')
+            .annotate(orders=Sum('order_count'), revenue=Sum('revenue'))
+        }
+        rows = []
+        for n in range((date_to - date_from).days + 1):
+            day = date_from + timedelta(days=n)
+            row = days.get(day, {})
+            rows.append({
+                'date': day.isoformat(),
+                'orders': row.get('orders') or 0,
+                'revenue': fastpath.decimal_str(row.get('revenue') or 0),
+            })
+    elif group == 'status':
+        by_status = {
+            row['status']: row
+            for row in stats.order_by().values('status').annotate(orders=Sum('order_count'), revenue=Sum('revenue'))
+        }
+        rows = [
+            {
+                'status': code,
+                'orders': by_status.get(code, {}).get('orders') or 0,
+                'revenue': fastpath.decimal_str(by_status.get(code, {}).get('revenue') or 0),
+            }
+            for code, _ in Order.STATUS_CHOICES
+        ]
+    else:
+        fields = {'category': ['category_id'], 'product': ['product_id'], 'variant': ['product_id', 'variant_id']}[group]
+        names = {}
+        if group != 'category':
+            names['product_name'] = Max('product_name')
+        if group == 'variant':
+            names['variant_name'] = Max('variant_name')
+        rows = list(
+            sales.values(*fields)
+            .annotate(quantity=Sum('quantity'), revenue=Sum('revenue'), **names)
+            # Redovi otkazane prodaje ostaju sa nulom do rebuild-a
+            .filter(quantity__gt=0)
+            .order_by('-revenue', *fields)[:limit]
+        )
+        if group == 'category':
+            categories = Category.objects.in_bulk([row['category_id'] for row in rows if row['category_id']])
+            for row in rows:
+                category = categories.get(row['category_id'])
+                row['category'] = category.name if category else None
+        for row in rows:
+            row['revenue'] = fastpath.decimal_str(row['revenue'])
+
+    return {
+        'group': group,
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'totals': {
+            'orders': totals['orders'] or 0,
+            'revenue': fastpath.decimal_str(totals['revenue'] or 0),
+        },
+        'rows': rows,
+    }
@@ -0,0 +1,458 @@
+"""
+Pretraga proizvoda. Indeksiraju se naziv, opis, kategorija, potkategorija
+i varijante (naziv i SKU) proizvoda.
+
+Tekst se pre indeksiranja normalizuje: mala slova, bez dijakritika
+(č/ć -> c, š -> s, ž -> z, đ -> dj), ćirilica u latinicu, i lako
+stemovanje padežnih nastavaka (kovanice/kovanica -> kovanic). Upit prolazi
+kroz isti postupak, a svaka reč se traži kao prefiks.
+
+Na SQLite-u indeks je FTS5 tabela (migracija 0007) koju signali ažuriraju u
+istoj transakciji; rangiranje je bm25. Bez FTS5 koristi se inverted index u
+memoriji procesa, sa istim BM25 rangiranjem, koji se menja samo za izmenjene
+proizvode (dnevnik izmena u kešu, kao kod shop.suggest).
+"""
+import bisect
+import hashlib
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .cache import KEY_PREFIX, get_cache, get_version
+
+TABLE = 'shop_product_search'
+
+# Težine kolona: naziv > kategorija > ostalo (opis, varijante)
+FIELDS = ('name', 'category', 'body')
+WEIGHTS = (10.0, 3.0, 1.0)
+
+_CYRILLIC = dict(zip(
+    'абвгдђежзијклљмнњопрстћуфхцчџш',
+    ['a', 'b', 'v', 'g', 'd', 'dj', 'e', 'z', 'z', 'i', 'j', 'k', 'l', 'lj', 'm', 'n', 'nj',
+     'o', 'p', 'r', 's', 't', 'c', 'u', 'f', 'h', 'c', 'c', 'dz', 's']
+))
+_FOLD = str.maketrans({'đ': 'dj', **_CYRILLIC})
+_TOKEN = re.compile(r'\w+')
+
+# Najduži nastavci prvi; koren mora da zadrži bar MIN_STEM slova
+SUFFIXES = sorted(
+    ['ovima', 'evima', 'ama', 'ima', 'ovi', 'evi', 'ova', 'eva', 'om', 'em', 'a', 'e', 'i', 'o', 'u'],
+    key=len, reverse=True
+)
+MIN_STEM = 3
+
+# Proces koji zaostaje više izmena od ovoga gradi memorijski indeks iz početka
+MAX_CATCH_UP = 1000
+
+_SEQ_KEY = f'{KEY_PREFIX}:search:seq'
+
+
+def fold(text):
+    """Mala slova bez dijakritika; ćirilica se preslovljava"""
+    text = (text or '').lower().translate(_FOLD)
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def stem(token):
+    if not token.isalpha():
+        return token
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text):
+    return [stem(token) for token in _TOKEN.findall(fold(text))]
+
+
+def build_document(product, variants):
+    """
+    product: dict sa name, description, category__name, subcategory__name;
+    variants: lista dict-ova sa name i sku. Vraća tekst po kolonama.
+    """
+    body = [product['description']]
+    for variant in variants:
+        body += [variant['name'], variant['sku']]
+    return {
+        'name': ' '.join(tokenize(product['name'])),
+        'category': ' '.join(tokenize(f"{product['category__name']} {product['subcategory__name'] or ''}")),
+        'body': ' '.join(tokenize(' '.join(filter(None, body)))),
+    }
+
+
+def load_documents(product_ids=None):
+    """{product_id: dokument}"""
+    from .models import Product, ProductVariant
+
+    products = Product.objects.order_by().values(
+        'id', 'name', 'description', 'category__name', 'subcategory__name'
+    )
+    variants = ProductVariant.objects.order_by().values('product_id', 'name', 'sku')
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+        variants = variants.filter(product_id__in=product_ids)
+
+    grouped = defaultdict(list)
+    for variant in variants.iterator(chunk_size=2000):
+        grouped[variant['product_id']].append(variant)
+    return {
+        product['id']: build_document(product, grouped.get(product['id'], []))
+        for product in products.iterator(chunk_size=2000)
+    }
+
+
+def query_terms(query):
+    return list(dict.fromkeys(tokenize(query)))
+
+
+def current_seq():
+    """Redni broj poslednje izmene indeksa; kreće od vremena u ms, kao verzije keša"""
+    cache = get_cache()
+    seq = cache.get(_SEQ_KEY)
+    if seq is None:
+        cache.add(_SEQ_KEY, int(time.time() * 1000), timeout=None)
+        seq = cache.get(_SEQ_KEY)
+    return seq
+
+
+def _log_changes(product_ids):
+    cache = get_cache()
+    current_seq()
+    seq = cache.incr(_SEQ_KEY)
+    cache.set(f'{KEY_PREFIX}:search:change:{seq}', product_ids, 24 * 60 * 60)
+
+
+def record_changes(product_ids):
+    """Izmenjeni proizvodi ulaze u dnevnik tek kada su vidljivi drugima"""
+    product_ids = frozenset(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: _log_changes(product_ids))
+
+
+def logged_changes(applied, seq):
+    """ID-jevi proizvoda izmenjenih posle applied, ili None ako dnevnik nije potpun"""
+    keys = [f'{KEY_PREFIX}:search:change:{n}' for n in range(applied + 1, seq + 1)]
+    changes = get_cache().get_many(keys)
+    if len(changes) != len(keys):
+        return None
+    return set().union(*changes.values())
+
+
+class FTS5Backend:
+    name = 'fts5'
+
+    # Baza -> da li FTS5 tabela postoji (proverava se jednom)
+    _available = {}
+
+    @classmethod
+    def available(cls):
+        if connection.vendor != 'sqlite':
+            return False
+        name = connection.settings_dict['NAME']
+        if name not in cls._available:
+            cls._available[name] = TABLE in connection.introspection.table_names()
+        return cls._available[name]
+
+    def index(self, documents):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s', [(pk,) for pk in documents])
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (rowid, name, category, body) VALUES (%s, %s, %s, %s)',
+                [(pk, doc['name'], doc['category'], doc['body']) for pk, doc in documents.items()]
+            )
+
+    def remove(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s', [(pk,) for pk in product_ids])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+        self.index(load_documents())
+
+    def search(self, terms, limit):
+        # Termini su \w+ tokeni, pa su bezbedni unutar navodnika
+        match = ' '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(w) for w in WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, bm25({TABLE}, {weights}) AS score FROM {TABLE} '
+                f'WHERE {TABLE} MATCH %s ORDER BY score LIMIT %s',
+                [match, limit]
+            )
+            # bm25 je negativan; manji je bolji
+            return [(pk, -score) for pk, score in cursor.fetchall()]
+
+
+class MemoryIndex:
+    """
+    Nepromenljivo stanje indeksa u memoriji. Čuvaju se težinske učestalosti
+    termina i dužine dokumenata, a BM25 se računa pri upitu, pa izmena jednog
+    proizvoda menja samo njegove postinge (IDF i prosečna dužina slede same).
+    """
+
+    def __init__(self, postings, terms, lengths, vocabulary, total_length):
+        self.postings = postings  # termin -> {product_id: učestalost}
+        self.terms = terms  # product_id -> {termin: učestalost}
+        self.lengths = lengths  # product_id -> dužina dokumenta
+        self.vocabulary = vocabulary  # sortirani termini, za prefiksne upite
+        self.total_length = total_length
+
+    @staticmethod
+    def counts(document):
+        counts = defaultdict(float)
+        for field, weight in zip(FIELDS, WEIGHTS):
+            for term in document[field].split():
+                counts[term] += weight
+        return dict(counts)
+
+    @classmethod
+    def build(cls, documents):
+        postings = defaultdict(dict)
+        terms = {}
+        for pk, document in documents.items():
+            terms[pk] = counts = cls.counts(document)
+            for term, frequency in counts.items():
+                postings[term][pk] = frequency
+        lengths = {pk: sum(counts.values()) for pk, counts in terms.items()}
+        return cls(dict(postings), terms, lengths, sorted(postings), sum(lengths.values()))
+
+    def apply(self, documents, removed):
+        """Novo stanje sa izmenjenim i uklonjenim proizvodima; ovo ostaje netaknuto"""
+        postings = dict(self.postings)
+        terms = dict(self.terms)
+        lengths = dict(self.lengths)
+        total_length = self.total_length
+
+        # Kopiraju se samo postinzi termina koje izmena dotiče
+        changed = {}
+
+        def posting(term):
+            if term not in changed:
+                changed[term] = dict(postings.get(term, {}))
+            return changed[term]
+
+        for pk in set(removed) | set(documents):
+            for term in terms.pop(pk, {}):
+                posting(term).pop(pk, None)
+            total_length -= lengths.pop(pk, 0)
+        for pk, document in documents.items():
+            terms[pk] = counts = self.counts(document)
+            for term, frequency in counts.items():
+                posting(term)[pk] = frequency
+            lengths[pk] = sum(counts.values())
+            total_length += lengths[pk]
+
+        added, dropped = set(), set()
+        for term, docs in changed.items():
+            if docs:
+                if term not in postings:
+                    added.add(term)
+                postings[term] = docs
+            elif postings.pop(term, None) is not None:
+                dropped.add(term)
+        vocabulary = self.vocabulary
+        if added or dropped:
+            vocabulary = [term for term in vocabulary if term not in dropped]
+            for term in added:
+                bisect.insort(vocabulary, term)
+        return MemoryIndex(postings, terms, lengths, vocabulary, total_length)
+
+
+class MemoryBackend:
+    """
+    Inverted index u memoriji procesa, sa BM25 rangiranjem (i težinama
+    kolona) kao FTS5. Upit kreće od najređe reči, a ostale reči proverava
+    lookup-om po proizvodu.
+
+    Izmene iz ovog procesa odmah menjaju samo postinge izmenjenih proizvoda.
+    Posle commit-a ID-jevi ulaze u dnevnik u kešu, kao kod predloga
+    (shop.suggest), pa ostali procesi ponovo učitaju samo te proizvode. Ceo
+    indeks se gradi pri prvom upitu, kada dnevnik nije potpun i u rebuild().
+    """
+    name = 'memory'
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (redni broj dnevnika, MemoryIndex); menja se odjednom, pa pretraga
+        # bez lock-a uvek vidi konzistentan indeks
+        self.state = (None, None)
+        # Proizvodi izmenjeni u transakciji koja možda bude poništena; posle
+        # nje se ponovo učitavaju iz baze
+        self.unconfirmed = set()
+
+    @staticmethod
+    def available():
+        return True
+
+    def current(self):
+        seq = current_seq()
+        applied, index = self.state
+        settled = self.unconfirmed and not connection.in_atomic_block
+        if index is not None and seq == applied and not settled:
+            return index
+        with self.lock:
+            applied, index = self.state
+            if index is None or not applied <= seq <= applied + MAX_CATCH_UP:
+                return self._build(seq)
+            product_ids = logged_changes(applied, seq)
+            if product_ids is None:
+                return self._build(seq)
+            if not connection.in_atomic_block:
+                product_ids |= self.unconfirmed
+                self.unconfirmed = set()
+            if product_ids:
+                documents = load_documents(product_ids)
+                index = index.apply(documents, product_ids - set(documents))
+            self.state = (seq, index)
+            return index
+
+    def _build(self, seq):
+        # Redni broj je pročitan pre baze: izmene tokom izgradnje se primene ponovo
+        if not connection.in_atomic_block:
+            self.unconfirmed = set()
+        self.state = (seq, MemoryIndex.build(load_documents()))
+        return self.state[1]
+
+    def _patch(self, documents, removed):
+        product_ids = set(documents) | set(removed)
+        with self.lock:
+            applied, index = self.state
+            if index is not None:
+                self.state = (applied, index.apply(documents, removed))
+                if connection.in_atomic_block:
+                    self.unconfirmed |= product_ids
+        record_changes(product_ids)
+
+    def index(self, documents):
+        self._patch(documents, ())
+
+    def remove(self, product_ids):
+        self._patch({}, product_ids)
+
+    def rebuild(self):
+        with self.lock:
+            self._build(current_seq())
+
+    @staticmethod
+    def _expand(vocabulary, term):
+        start = bisect.bisect_left(vocabulary, term)
+        end = bisect.bisect_left(vocabulary, term + '\uffff')
+        return vocabulary[start:end]
+
+    def search(self, terms, limit):
+        index = self.current()
+        postings, lengths = index.postings, index.lengths
+        expanded = [self._expand(index.vocabulary, term) for term in terms]
+        if not all(expanded):
+            return []
+        expanded.sort(key=lambda words: sum(len(postings[word]) for word in words))
+
+        total = len(lengths)
+        average = index.total_length / total
+        k1, b = self.k1, self.b
+
+        def weight(word):
+            """IDF reči i funkcija (učestalost, product_id) -> BM25 skor"""
+            df = len(postings[word])
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            return lambda frequency, pk: idf * frequency * (k1 + 1) / (
+                frequency + k1 * (1 - b + b * lengths[pk] / average)
+            )
+
+        candidates = defaultdict(float)
+        for word in expanded[0]:
+            score = weight(word)
+            for pk, frequency in postings[word].items():
+                candidates[pk] += score(frequency, pk)
+        # Sve reči upita moraju da se pojave (AND)
+        for words in expanded[1:]:
+            scored = [(postings[word], weight(word)) for word in words]
+            matched = {}
+            for pk, score in candidates.items():
+                extra = sum(
+                    weigh(docs[pk], pk) for docs, weigh in scored if pk in docs
+                )
+                if extra:
+                    matched[pk] = score + extra
+            candidates = matched
+        return heapq.nlargest(limit, candidates.items(), key=lambda item: (item[1], -item[0]))
+
+
+_memory = MemoryBackend()
+
+
+def get_backend():
+    name = getattr(settings, 'SHOP_SEARCH_BACKEND', 'auto')
+    if name == 'memory':
+        return _memory
+    fts5 = FTS5Backend()
+    if name == 'fts5' or fts5.available():
+        return fts5
+    return _memory
+
+
+def get_limit(limit=None):
+    return limit or getattr(settings, 'SHOP_SEARCH_LIMIT', 500)
+
+
+def _ranked(query, limit):
+    """Do limit + 1 rezultata, da se zna da li ih ima više od limita"""
+    terms = query_terms(query)
+    if not terms:
+        return []
+    backend = get_backend()
+
+    cache = get_cache()
+    digest = hashlib.sha1(repr((backend.name, terms, limit)).encode()).hexdigest()
+    key = f"{KEY_PREFIX}:search:{get_version('search')}:{digest}"
+    results = cache.get(key)
+    if results is None:
+        results = backend.search(terms, limit + 1)
+        cache.set(key, results, getattr(settings, 'SHOP_CATALOG_CACHE_TIMEOUT', 300))
+    return results
+
+
+def search(query, limit=None):
+    """
+    [(product_id, score)] po relevantnosti, najviše limit (SHOP_SEARCH_LIMIT)
+    najrelevantnijih. Rezultati se keširaju do sledeće izmene indeksa
+    (verzija 'search').
+    """
+    limit = get_limit(limit)
+    return _ranked(query, limit)[:limit]
+
+
+def is_truncated(query, limit=None):
+    """Da li upit ima više pogodaka nego što search() vraća"""
+    limit = get_limit(limit)
+    return len(_ranked(query, limit)) > limit
+
+
+def index_products(product_ids):
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+    backend = get_backend()
+    documents = load_documents(product_ids)
+    backend.remove(product_ids - set(documents))
+    backend.index(documents)
+
+
+def remove_products(product_ids):
+    get_backend().remove(product_ids)
+
+
+def rebuild():
+    get_backend().rebuild()
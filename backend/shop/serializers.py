@@ -1,10 +1,46 @@
+from django.core.files.storage import default_storage
+from django.db import transaction
 from rest_framework import serializers
+from . import inventory, notifications, reports
+from .orders import MAX_BULK
 from .models import (
     Category, Subcategory, Product, ProductVariant,
-    ProductImage, Order, OrderItem
+    ProductImage, Order, OrderItem, ArchivedOrder, ArchivedOrderItem
 )
 
 
+def parse_field_list(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+def requested_fields(request):
+    """Vraća (fields, expand) iz ?fields= i ?expand= parametara"""
+    if request is None:
+        return set(), set()
+    params = request.query_params
+    return parse_field_list(params.get('fields')), parse_field_list(params.get('expand'))
+
+
+class DynamicFieldsMixin:
+    """
+    ?fields=a,b vraća samo navedena polja, ?expand=x,y uključuje polja iz
+    Meta.expandable_fields koja se inače ne šalju.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        only, expand = requested_fields(self.context.get('request'))
+
+        for name in getattr(self.Meta, 'expandable_fields', []):
+            if name not in expand and name not in only:
+                fields.pop(name, None)
+
+        if only:
+            for name in set(fields) - only:
+                fields.pop(name)
+        return fields
+
+
 class SubcategorySerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
 
@@ -15,12 +51,18 @@ class SubcategorySerializer(serializers.ModelSerializer):
 
 class CategorySerializer(serializers.ModelSerializer):
     subcategories = SubcategorySerializer(many=True, read_only=True)
-    product_count = serializers.IntegerField(source='products.count', read_only=True)
+    product_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
         fields = ['id', 'name', 'description', 'subcategories', 'product_count', 'created_at']
 
+    def get_product_count(self, obj):
+        # CategoryViewSet anotira broj proizvoda; posle create/update anotacije nema
+        if hasattr(obj, 'product_count'):
+            return obj.product_count
+        return obj.products.count()
+
 
 class ProductImageSerializer(serializers.ModelSerializer):
     class Meta:
@@ -39,7 +81,7 @@ class ProductVariantSerializer(serializers.ModelSerializer):
         ]
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     subcategory_name = serializers.CharField(source='subcategory.name', read_only=True)
     current_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
@@ -58,6 +100,45 @@ class ProductSerializer(serializers.ModelSerializer):
         ]
 
 
+class ProductListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Kompaktna reprezentacija za listu proizvoda: samo glavna slika i broj
+    varijanti sa rasponom cena. Opis, varijante i slike se dobijaju sa ?expand=.
+    Očekuje queryset anotiran sa ProductQuerySet.with_list_summary().
+    """
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    subcategory_name = serializers.CharField(source='subcategory.name', read_only=True)
+    current_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    primary_image = serializers.SerializerMethodField()
+    variant_count = serializers.IntegerField(read_only=True)
+    min_final_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    max_final_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
+    variants = ProductVariantSerializer(many=True, read_only=True)
+    images = ProductImageSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Product
+        fields = [
+            'id', 'name', 'description', 'price', 'on_sale', 'sale_price',
+            'category', 'category_name', 'subcategory', 'subcategory_name',
+            'current_price', 'featured', 'in_stock', 'primary_image',
+            'variant_count', 'min_final_price', 'max_final_price',
+            'variants', 'images'
+        ]
+        expandable_fields = ['description', 'variants', 'images']
+
+    def get_primary_image(self, obj):
+        # Isto kao ImageField: apsolutni URL kada postoji request
+        if not obj.primary_image:
+            return None
+        url = default_storage.url(obj.primary_image)
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
 # Serializers za Order i OrderItem
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -85,7 +166,74 @@ class OrderSerializer(serializers.ModelSerializer):
             'total_amount', 'created_at', 'updated_at',
             'sms_sent', 'email_sent', 'items'
         ]
-        read_only_fields = ['total_amount', 'sms_sent', 'email_sent']
+        # Status se menja samo kroz update_status / bulk_status (zaliha, izveštaji, SMS)
+        read_only_fields = ['status', 'total_amount', 'sms_sent', 'email_sent']
+
+    def validate(self, attrs):
+        # Read-only polje bi se tiho ignorisalo; promena statusa se odbija uz uputstvo
+        status = self.initial_data.get('status') if self.instance is not None else None
+        if status is not None and status != self.instance.status:
+            raise serializers.ValidationError({
+                'status': "Status se menja kroz POST /api/orders/{id}/update_status/ ili /api/orders/bulk_status/."
+            })
+        return attrs
+
+
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """Lista narudžbina bez stavki (?summary=1); item_count je anotiran u upitu"""
+    item_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'customer_name', 'customer_phone', 'customer_email',
+            'status', 'total_amount', 'created_at', 'updated_at',
+            'sms_sent', 'email_sent', 'item_count'
+        ]
+
+
+class ArchivedOrderItemSerializer(OrderItemSerializer):
+    class Meta(OrderItemSerializer.Meta):
+        model = ArchivedOrderItem
+
+
+class ArchivedOrderSerializer(OrderSerializer):
+    """Arhivirana narudžbina, samo za čitanje (ArchivedOrderViewSet)"""
+    items = ArchivedOrderItemSerializer(many=True, read_only=True)
+
+    class Meta(OrderSerializer.Meta):
+        model = ArchivedOrder
+        fields = OrderSerializer.Meta.fields + ['archived_at']
+
+
+class ArchivedOrderSummarySerializer(OrderSummarySerializer):
+    class Meta(OrderSummarySerializer.Meta):
+        model = ArchivedOrder
+        fields = OrderSummarySerializer.Meta.fields + ['archived_at']
+
+
+class StatusChangeSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+
+class BulkStatusSerializer(serializers.Serializer):
+    """
+    Grupna promena statusa: {"ids": [...], "status": "confirmed"} ili
+    {"changes": [{"id": 1, "status": "confirmed"}, ...]}
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=MAX_BULK)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, required=False)
+    changes = StatusChangeSerializer(many=True, required=False, max_length=MAX_BULK)
+
+    def validate(self, attrs):
+        if attrs.get('changes'):
+            changes = {change['id']: change['status'] for change in attrs['changes']}
+        elif attrs.get('ids') and 'status' in attrs:
+            changes = dict.fromkeys(attrs['ids'], attrs['status'])
+        else:
+            raise serializers.ValidationError("Potrebni su ids i status, ili changes.")
+        return {'changes': changes}
 
 
 class OrderCreateSerializer(serializers.Serializer):
@@ -111,56 +259,85 @@ class OrderCreateSerializer(serializers.Serializer):
         for item in items:
             if 'product_id' not in item:
                 raise serializers.ValidationError("Nedostaje product_id u stavci.")
-            if 'quantity' not in item or item['quantity'] < 1:
+            try:
+                item['product_id'] = int(item['product_id'])
+                item['variant_id'] = int(item['variant_id']) if item.get('variant_id') else None
+                item['quantity'] = int(item.get('quantity', 0))
+            except (TypeError, ValueError):
+                raise serializers.ValidationError("product_id, variant_id i quantity moraju biti celi brojevi.")
+            if item['quantity'] < 1:
                 raise serializers.ValidationError("Količina mora biti najmanje 1.")
 
         return items
 
+    def validate(self, attrs):
+        """
+        Svi proizvodi i varijante iz stavki se čitaju sa po jednim upitom;
+        varijanta mora pripadati proizvodu iz iste stavke. Lager se ovde samo
+        okvirno proverava; zaliha se skida tek u create().
+        """
+        items = attrs['items']
+        products = Product.objects.in_bulk({item['product_id'] for item in items})
+        variant_ids = {item['variant_id'] for item in items if item['variant_id']}
+        variants = ProductVariant.objects.in_bulk(variant_ids) if variant_ids else {}
+
+        lines = []
+        for item in items:
+            product = products.get(item['product_id'])
+            if product is None:
+                raise serializers.ValidationError({'items': f"Proizvod {item['product_id']} ne postoji."})
+            variant = None
+            if item['variant_id']:
+                variant = variants.get(item['variant_id'])
+                if variant is None or variant.product_id != product.id:
+                    raise serializers.ValidationError(
+                        {'items': f"Varijanta {item['variant_id']} ne pripada proizvodu {product.id}."}
+                    )
+                # Naziv varijante u porukama o zalihi čita proizvod; već je učitan
+                variant.product = product
+            inventory.check_available(variant or product, item['quantity'])
+            lines.append((product, variant, item['quantity']))
+
+        attrs['lines'] = lines
+        return attrs
+
+    @transaction.atomic
     def create(self, validated_data):
-        items_data = validated_data.pop('items')
-
-        # Kreiraj Order
-        order = Order.objects.create(
-            customer_name=validated_data['customer_name'],
-            customer_phone=validated_data['customer_phone'],
-            customer_email=validated_data.get('customer_email', ''),
-            delivery_address=validated_data.get('delivery_address', ''),
-            notes=validated_data.get('notes', ''),
-            total_amount=0  # Temp, izračunaćemo ispod
-        )
-
+        items = []
         total = 0
-
-        # Kreiraj OrderItems
-        for item_data in items_data:
-            product = Product.objects.get(id=item_data['product_id'])
-            variant = None
-            variant_name = ''
-
-            if 'variant_id' in item_data and item_data['variant_id']:
-                variant = ProductVariant.objects.get(id=item_data['variant_id'])
-                unit_price = variant.final_price
-                variant_name = variant.name
-            else:
-                unit_price = product.current_price
-
-            quantity = item_data['quantity']
+        for product, variant, quantity in validated_data['lines']:
+            unit_price = variant.final_price if variant else product.current_price
             total_price = unit_price * quantity
             total += total_price
-
-            OrderItem.objects.create(
-                order=order,
+            items.append(OrderItem(
                 product=product,
                 variant=variant,
                 quantity=quantity,
                 unit_price=unit_price,
                 total_price=total_price,
                 product_name=product.name,
-                variant_name=variant_name
-            )
+                variant_name=variant.name if variant else ''
+            ))
 
-        # Update total
-        order.total_amount = total
-        order.save()
+        order = Order.objects.create(
+            customer_name=validated_data['customer_name'],
+            customer_phone=validated_data['customer_phone'],
+            customer_email=validated_data.get('customer_email', ''),
+            delivery_address=validated_data.get('delivery_address', ''),
+            notes=validated_data.get('notes', ''),
+            total_amount=total
+        )
 
-        return order
\ No newline at end of file
+        # Sve stavke jednim INSERT-om; bulk_create ne šalje post_save, ali
+        # Order.objects.create je već podigao verziju keša narudžbina
+        for item in items:
+            item.order = order
+        # Uslovni UPDATE zaliha; ako nema dovoljno, cela transakcija se poništava
+        inventory.reserve(items)
+        OrderItem.objects.bulk_create(items)
+
+        # Stavke su već u memoriji; odgovor i email ne idu ponovo u bazu
+        order._prefetched_objects_cache = {'items': items}
+        notifications.order_created(order)
+        reports.order_created(order, items)
+        return order
@@ -0,0 +1,70 @@
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .cache import bump_version
+from .models import (
+    Category, Subcategory, Product, ProductVariant,
+    ProductImage, Order, OrderItem
+)
+from . import search, suggest
+
+CATALOG_MODELS = [Category, Subcategory, Product, ProductVariant, ProductImage]
+ORDER_MODELS = [Order, OrderItem]
+# Modeli od kojih zavisi stablo kategorija (shop.precomputed)
+CATEGORY_TREE_MODELS = [Category, Subcategory, Product]
+# Modeli čiji se tekst nalazi u indeksu pretrage (shop.search)
+SEARCH_MODELS = [Category, Subcategory, Product, ProductVariant]
+
+
+# Vezano samo za ove modele: ostali (outbox, idempotency ključevi) zadržavaju
+# brzo brisanje jednim DELETE-om, koje Django isključuje čim model ima slušaoca
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Subcategory)
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductVariant)
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=Order)
+@receiver([post_save, post_delete], sender=OrderItem)
+def invalidate_catalog_cache(sender, **kwargs):
+    if sender in CATALOG_MODELS:
+        bump_version('catalog')
+        if sender in CATEGORY_TREE_MODELS:
+            bump_version('category-tree')
+        if sender in SEARCH_MODELS:
+            bump_version('search')
+            suggest.record_change(sender, kwargs['instance'].pk)
+    elif sender in ORDER_MODELS:
+        bump_version('orders')
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    search.index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=ProductVariant)
+def index_variant_product(sender, instance, **kwargs):
+    search.index_products([instance.product_id])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Subcategory)
+def index_category_products(sender, instance, created, **kwargs):
+    if not created:
+        search.index_products(instance.products.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Subcategory)
+def remember_subcategory_products(sender, instance, **kwargs):
+    # Proizvodi ostaju (SET_NULL), ali posle brisanja više ne znamo koji su
+    instance._search_product_ids = list(instance.products.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Subcategory)
+def index_subcategory_products(sender, instance, **kwargs):
+    search.index_products(getattr(instance, '_search_product_ids', []))
@@ -0,0 +1,276 @@
+"""
+SMS poruke. Backend-i imaju isti oblik kao Django email backend-i:
+open(), close() i send_messages(messages), gde je poruka SMSMessage.
+send_messages vraća listu rezultata istim redom kao poruke: None kada je
+poruka prihvaćena, inače izuzetak. Referenca koju vrati gateway upisuje se
+u message.reference.
+
+Backend se bira podešavanjem SHOP_SMS_BACKEND:
+- shop.sms.ConsoleBackend: ispis na stdout (razvoj)
+- shop.sms.FileBackend: dopisuje u SHOP_SMS_FILE_PATH
+- shop.sms.LocmemBackend: čuva u shop.sms.outbox (testovi)
+- shop.sms.HTTPGatewayBackend: HTTP gateway iz SHOP_SMS_GATEWAY (URL i token
+  iz SHOP_SMS_GATEWAY_URL i SHOP_SMS_GATEWAY_TOKEN u okruženju)
+
+Slanje ide iz outbox-a (shop.notifications), u serijama; zahtev za
+narudžbinu nikad ne čeka gateway.
+"""
+import http.client
+import json
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+# Poslate poruke za LocmemBackend, kao django.core.mail.outbox
+outbox = []
+
+_GSM = str.maketrans({'č': 'c', 'ć': 'c', 'š': 's', 'ž': 'z', 'đ': 'dj',
+                      'Č': 'C', 'Ć': 'C', 'Š': 'S', 'Ž': 'Z', 'Đ': 'Dj'})
+
+
+@dataclass
+class SMSMessage:
+    to: str
+    text: str
+    reference: str = ''
+
+
+def to_gsm(text):
+    """Bez dijakritika: GSM-7 poruka ima 160 znakova, UCS-2 samo 70"""
+    return text.translate(_GSM)
+
+
+def normalize_phone(phone):
+    """0641234567 -> +381641234567"""
+    phone = ''.join(ch for ch in phone if ch.isdigit() or ch == '+')
+    if phone.startswith('0'):
+        return '+381' + phone[1:]
+    return phone
+
+
+def render_order_sms(order):
+    """[(broj, tekst)] za kupca i vlasnike"""
+    messages = [(
+        order.customer_phone,
+        f'Primili smo Vasu narudzbinu #{order.id}, ukupno {order.total_amount} RSD. '
+        f'Javicemo Vam se radi potvrde.'
+    )]
+    owner_text = (
+        f'Nova narudzbina #{order.id}: {order.customer_name}, {order.customer_phone}, '
+        f'{order.total_amount} RSD'
+    )
+    for phone in getattr(settings, 'SHOP_ORDER_NOTIFICATION_PHONES', []):
+        messages.append((phone, owner_text))
+    return [(normalize_phone(phone), to_gsm(text)) for phone, text in messages]
+
+
+def render_status_sms(order, status):
+    """(broj, tekst) za kupca posle promene statusa, ili None ako za status nema poruke"""
+    template = getattr(settings, 'SHOP_ORDER_STATUS_SMS', {}).get(status)
+    if not template:
+        return None
+    text = template.format(id=order.id, total=order.total_amount)
+    return normalize_phone(order.customer_phone), to_gsm(text)
+
+
+class BaseBackend:
+
+    def __init__(self, **kwargs):
+        pass
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise NotImplementedError
+
+
+class ConsoleBackend(BaseBackend):
+
+    def __init__(self, stream=None, **kwargs):
+        self.stream = stream or sys.stdout
+        self.lock = threading.Lock()
+
+    def send_messages(self, messages):
+        with self.lock:
+            for message in messages:
+                self.stream.write(f'SMS za {message.to}: {message.text}\n')
+            self.stream.flush()
+        return [None] * len(messages)
+
+
+class FileBackend(BaseBackend):
+
+    def __init__(self, file_path=None, **kwargs):
+        self.file_path = file_path or getattr(settings, 'SHOP_SMS_FILE_PATH', None)
+        if not self.file_path:
+            raise ValueError('FileBackend zahteva SHOP_SMS_FILE_PATH')
+        self.lock = threading.Lock()
+
+    def send_messages(self, messages):
+        with self.lock, open(self.file_path, 'a', encoding='utf-8') as stream:
+            return ConsoleBackend(stream).send_messages(messages)
+
+
+class LocmemBackend(BaseBackend):
+
+    def send_messages(self, messages):
+        for n, message in enumerate(messages, start=len(outbox) + 1):
+            message.reference = message.reference or f'locmem-{n}'
+        outbox.extend(messages)
+        return [None] * len(messages)
+
+
+class RateLimiter:
+    """Token bucket: najviše rate poruka u sekundi, uz nalet do burst poruka"""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst or max(rate, 1)
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.burst
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self, count=1):
+        """Čeka dok se ne oslobodi count mesta (count ne sme biti veći od burst)"""
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= count
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        # Mesto je već rezervisano; ostali pozivi čekaju iza ovog
+        if wait:
+            self.sleep(wait)
+
+
+# (URL gateway-a, rate) -> RateLimiter; ograničenje važi za sve niti i backend-e u procesu
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(url, rate):
+    with _limiters_lock:
+        if (url, rate) not in _limiters:
+            _limiters[url, rate] = RateLimiter(rate)
+        return _limiters[url, rate]
+
+
+class HTTPGatewayBackend(BaseBackend):
+    """
+    Generički HTTP gateway. Serija poruka je jedan POST na URL:
+        {"sender": "...", "messages": [{"to": "+381...", "text": "..."}]}
+    uz "Authorization: Bearer <TOKEN>"; odgovor je
+        {"results": [{"id": "...", "status": "accepted"} | {"status": "rejected", "error": "..."}]}
+    istim redom. Konekcija (keep-alive) se čuva između serija. Bez URL-a ili
+    tokena ništa se ne šalje: sve poruke dobijaju ImproperlyConfigured.
+    """
+
+    def __init__(self, **kwargs):
+        config = {**getattr(settings, 'SHOP_SMS_GATEWAY', {}), **kwargs}
+        self.configured = bool(config.get('URL') and config.get('TOKEN'))
+        self.url = urlsplit(config.get('URL', ''))
+        self.token = config.get('TOKEN', '')
+        self.sender = config.get('SENDER', '')
+        self.batch_size = config.get('BATCH_SIZE', 100)
+        self.timeout = config.get('TIMEOUT', 10)
+        rate = config.get('RATE_LIMIT', 10)
+        self.limiter = get_limiter(config.get('URL', ''), rate)
+        self.batch_size = max(1, int(min(self.batch_size, self.limiter.burst)))
+        self.connection = None
+
+    def open(self):
+        if self.connection is None:
+            connection_class = (
+                http.client.HTTPSConnection if self.url.scheme == 'https' else http.client.HTTPConnection
+            )
+            self.connection = connection_class(self.url.netloc, timeout=self.timeout)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def _post(self, body):
+        headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {self.token}'}
+        # Server može zatvoriti neaktivnu konekciju; tada jedan ponovni pokušaj sa novom
+        for retry in (False, True):
+            self.open()
+            try:
+                self.connection.request('POST', self.url.path or '/', body=body, headers=headers)
+                response = self.connection.getresponse()
+                return response.status, response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self.close()
+                if retry:
+                    raise
+
+    def send_messages(self, messages):
+        if not self.configured:
+            error = ImproperlyConfigured(
+                'SMS gateway: SHOP_SMS_GATEWAY_URL i SHOP_SMS_GATEWAY_TOKEN nisu podešeni'
+            )
+            return [error] * len(messages)
+        results = []
+        for start in range(0, len(messages), self.batch_size):
+            batch = messages[start:start + self.batch_size]
+            self.limiter.acquire(len(batch))
+            results += self._send_batch(batch)
+        return results
+
+    def _send_batch(self, batch):
+        body = json.dumps({
+            'sender': self.sender,
+            'messages': [{'to': message.to, 'text': message.text} for message in batch],
+        }).encode()
+        try:
+            status, content = self._post(body)
+            if status != 200:
+                raise RuntimeError(f'SMS gateway: HTTP {status} {content[:200]!r}')
+            replies = json.loads(content)['results']
+            if len(replies) != len(batch):
+                raise RuntimeError('SMS gateway: broj rezultata ne odgovara broju poruka')
+        except Exception as exc:
+            self.close()
+            return [exc] * len(batch)
+
+        results = []
+        for message, reply in zip(batch, replies):
+            if reply.get('status') == 'accepted':
+                message.reference = str(reply.get('id', ''))
+                results.append(None)
+            else:
+                results.append(RuntimeError(f"SMS gateway: {reply.get('error') or reply.get('status')}"))
+        return results
+
+
+def get_backend(path=None, **kwargs):
+    return import_string(path or getattr(settings, 'SHOP_SMS_BACKEND', 'shop.sms.ConsoleBackend'))(**kwargs)
+
+
+_local = threading.local()
+
+
+def get_connection():
+    """Backend po niti; ostaje otvoren između serija, da se konekcija ka gateway-u ne otvara svaki put"""
+    path = getattr(settings, 'SHOP_SMS_BACKEND', 'shop.sms.ConsoleBackend')
+    key = (path, repr(getattr(settings, 'SHOP_SMS_GATEWAY', None)))
+    backend = getattr(_local, 'backend', None)
+    if backend is None or _local.key != key:
+        if backend is not None:
+            backend.close()
+        backend = get_backend(path)
+        backend.open()
+        _local.backend, _local.key = backend, key
+    return backend
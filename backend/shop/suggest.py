@@ -0,0 +1,285 @@
+"""
+Predlozi za polje pretrage (typeahead): nazivi proizvoda, kategorije,
+potkategorije i dimenzije varijanti (npr. "40×40mm").
+
+Indeks je u memoriji procesa: za svaku vrstu sortirana lista ključeva
+(tekst od početka svake reči naziva do kraja, bez dijakritika), pa je
+upit jedan bisect i kratko čitanje niza. Snapshot indeksa se nikad ne menja;
+izmena pravi novi snapshot i zamenjuje referencu, pa čitaoci ne zaključavaju.
+
+Izmene kataloga se posle commit-a upisuju u dnevnik u kešu (redni broj +
+model i ID). Svaki proces pri upitu pročita samo redni broj, a kada zaostaje
+ponovo učita izmenjene redove i ažurira indeks inkrementalno. Ako dnevnik
+nije potpun (izbačen iz keša), indeks se gradi iz početka.
+"""
+import bisect
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from .cache import KEY_PREFIX, get_cache
+from .search import fold
+
+KINDS = ('categories', 'subcategories', 'variants', 'products')
+MAX_WORDS = 8
+# Proces koji zaostaje više izmena od ovoga gradi indeks iz početka
+MAX_CATCH_UP = 1000
+
+_SEQ_KEY = f'{KEY_PREFIX}:suggest:seq'
+
+
+def normalize(text):
+    return ' '.join(fold(text).replace('×', 'x').split())
+
+
+def prefix_keys(label):
+    """'Kovanica ukrasna 40×40' -> ['kovanica ukrasna 40x40', 'ukrasna 40x40', '40x40']"""
+    text = normalize(label)
+    keys = [text]
+    position = text.find(' ')
+    while position != -1 and len(keys) < MAX_WORDS:
+        keys.append(text[position + 1:])
+        position = text.find(' ', position + 1)
+    return keys
+
+
+class Snapshot:
+    """
+    Nepromenljivo stanje indeksa. entries[kind]: ključ -> stavka,
+    keys[kind]: sortirana lista (ključ prefiksa, ključ stavke).
+    """
+
+    def __init__(self, entries, keys, variant_names):
+        self.entries = entries
+        self.keys = keys
+        # variant_id -> (product_id, naziv), da se zna šta oduzeti pri izmeni
+        self.variant_names = variant_names
+
+    @classmethod
+    def build(cls, rows):
+        entries = {kind: {} for kind in KINDS}
+        keys = {kind: [] for kind in KINDS}
+        variant_names = {}
+        for kind, key, entry in cls.entries_from(rows, variant_names):
+            entries[kind][key] = entry
+            keys[kind].extend((prefix, key) for prefix in prefix_keys(entry['label']))
+        for kind in KINDS:
+            keys[kind].sort()
+        return cls(entries, keys, variant_names)
+
+    @staticmethod
+    def entries_from(rows, variant_names):
+        for row in rows['categories']:
+            yield 'categories', row['id'], {'id': row['id'], 'label': row['name']}
+        for row in rows['subcategories']:
+            yield 'subcategories', row['id'], {
+                'id': row['id'], 'label': row['name'],
+                'category': row['category_id'], 'category_name': row['category__name'],
+            }
+        for row in rows['products']:
+            yield 'products', row['id'], {'id': row['id'], 'label': row['name']}
+
+        # Dimenzije su jedinstvene po nazivu; broj proizvoda služi za rangiranje
+        counts = Counter()
+        for row in rows['variants']:
+            variant_names[row['id']] = (row['product_id'], row['name'])
+            counts[normalize(row['name'])] += 1
+        labels = {normalize(row['name']): row['name'] for row in rows['variants']}
+        for key, count in counts.items():
+            yield 'variants', key, {'label': labels[key], 'count': count}
+
+    def lookup(self, query, limit):
+        query = normalize(query)
+        results = {}
+        for kind in KINDS:
+            keys = self.keys[kind]
+            start = bisect.bisect_left(keys, (query,))
+            end = bisect.bisect_left(keys, (query + '\uffff',), lo=start)
+            if kind == 'variants':
+                # Dimenzija ima malo; najčešće prve
+                matched = {key for prefix, key in keys[start:end]}
+                found = sorted(
+                    (self.entries[kind][key] for key in matched),
+                    key=lambda entry: (-entry['count'], entry['label'])
+                )[:limit]
+            else:
+                # Abecedno; čita se samo dok se ne skupi limit različitih stavki
+                found, seen = [], set()
+                for prefix, key in keys[start:end]:
+                    if key not in seen:
+                        seen.add(key)
+                        found.append(self.entries[kind][key])
+                        if len(found) == limit:
+                            break
+            results[kind] = found
+        return results
+
+
+def load_rows(product_ids=None, category_ids=None, subcategory_ids=None, variant_ids=None, everything=False):
+    from .models import Category, Subcategory, Product, ProductVariant
+
+    def select(queryset, ids, *fields):
+        if not everything:
+            if not ids:
+                return []
+            queryset = queryset.filter(id__in=ids)
+        return list(queryset.order_by().values(*fields))
+
+    return {
+        'categories': select(Category.objects, category_ids, 'id', 'name'),
+        'subcategories': select(
+            Subcategory.objects, subcategory_ids, 'id', 'name', 'category_id', 'category__name'
+        ),
+        'products': select(Product.objects, product_ids, 'id', 'name'),
+        'variants': select(ProductVariant.objects, variant_ids, 'id', 'product_id', 'name'),
+    }
+
+
+class SuggestIndex:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (redni broj dnevnika, Snapshot); menja se odjednom
+        self.state = (None, None)
+
+    def current(self):
+        seq = current_seq()
+        applied, snapshot = self.state
+        if snapshot is not None and seq == applied:
+            return snapshot
+        with self.lock:
+            applied, snapshot = self.state
+            if snapshot is None or not applied < seq <= applied + MAX_CATCH_UP:
+                self.rebuild(seq)
+            else:
+                self._catch_up(applied, snapshot, seq)
+            return self.state[1]
+
+    def rebuild(self, seq):
+        # Redni broj je pročitan pre baze: izmene tokom izgradnje se primene ponovo
+        self.state = (seq, Snapshot.build(load_rows(everything=True)))
+
+    def _catch_up(self, applied, snapshot, seq):
+        cache = get_cache()
+        keys = [f'{KEY_PREFIX}:suggest:change:{n}' for n in range(applied + 1, seq + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            self.rebuild(seq)
+            return
+
+        ids = {kind: set() for kind in KINDS}
+        for kind, pk in changes.values():
+            ids[kind].add(pk)
+        self.state = (seq, self._apply(snapshot, ids))
+
+    @staticmethod
+    def _apply(snapshot, ids):
+        """Novi snapshot sa ponovo učitanim stavkama iz ids; stari ostaje netaknut"""
+        from .models import Subcategory
+
+        # Preimenovana kategorija menja i opis njenih potkategorija
+        if ids['categories']:
+            ids['subcategories'] |= set(
+                Subcategory.objects.filter(category_id__in=ids['categories']).values_list('id', flat=True)
+            )
+
+        rows = load_rows(
+            product_ids=ids['products'], category_ids=ids['categories'],
+            subcategory_ids=ids['subcategories'], variant_ids=ids['variants']
+        )
+
+        entries = {kind: dict(snapshot.entries[kind]) for kind in KINDS}
+        variant_names = dict(snapshot.variant_names)
+
+        # Dimenzije: oduzmi stare nazive izmenjenih varijanti, dodaj nove
+        counts = Counter({key: entry['count'] for key, entry in entries['variants'].items()})
+        labels = {key: entry['label'] for key, entry in entries['variants'].items()}
+        for variant_id in ids['variants']:
+            if variant_id in variant_names:
+                counts[normalize(variant_names.pop(variant_id)[1])] -= 1
+        for row in rows['variants']:
+            variant_names[row['id']] = (row['product_id'], row['name'])
+            counts[normalize(row['name'])] += 1
+            labels.setdefault(normalize(row['name']), row['name'])
+        changed = {kind: set(ids[kind]) for kind in KINDS}
+        changed['variants'] = {
+            key for key, count in counts.items()
+            if count != entries['variants'].get(key, {}).get('count')
+        }
+        for key in changed['variants']:
+            entries['variants'].pop(key, None)
+            if counts[key] > 0:
+                entries['variants'][key] = {'label': labels[key], 'count': counts[key]}
+
+        fresh = {kind: {} for kind in KINDS}
+        for kind, key, entry in Snapshot.entries_from({**rows, 'variants': []}, {}):
+            fresh[kind][key] = entry
+        for kind in ('categories', 'subcategories', 'products'):
+            for key in changed[kind]:
+                entries[kind].pop(key, None)
+            entries[kind].update(fresh[kind])
+
+        keys = {}
+        for kind in KINDS:
+            if not changed[kind]:
+                keys[kind] = snapshot.keys[kind]
+                continue
+            # Kopija liste, pa bisect umetanje/brisanje samo izmenjenih ključeva
+            kind_keys = [item for item in snapshot.keys[kind] if item[1] not in changed[kind]]
+            for key in changed[kind]:
+                if key in entries[kind]:
+                    for prefix in prefix_keys(entries[kind][key]['label']):
+                        bisect.insort(kind_keys, (prefix, key))
+            keys[kind] = kind_keys
+        return Snapshot(entries, keys, variant_names)
+
+
+_index = SuggestIndex()
+
+MODEL_KINDS = {
+    'Category': 'categories',
+    'Subcategory': 'subcategories',
+    'Product': 'products',
+    'ProductVariant': 'variants',
+}
+
+
+def current_seq():
+    """
+    Redni broj poslednje izmene. Kao i verzije keša, kreće od vremena u ms,
+    pa se posle izbacivanja iz keša ne ponavljaju ranije vrednosti.
+    """
+    cache = get_cache()
+    seq = cache.get(_SEQ_KEY)
+    if seq is None:
+        cache.add(_SEQ_KEY, int(time.time() * 1000), timeout=None)
+        seq = cache.get(_SEQ_KEY)
+    return seq
+
+
+def _log_change(kind, pk):
+    cache = get_cache()
+    current_seq()
+    seq = cache.incr(_SEQ_KEY)
+    cache.set(f'{KEY_PREFIX}:suggest:change:{seq}', (kind, pk), 24 * 60 * 60)
+
+
+def record_change(model, pk):
+    """Poziva se iz signala; u dnevnik ulazi tek kada je izmena vidljiva drugima"""
+    kind = MODEL_KINDS[model.__name__]
+    transaction.on_commit(lambda: _log_change(kind, pk))
+
+
+def suggest(query, limit=None):
+    limit = limit or getattr(settings, 'SHOP_SUGGEST_LIMIT', 5)
+    if not normalize(query):
+        return {kind: [] for kind in KINDS}
+    return _index.current().lookup(query, limit)
+
+
+def rebuild():
+    with _index.lock:
+        _index.rebuild(current_seq())
@@ -1,3 +1,2080 @@
-from django.test import TestCase
+import csv
+import json
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+
+from .cache import get_cache, get_last_modified
+from .pagination import KeysetPagination
+from .renderers import FastJSONRenderer
+from . import archive, export, idempotency, inventory, notifications, orders, reports, search, sms, suggest
+from .models import (
+    Category, Subcategory, Product, ProductVariant,
+    ProductImage, Order, OrderItem, OutboxMessage, IdempotencyKey, DailyOrderStats, DailyItemSales,
+    ArchivedOrder, ArchivedOrderItem
+)
+
+
+class ShopAPITestCase(APITestCase):
+    def setUp(self):
+        # locmem keš preživljava rollback baze između testova
+        get_cache().clear()
+        # Last-Modified se računa jednom po verziji kataloga; ne ulazi u budžete upita
+        get_last_modified()
+
+
+class CatalogFixtureMixin:
+    """Zajednički podaci za testove kataloga"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cat_profili = Category.objects.create(name='Profili i Cevi')
+        cls.cat_ukrasni = Category.objects.create(name='Ukrasni Elementi')
+        cls.sub_flahovi = Subcategory.objects.create(name='Flahovi', category=cls.cat_profili)
+        cls.sub_siljci = Subcategory.objects.create(name='Siljci', category=cls.cat_ukrasni)
+
+        cls.firiket = Product.objects.create(
+            name='Firiket Obični (6m)', description='Firiket profil',
+            price=Decimal('350.00'), category=cls.cat_profili, featured=True
+        )
+        cls.flah = Product.objects.create(
+            name='Flah vučeni', description='Vučeni flah',
+            price=Decimal('500.00'), sale_price=Decimal('400.00'), on_sale=True,
+            category=cls.cat_profili, subcategory=cls.sub_flahovi
+        )
+        cls.siljak = Product.objects.create(
+            name='Siljak 120mm', description='Kovani siljak',
+            price=Decimal('90.00'), category=cls.cat_ukrasni,
+            subcategory=cls.sub_siljci, in_stock=False
+        )
+
+
+class ProductFilterTests(CatalogFixtureMixin, ShopAPITestCase):
+    url = '/api/products/'
+
+    def ids(self, response):
+        data = response.data
+        if isinstance(data, dict):
+            data = data['results']
+        return {p['id'] for p in data}
+
+    def test_list_without_params_is_not_paginated(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 3)
+
+    def test_filter_by_category_and_subcategory(self):
+        response = self.client.get(self.url, {'category': self.cat_profili.id})
+        self.assertEqual(self.ids(response), {self.firiket.id, self.flah.id})
+
+        response = self.client.get(self.url, {'subcategory': self.sub_siljci.id})
+        self.assertEqual(self.ids(response), {self.siljak.id})
+
+    def test_price_range_uses_current_price(self):
+        # Flah košta 500, ali je na akciji za 400
+        response = self.client.get(self.url, {'min_price': '380', 'max_price': '450'})
+        self.assertEqual(self.ids(response), {self.flah.id})
+
+        response = self.client.get(self.url, {'min_price': '450'})
+        self.assertEqual(self.ids(response), set())
+
+    def test_boolean_flags(self):
+        self.assertEqual(self.ids(self.client.get(self.url, {'on_sale': 'true'})), {self.flah.id})
+        self.assertEqual(self.ids(self.client.get(self.url, {'featured': '1'})), {self.firiket.id})
+        self.assertEqual(self.ids(self.client.get(self.url, {'in_stock': 'false'})), {self.siljak.id})
+
+    def test_search(self):
+        response = self.client.get(self.url, {'search': 'ukrasni'})
+        self.assertEqual(self.ids(response), {self.siljak.id})
+
+    def test_ordering_by_current_price(self):
+        response = self.client.get(self.url, {'ordering': 'current_price'})
+        self.assertEqual(
+            [p['id'] for p in response.data],
+            [self.siljak.id, self.firiket.id, self.flah.id]
+        )
+
+    def test_page_size(self):
+        response = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_invalid_params(self):
+        response = self.client.get(self.url, {'min_price': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(self.url, {'min_price': '500', 'max_price': '100'})
+        self.assertEqual(response.status_code, 400)
+
+
+class QueryBudgetTests(ShopAPITestCase):
+    """
+    Svaki list/retrieve endpoint mora imati konstantan broj upita,
+    bez obzira na broj redova (N+1 bi ovde probio budžet).
+    """
+    rows = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass')
+        for c in range(3):
+            category = Category.objects.create(name=f'Kategorija {c}')
+            subcategory = Subcategory.objects.create(name=f'Potkategorija {c}', category=category)
+            for p in range(cls.rows):
+                product = Product.objects.create(
+                    name=f'Proizvod {c}-{p}', description='Opis', price=Decimal('100.00'),
+                    category=category, subcategory=subcategory
+                )
+                for v in range(3):
+                    ProductVariant.objects.create(product=product, name=f'{v}0×{v}0mm')
+                for i in range(2):
+                    ProductImage.objects.create(product=product, image=f'products/{p}-{i}.jpg', order=i)
+
+        product = Product.objects.first()
+        for o in range(cls.rows):
+            order = Order.objects.create(
+                customer_name=f'Kupac {o}', customer_phone='0641234567', total_amount=Decimal('100.00')
+            )
+            for variant in product.variants.all():
+                OrderItem.objects.create(
+                    order=order, product=product, variant=variant, quantity=1,
+                    unit_price=Decimal('100.00'), product_name=product.name, variant_name=variant.name
+                )
+
+        cls.category = Category.objects.first()
+        cls.subcategory = Subcategory.objects.first()
+        cls.product = product
+        cls.variant = ProductVariant.objects.first()
+        cls.image = ProductImage.objects.first()
+        cls.order = Order.objects.first()
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.admin)
+
+    def assertBudget(self, url, budget):
+        with self.assertNumQueries(budget):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+
+    def test_category_endpoints(self):
+        self.assertBudget('/api/categories/', 2)
+        self.assertBudget(f'/api/categories/{self.category.id}/', 2)
+
+    def test_subcategory_endpoints(self):
+        self.assertBudget('/api/subcategories/', 1)
+        self.assertBudget(f'/api/subcategories/{self.subcategory.id}/', 1)
+
+    def test_product_endpoints(self):
+        self.assertBudget('/api/products/', 1)
+        self.assertBudget('/api/products/?page_size=5', 2)
+        self.assertBudget('/api/products/?expand=variants,images', 3)
+        self.assertBudget(f'/api/products/{self.product.id}/', 3)
+
+    def test_variant_and_image_endpoints(self):
+        self.assertBudget('/api/product-variants/', 1)
+        self.assertBudget(f'/api/product-variants/?product_id={self.product.id}', 1)
+        self.assertBudget(f'/api/product-variants/{self.variant.id}/', 1)
+        self.assertBudget('/api/product-images/', 1)
+        self.assertBudget(f'/api/product-images/{self.image.id}/', 1)
+
+    def test_order_endpoints(self):
+        self.assertBudget('/api/orders/', 2)
+        self.assertBudget(f'/api/orders/{self.order.id}/', 2)
+
+
+class CatalogCacheTests(CatalogFixtureMixin, ShopAPITestCase):
+    url = '/api/products/'
+
+    def test_second_request_is_served_from_cache(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(len(response.data), 3)
+
+    def test_query_params_are_normalized(self):
+        self.client.get(self.url, {'on_sale': 'true', 'category': self.cat_profili.id})
+        response = self.client.get(f'{self.url}?category={self.cat_profili.id}&on_sale=true&search=')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_writes_invalidate_cache(self):
+        self.client.get(self.url)
+        Product.objects.filter(pk=self.flah.pk).first().save()
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+
+        self.client.get('/api/categories/')
+        self.sub_flahovi.delete()
+        self.assertEqual(self.client.get('/api/categories/')['X-Cache'], 'MISS')
+
+    def test_primary_image_bulk_update_invalidates_cache(self):
+        first = ProductImage.objects.create(product=self.flah, image='products/a.jpg', is_primary=True)
+        self.client.get(f'/api/products/{self.flah.id}/')
+
+        second = ProductImage.objects.create(product=self.flah, image='products/b.jpg', is_primary=True)
+        response = self.client.get(f'/api/products/{self.flah.id}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        primary = [img['id'] for img in response.data['images'] if img['is_primary']]
+        self.assertEqual(primary, [second.id])
+        first.refresh_from_db()
+        self.assertFalse(first.is_primary)
+
+    def test_stats_endpoint(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.force_authenticate(admin)
+        response = self.client.get('/api/cache-stats/')
+        self.assertEqual(response.data['hits'], 1)
+        self.assertEqual(response.data['misses'], 1)
+
+
+class PrecomputedHomeTests(CatalogFixtureMixin, ShopAPITestCase):
+
+    def test_featured_products(self):
+        ProductImage.objects.create(product=self.firiket, image='products/f.jpg', is_primary=True)
+        data = self.client.get('/api/products/featured/').data
+        self.assertEqual([p['id'] for p in data], [self.firiket.id])
+        # Apsolutni, kao u /api/products/, i za host svakog zahteva
+        listed = self.client.get('/api/products/', {'featured': 'true'}).data
+        self.assertEqual(data[0]['primary_image'], listed[0]['primary_image'])
+        self.assertEqual(data[0]['primary_image'], 'http://testserver/media/products/f.jpg')
+        with self.settings(ALLOWED_HOSTS=['shop.example.com']):
+            data = self.client.get('/api/products/featured/', HTTP_HOST='shop.example.com').data
+        self.assertEqual(data[0]['primary_image'], 'http://shop.example.com/media/products/f.jpg')
+        self.assertEqual(data[0]['current_price'], '350.00')
+        self.assertNotIn('variants', data[0])
+
+    def test_category_tree(self):
+        data = self.client.get('/api/categories/tree/').data
+        self.assertEqual(data, [
+            {
+                'id': self.cat_profili.id, 'name': 'Profili i Cevi', 'product_count': 2,
+                'subcategories': [{'id': self.sub_flahovi.id, 'name': 'Flahovi', 'product_count': 1}],
+            },
+            {
+                'id': self.cat_ukrasni.id, 'name': 'Ukrasni Elementi', 'product_count': 1,
+                'subcategories': [{'id': self.sub_siljci.id, 'name': 'Siljci', 'product_count': 1}],
+            },
+        ])
+
+    def test_built_once_per_version(self):
+        for url in ['/api/products/featured/', '/api/categories/tree/']:
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url).data, first.data)
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(response.status_code, 304)
+
+    def test_rebuilt_on_relevant_writes(self):
+        tree = self.client.get('/api/categories/tree/')
+        # Varijanta ne menja stablo kategorija
+        ProductVariant.objects.create(product=self.flah, name='40×5mm')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/categories/tree/')['ETag'], tree['ETag'])
+
+        Product.objects.create(name='Nov', price=1, category=self.cat_ukrasni, subcategory=self.sub_siljci)
+        data = self.client.get('/api/categories/tree/').data
+        self.assertEqual(data[1]['subcategories'][0]['product_count'], 2)
+
+        self.flah.featured = True
+        self.flah.save()
+        featured = self.client.get('/api/products/featured/').data
+        self.assertEqual([p['id'] for p in featured], [self.flah.id, self.firiket.id])
+
+
+class ConditionalGetTests(CatalogFixtureMixin, ShopAPITestCase):
+    url = '/api/products/'
+
+    def test_etag_round_trip(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Drugi parametri -> drugi validator
+        response = self.client.get(self.url, {'on_sale': 'true'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since(self):
+        response = self.client.get(self.url)
+        last_modified = response['Last-Modified']
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_related_model_edits_change_validator(self):
+        etag = self.client.get(f'/api/products/{self.flah.id}/')['ETag']
+        variant = ProductVariant.objects.create(product=self.flah, name='20×20mm')
+        response = self.client.get(f'/api/products/{self.flah.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        variant.delete()
+        response = self.client.get(f'/api/products/{self.flah.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class KeysetPaginationTests(CatalogFixtureMixin, ShopAPITestCase):
+    url = '/api/products/'
+
+    def walk(self, url, **params):
+        seen = []
+        response = self.client.get(url, {'cursor': '', **params})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            seen += [row['id'] for row in response.data['results']]
+            if not response.data['next']:
+                return seen
+            response = self.client.get(response.data['next'])
+
+    def test_walk_returns_every_row_once_in_order(self):
+        expected = list(Product.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk(self.url, page_size=1), expected)
+
+    def test_new_rows_do_not_shift_pages(self):
+        first = self.client.get(self.url, {'cursor': '', 'page_size': 2})
+        Product.objects.create(
+            name='Novi proizvod', description='Opis', price=Decimal('10.00'), category=self.cat_profili
+        )
+        second = self.client.get(first.data['next'])
+        ids = [p['id'] for p in first.data['results'] + second.data['results']]
+        self.assertEqual(ids, [self.siljak.id, self.flah.id, self.firiket.id])
+
+    def test_deep_page_has_no_offset(self):
+        cursor = self.client.get(self.url, {'cursor': '', 'page_size': 1}).data['next']
+        get_cache().clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(cursor)
+        self.assertNotIn('OFFSET', queries[0]['sql'].upper())
+
+    def test_filters_apply_and_ordering_is_rejected(self):
+        ids = self.walk(self.url, category=self.cat_profili.id, page_size=1)
+        self.assertEqual(set(ids), {self.firiket.id, self.flah.id})
+        response = self.client.get(self.url, {'cursor': '', 'ordering': 'name'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.url, {'cursor': 'nije-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_orders_cursor(self):
+        admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.force_authenticate(admin)
+        orders = [
+            Order.objects.create(customer_name=f'Kupac {i}', customer_phone='0641234567', total_amount=1)
+            for i in range(5)
+        ]
+        self.assertEqual(self.walk('/api/orders/', page_size=2), [o.id for o in reversed(orders)])
+        # Lista narudžbina je uvek paginirana; bez cursor-a prva strana
+        first = self.client.get('/api/orders/', {'page_size': 2}).data
+        self.assertEqual([o['id'] for o in first['results']], [orders[4].id, orders[3].id])
+
+
+class ProductListRepresentationTests(CatalogFixtureMixin, ShopAPITestCase):
+    url = '/api/products/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        ProductVariant.objects.create(product=cls.flah, name='20×5mm', price_adjustment=Decimal('-50.00'))
+        ProductVariant.objects.create(product=cls.flah, name='40×5mm', price_adjustment=Decimal('120.00'))
+        ProductImage.objects.create(product=cls.flah, image='products/sporedna.jpg', order=0)
+        ProductImage.objects.create(product=cls.flah, image='products/glavna.jpg', order=5, is_primary=True)
+
+    def get_flah(self, **params):
+        response = self.client.get(self.url, params)
+        return next(p for p in response.data if p['id'] == self.flah.id)
+
+    def test_compact_list(self):
+        flah = self.get_flah()
+        for heavy in ['description', 'variants', 'images']:
+            self.assertNotIn(heavy, flah)
+        self.assertEqual(flah['variant_count'], 2)
+        self.assertEqual(flah['current_price'], '400.00')
+        self.assertEqual(flah['min_final_price'], '350.00')
+        self.assertEqual(flah['max_final_price'], '520.00')
+        self.assertTrue(flah['primary_image'].endswith('/media/products/glavna.jpg'))
+
+        firiket = next(p for p in self.client.get(self.url).data if p['id'] == self.firiket.id)
+        self.assertEqual(firiket['variant_count'], 0)
+        self.assertEqual(firiket['min_final_price'], '350.00')
+        self.assertIsNone(firiket['primary_image'])
+
+    def test_expand_and_fields(self):
+        flah = self.get_flah(expand='variants,description')
+        self.assertEqual([v['name'] for v in flah['variants']], ['20×5mm', '40×5mm'])
+        self.assertEqual(flah['variants'][0]['final_price'], '350.00')
+        self.assertIn('description', flah)
+        self.assertNotIn('images', flah)
+
+        flah = self.get_flah(fields='id,name,images')
+        self.assertEqual(set(flah), {'id', 'name', 'images'})
+        self.assertEqual(len(flah['images']), 2)
+
+    def test_retrieve_keeps_full_representation(self):
+        response = self.client.get(f'{self.url}{self.flah.id}/')
+        self.assertEqual(len(response.data['variants']), 2)
+        self.assertIn('description', response.data)
+
+        response = self.client.get(f'{self.url}{self.flah.id}/', {'fields': 'id,current_price'})
+        self.assertEqual(response.data, {'id': self.flah.id, 'current_price': '400.00'})
+
+
+class FastPathEquivalenceTests(CatalogFixtureMixin, ShopAPITestCase):
+    """shop.fastpath mora davati isti JSON kao DRF serializeri"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        ProductVariant.objects.create(product=cls.flah, name='20×5mm', price_adjustment=Decimal('-50.00'))
+        ProductVariant.objects.create(product=cls.flah, name='40×5mm', sku='FL-40', in_stock=False)
+        ProductVariant.objects.create(product=cls.firiket, name='12×12mm', price_adjustment=Decimal('12.50'))
+        ProductImage.objects.create(product=cls.flah, image='products/flah ž.jpg', alt_text='Flah')
+        ProductImage.objects.create(product=cls.flah, image='products/glavna.jpg', order=3, is_primary=True)
+        ProductImage.objects.create(product=cls.siljak, image='products/siljak.jpg')
+
+    def assertSameOutput(self, url, params=None):
+        get_cache().clear()
+        with override_settings(SHOP_FAST_SERIALIZATION=False):
+            expected = self.client.get(url, params)
+        get_cache().clear()
+        with override_settings(SHOP_FAST_SERIALIZATION=True):
+            actual = self.client.get(url, params)
+        self.assertEqual(expected.status_code, 200)
+        self.assertEqual(json.loads(actual.content), json.loads(expected.content), params)
+
+    def test_product_list(self):
+        for params in [
+            {},
+            {'expand': 'description,variants,images'},
+            {'fields': 'id,subcategory_name,variants'},
+            {'on_sale': 'true', 'expand': 'variants'},
+            {'ordering': '-current_price', 'expand': 'images'},
+            {'page_size': 2, 'page': 2},
+            {'cursor': '', 'page_size': 2, 'expand': 'variants'},
+        ]:
+            self.assertSameOutput('/api/products/', params)
+
+    def test_category_list(self):
+        self.assertSameOutput('/api/categories/')
+
+    def test_renderer_matches_drf(self):
+        data = {
+            'cena': Decimal('12.50'), 'vreme': timezone.now(), 7: ['čćšžđ', 'a\u2028b'],
+            'ugnježdeno': [{'x': None, 'y': 1.5, 'z': True}],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class AdminStatsTests(CatalogFixtureMixin, ShopAPITestCase):
+    url = '/api/admin-stats/'
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass')
+        )
+
+    def test_counts_and_revenue(self):
+        Order.objects.create(customer_name='A', customer_phone='0641234567', total_amount=Decimal('100.00'))
+        Order.objects.create(
+            customer_name='B', customer_phone='0641234567', total_amount=Decimal('50.50'), status='completed'
+        )
+        Order.objects.create(
+            customer_name='C', customer_phone='0641234567', total_amount=Decimal('900.00'), status='cancelled'
+        )
+        with self.assertNumQueries(4):
+            data = self.client.get(self.url).data
+        self.assertEqual(
+            (data['categories'], data['subcategories'], data['products'], data['out_of_stock'], data['on_sale']),
+            (2, 2, 3, 1, 1)
+        )
+        self.assertEqual(data['orders']['total'], 3)
+        self.assertEqual(data['orders']['revenue'], '150.50')
+        self.assertEqual(data['orders']['by_status']['pending'], {'count': 1, 'revenue': '100.00'})
+        self.assertEqual(data['orders']['by_status']['processing'], {'count': 0, 'revenue': '0.00'})
+
+    def test_cached_until_write(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+        Order.objects.create(customer_name='A', customer_phone='0641234567', total_amount=Decimal('10.00'))
+        self.assertEqual(self.client.get(self.url).data['orders']['total'], 1)
+        self.siljak.delete()
+        self.assertEqual(self.client.get(self.url).data['products'], 2)
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+class BatchLookupTests(CatalogFixtureMixin, ShopAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        ProductVariant.objects.create(product=cls.flah, name='40×5mm')
+        ProductVariant.objects.create(product=cls.flah, name='20×5mm')
+        ProductVariant.objects.create(product=cls.firiket, name='12×12mm')
+        ProductImage.objects.create(product=cls.siljak, image='products/b.jpg', order=2)
+        ProductImage.objects.create(product=cls.siljak, image='products/a.jpg', order=1)
+
+    def test_variants_grouped_by_product(self):
+        ids = f'{self.flah.id},{self.firiket.id},{self.siljak.id}'
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/product-variants/', {'product_ids': ids})
+        data = json.loads(response.content)
+        self.assertEqual([v['name'] for v in data[str(self.flah.id)]], ['20×5mm', '40×5mm'])
+        self.assertEqual(len(data[str(self.firiket.id)]), 1)
+        self.assertEqual(data[str(self.siljak.id)], [])
+
+    def test_images_grouped_by_product(self):
+        response = self.client.get('/api/product-images/', {'product_ids': f'{self.siljak.id}'})
+        data = json.loads(response.content)
+        self.assertEqual([i['order'] for i in data[str(self.siljak.id)]], [1, 2])
+
+    def test_products_by_ids(self):
+        response = self.client.get('/api/products/', {'ids': f'{self.flah.id},{self.siljak.id}'})
+        self.assertEqual({p['id'] for p in response.data}, {self.flah.id, self.siljak.id})
+
+    def test_id_lists_are_bounded_and_validated(self):
+        too_many = ','.join(str(i) for i in range(1, 102))
+        self.assertEqual(self.client.get('/api/product-variants/', {'product_ids': too_many}).status_code, 400)
+        self.assertEqual(self.client.get('/api/products/', {'ids': too_many}).status_code, 400)
+        self.assertEqual(self.client.get('/api/product-images/', {'product_ids': '1,x'}).status_code, 400)
+
+
+def explain(sql):
+    """Plan izvršavanja kao lista linija (SQLite EXPLAIN QUERY PLAN / PostgreSQL EXPLAIN)"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # Male test tabele bi i sa indeksom dale Seq Scan; proveravamo da indeksna putanja postoji
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}')
+            return [row[0] for row in cursor.fetchall()]
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(plan):
+    """Tabele koje plan čita celom dužinom, bez indeksa (izvedene tabele se ne računaju)"""
+    tables = set(connection.introspection.table_names())
+    scans = []
+    for line in plan:
+        line = line.strip()
+        if line.startswith('SCAN ') and ' USING ' not in line:
+            scans.append(line.split()[1])
+        elif 'Seq Scan on ' in line:
+            scans.append(line.split('Seq Scan on ')[1].split()[0])
+    return [table for table in scans if table in tables]
+
+
+class QueryPlanTests(CatalogFixtureMixin, ShopAPITestCase):
+    """
+    Hot upiti ViewSet-ova ne smeju da padnu na full scan tabele.
+    Upiti se hvataju iz pravih zahteva, pa test prati izmene u view-ovima.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        ProductVariant.objects.create(product=cls.flah, name='20×5mm', sku='FL-20')
+        ProductImage.objects.create(product=cls.flah, image='products/a.jpg', is_primary=True)
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass')
+        Order.objects.create(customer_name='A', customer_phone='0641234567', total_amount=1)
+
+    def hot_urls(self):
+        cursor = KeysetPagination.encode_cursor(self.flah)
+        ids = f'{self.flah.id},{self.siljak.id}'
+        return [
+            f'/api/products/?category={self.cat_profili.id}&page_size=24',
+            f'/api/products/?subcategory={self.sub_flahovi.id}&page_size=24',
+            '/api/products/?featured=true&page_size=24',
+            '/api/products/?on_sale=true&page_size=24',
+            '/api/products/?in_stock=false&page_size=24',
+            '/api/products/?min_price=100&max_price=400&page_size=24',
+            f'/api/products/?category={self.cat_profili.id}&ordering=-current_price&page_size=24',
+            f'/api/products/?cursor={cursor}&page_size=24',
+            f'/api/products/?category={self.cat_profili.id}&cursor=&expand=variants,images',
+            f'/api/products/?ids={ids}',
+            f'/api/products/{self.flah.id}/',
+            '/api/products/featured/',
+            f'/api/products/facets/?category={self.cat_profili.id}',
+            f'/api/product-variants/?product_ids={ids}',
+            f'/api/product-variants/?product_id={self.flah.id}',
+            f'/api/product-images/?product_ids={ids}',
+            f'/api/categories/{self.cat_profili.id}/',
+            f'/api/orders/?cursor={KeysetPagination.encode_cursor(Order.objects.get())}',
+            '/api/orders/?phone=064123',
+            '/api/orders/?search=064123&summary=1',
+            '/api/orders/?status=pending,confirmed',
+            '/api/orders/?date_from=2024-01-01&date_to=2024-12-31',
+            '/api/archived-orders/?search=064123&summary=1',
+            '/api/archived-orders/?status=completed&date_from=2024-01-01',
+            '/api/reports/sales/?group=day',
+            '/api/reports/sales/?group=status',
+            '/api/reports/sales/?group=category',
+            '/api/reports/sales/?group=variant',
+        ]
+
+    def test_export_uses_indexes(self):
+        self.client.force_authenticate(self.admin)
+        # Ceo izvoz čita celu tabelu; filtrirani ne smeju
+        for params in ['status=completed', 'rows=items&status=completed', 'rows=items&date_from=2024-01-01']:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(f'/api/orders/export/?{params}')
+                b''.join(response.streaming_content)
+            for query in queries:
+                if query['sql'].startswith('SELECT'):
+                    plan = explain(query['sql'])
+                    self.assertEqual(full_scans(plan), [], f'{params}\n' + '\n'.join(plan))
+
+    def test_hot_queries_use_indexes(self):
+        self.client.force_authenticate(self.admin)
+        for url in self.hot_urls():
+            get_cache().clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            for query in queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                plan = explain(query['sql'])
+                self.assertEqual(full_scans(plan), [], f'{url}\n{query["sql"]}\n' + '\n'.join(plan))
+
+
+class FacetTests(CatalogFixtureMixin, ShopAPITestCase):
+    url = '/api/products/facets/'
+
+    def test_counts_for_whole_catalog(self):
+        with self.assertNumQueries(2):
+            data = self.client.get(self.url).data
+        self.assertEqual((data['count'], data['on_sale'], data['in_stock']), (3, 1, 2))
+        self.assertEqual(
+            [(c['name'], c['count']) for c in data['categories']],
+            [('Profili i Cevi', 2), ('Ukrasni Elementi', 1)]
+        )
+        self.assertEqual(
+            [(s['id'], s['category'], s['count']) for s in data['subcategories']],
+            [(self.sub_flahovi.id, self.cat_profili.id, 1), (self.sub_siljci.id, self.cat_ukrasni.id, 1)]
+        )
+
+    def test_price_histogram_uses_current_price(self):
+        # Efektivne cene: 350, 400 (flah na akciji), 90
+        price = self.client.get(self.url).data['price']
+        self.assertEqual((price['min'], price['max']), ('90.00', '400.00'))
+        self.assertEqual(sum(b['count'] for b in price['buckets']), 3)
+        bucket = next(b for b in price['buckets'] if Decimal(b['min']) <= 400 < Decimal(b['max']))
+        self.assertEqual(bucket['count'], 1)
+
+    def test_filters_apply(self):
+        data = self.client.get(self.url, {'category': self.cat_profili.id, 'max_price': '380'}).data
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['categories'], [{'id': self.cat_profili.id, 'name': 'Profili i Cevi', 'count': 1}])
+        self.assertEqual(data['subcategories'], [])
+
+        data = self.client.get(self.url, {'search': 'nema takvog'}).data
+        self.assertEqual((data['count'], data['price']['buckets']), (0, []))
+
+    def test_cached_per_filter_signature(self):
+        self.client.get(self.url, {'on_sale': 'true', 'page': 2})
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'on_sale': 'true', 'ordering': 'name'})
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(self.client.get(self.url, {'on_sale': 'false'})['X-Cache'], 'MISS')
+
+
+class SearchTests(CatalogFixtureMixin, ShopAPITestCase):
+    url = '/api/products/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.kovanica = Product.objects.create(
+            name='Kovanica ukrasna', description='Ćevi i ukrasi od kovanog gvožđa',
+            price=Decimal('120.00'), category=cls.cat_ukrasni
+        )
+        ProductVariant.objects.create(product=cls.firiket, name='20×20mm', sku='FIR-2020')
+
+    def ids(self, query, **params):
+        return [p['id'] for p in self.client.get(self.url, {'search': query, **params}).data]
+
+    def test_folding_and_word_forms(self):
+        self.assertEqual(self.ids('kovanice'), [self.kovanica.id])
+        self.assertEqual(self.ids('GVOZDJA'), [self.kovanica.id])
+        self.assertEqual(self.ids('кованица'), [self.kovanica.id])
+        # 'Ćevi' u opisu i 'Cevi' u nazivu kategorije
+        self.assertEqual(set(self.ids('ćevi')), {self.firiket.id, self.flah.id, self.kovanica.id})
+
+    def test_prefix_and_all_words(self):
+        self.assertEqual(self.ids('sil'), [self.siljak.id])
+        self.assertEqual(self.ids('kovanic ukras'), [self.kovanica.id])
+        self.assertEqual(self.ids('kovanica firiket'), [])
+
+    def test_categories_and_variants_are_indexed(self):
+        self.assertEqual(set(self.ids('flahovi')), {self.flah.id})
+        self.assertEqual(self.ids('fir-2020'), [self.firiket.id])
+
+    def test_ranked_by_relevance(self):
+        # Naziv ima veću težinu od kategorije
+        self.assertEqual(self.ids('ukrasni'), [self.kovanica.id, self.siljak.id])
+        self.assertEqual(
+            self.ids('ukrasni', ordering='current_price'), [self.siljak.id, self.kovanica.id]
+        )
+
+    def test_truncation_is_reported(self):
+        self.assertNotIn('X-Search-Truncated', self.client.get(self.url, {'search': 'ćevi'}))
+        with override_settings(SHOP_SEARCH_LIMIT=1):
+            response = self.client.get(self.url, {'search': 'ukrasni'})
+            self.assertEqual([p['id'] for p in response.data], [self.kovanica.id])
+            self.assertEqual(response['X-Search-Truncated'], '1')
+            # I iz keša
+            response = self.client.get(self.url, {'search': 'ukrasni'})
+            self.assertEqual(response['X-Cache'], 'HIT')
+            self.assertEqual(response['X-Search-Truncated'], '1')
+            self.assertNotIn('X-Search-Truncated', self.client.get(self.url, {'search': 'kovanica'}))
+
+    def test_index_follows_writes(self):
+        self.flah.name = 'Šipka okrugla'
+        self.flah.description = 'Puna šipka'
+        self.flah.save()
+        self.assertEqual(self.ids('sipke'), [self.flah.id])
+        self.assertEqual(self.ids('flah vuceni'), [])
+
+        self.cat_ukrasni.name = 'Dekor'
+        self.cat_ukrasni.save()
+        self.assertEqual(set(self.ids('dekor')), {self.siljak.id, self.kovanica.id})
+
+        self.assertEqual(self.ids('siljci'), [self.siljak.id])
+        self.sub_siljci.delete()
+        self.assertEqual(self.ids('siljci'), [])
+        self.kovanica.delete()
+        self.assertEqual(self.ids('kovanica'), [])
+
+
+@override_settings(SHOP_SEARCH_BACKEND='memory')
+class MemorySearchTests(SearchTests):
+    """Isti testovi nad indeksom u memoriji (baze bez FTS5)"""
+
+    def setUp(self):
+        super().setUp()
+        # Indeks je na nivou procesa i preživljava rollback baze između testova
+        search.rebuild()
+
+    def test_writes_patch_only_changed_products(self):
+        self.ids('kovanica')
+        with mock.patch.object(search.MemoryIndex, 'build', side_effect=AssertionError), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.kovanica.name = 'Rozeta kovana'
+            self.kovanica.save()
+            ProductVariant.objects.create(product=self.siljak, name='Mali', sku='SIL-M')
+            self.assertEqual(self.ids('rozeta'), [self.kovanica.id])
+            self.assertEqual(self.ids('sil-m'), [self.siljak.id])
+
+        # Drugi proces: čita dnevnik i ponovo učitava samo izmenjene proizvode
+        other = search.MemoryBackend()
+        other.state = (search.current_seq() - 2, search.MemoryIndex.build({}))
+        with CaptureQueriesContext(connection) as queries:
+            index = other.current()
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(set(index.terms), {self.kovanica.id, self.siljak.id})
+        self.assertEqual([pk for pk, score in other.search(['rozet'], 10)], [self.kovanica.id])
+
+    def test_rolled_back_writes_are_reloaded(self):
+        self.ids('sil')
+        with mock.patch.object(connection, 'in_atomic_block', True):
+            search.get_backend().remove([self.kovanica.id])
+        self.assertEqual(self.ids('kovanica'), [])
+        # Van transakcije (ovde: posle nje) stanje se ponovo čita iz baze
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            index = search.get_backend().current()
+        self.assertIn(self.kovanica.id, index.terms)
+
+
+class SuggestTests(CatalogFixtureMixin, ShopAPITestCase):
+    url = '/api/products/suggest/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        ProductVariant.objects.create(product=cls.flah, name='40×5mm')
+        ProductVariant.objects.create(product=cls.firiket, name='40×5mm')
+        ProductVariant.objects.create(product=cls.firiket, name='40×40mm')
+
+    def setUp(self):
+        super().setUp()
+        # Indeks je na nivou procesa i preživljava rollback baze između testova
+        suggest.rebuild()
+
+    def labels(self, q, kind):
+        return [entry['label'] for entry in self.client.get(self.url, {'q': q}).data[kind]]
+
+    def test_prefixes_of_any_word(self):
+        self.assertEqual(self.labels('fl', 'products'), ['Flah vučeni'])
+        self.assertEqual(self.labels('vuc', 'products'), ['Flah vučeni'])
+        self.assertEqual(self.labels('ukr', 'categories'), ['Ukrasni Elementi'])
+        self.assertEqual(self.labels('SI', 'subcategories'), ['Siljci'])
+        self.assertEqual(self.labels('', 'products'), [])
+
+    def test_variant_dimensions(self):
+        # 'x' i '×' su isto; češća dimenzija prva
+        self.assertEqual(self.labels('40', 'variants'), ['40×5mm', '40×40mm'])
+        self.assertEqual(self.labels('40x4', 'variants'), ['40×40mm'])
+        data = self.client.get(self.url, {'q': '40', 'limit': 1}).data
+        self.assertEqual(data['variants'], [{'label': '40×5mm', 'count': 2}])
+
+    def test_no_queries_per_keystroke(self):
+        self.client.get(self.url, {'q': 'f'})
+        with self.assertNumQueries(0):
+            for q in ['fi', 'fir', 'firi']:
+                self.assertEqual(self.labels(q, 'products'), ['Firiket Obični (6m)'])
+
+    def test_incremental_updates_after_commit(self):
+        self.client.get(self.url, {'q': 'f'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flah.name = 'Šipka okrugla'
+            self.flah.save()
+            ProductVariant.objects.filter(name='40×40mm').get().delete()
+            self.cat_ukrasni.name = 'Dekor'
+            self.cat_ukrasni.save()
+
+        # Samo izmenjeni redovi se čitaju iz baze
+        with self.assertNumQueries(5):
+            self.assertEqual(self.labels('sip', 'products'), ['Šipka okrugla'])
+        self.assertEqual(self.labels('flah', 'products'), [])
+        self.assertEqual(self.labels('40', 'variants'), ['40×5mm'])
+        self.assertEqual(self.labels('dek', 'categories'), ['Dekor'])
+        data = self.client.get(self.url, {'q': 'sil'}).data['subcategories']
+        self.assertEqual(data[0]['category_name'], 'Dekor')
+
+    def test_missing_change_log_rebuilds(self):
+        self.client.get(self.url, {'q': 'f'})
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Flah toplo valjani', price=1, category=self.cat_profili)
+        seq = suggest.current_seq()
+        get_cache().delete(f'shop:suggest:change:{seq}')
+        self.assertEqual(self.labels('flah', 'products'), ['Flah toplo valjani', 'Flah vučeni'])
+
+
+class OrderCreateTests(CatalogFixtureMixin, ShopAPITestCase):
+    url = '/api/orders/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.variants = [
+            ProductVariant.objects.create(
+                product=cls.flah, name=f'{n}0×5mm', price_adjustment=Decimal(n), sku=f'FL-{n}'
+            )
+            for n in range(1, 51)
+        ]
+
+    def payload(self, items):
+        return {'customer_name': 'Kupac', 'customer_phone': '0641234567', 'items': items}
+
+    def test_query_count_does_not_grow_with_items(self):
+        one = self.payload([{'product_id': self.flah.id, 'variant_id': self.variants[0].id, 'quantity': 2}])
+        many = self.payload(
+            [{'product_id': self.flah.id, 'variant_id': v.id, 'quantity': 1} for v in self.variants]
+            + [{'product_id': self.firiket.id, 'quantity': 3}]
+        )
+        # proizvodi, varijante, SAVEPOINT, INSERT narudžbine, bulk INSERT stavki,
+        # INSERT u outbox, dva upserta dnevnih zbirova, RELEASE
+        with self.assertNumQueries(9):
+            response = self.client.post(self.url, one, format='json')
+        self.assertEqual(response.status_code, 201)
+        with self.assertNumQueries(9):
+            response = self.client.post(self.url, many, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['items']), 51)
+
+    def test_prices_and_totals(self):
+        response = self.client.post(self.url, self.payload([
+            {'product_id': self.flah.id, 'variant_id': self.variants[1].id, 'quantity': '2'},
+            {'product_id': self.firiket.id, 'quantity': 3},
+        ]), format='json')
+        # Flah je na akciji za 400, varijanta dodaje 2
+        order = Order.objects.get(id=response.data['id'])
+        self.assertEqual(order.total_amount, Decimal('1854.00'))
+        self.assertEqual(
+            [(i.product_name, i.variant_name, i.unit_price, i.total_price) for i in order.items.order_by('id')],
+            [('Flah vučeni', '20×5mm', Decimal('402.00'), Decimal('804.00')),
+             ('Firiket Obični (6m)', '', Decimal('350.00'), Decimal('1050.00'))]
+        )
+
+    def test_invalid_items_create_nothing(self):
+        for items in [
+            [{'product_id': 999999, 'quantity': 1}],
+            [{'product_id': self.firiket.id, 'variant_id': self.variants[0].id, 'quantity': 1}],
+            [{'product_id': self.flah.id, 'quantity': 0}],
+            [{'product_id': 'abc', 'quantity': 1}],
+            [{'product_id': self.siljak.id, 'quantity': 1}],
+        ]:
+            response = self.client.post(self.url, self.payload(items), format='json')
+            self.assertEqual(response.status_code, 400, items)
+        self.assertFalse(Order.objects.exists())
+
+    def test_atomic(self):
+        items = [{'product_id': self.flah.id, 'quantity': 1}]
+        with mock.patch.object(OrderItem.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post(self.url, self.payload(items), format='json')
+        self.assertFalse(Order.objects.exists())
+
+
+
+
+@override_settings(
+    SHOP_ORDER_NOTIFICATION_EMAILS=['vlasnik@example.com'],
+    SHOP_ORDER_NOTIFICATION_PHONES=['060 111 2223'],
+    SHOP_SMS_BACKEND='shop.sms.LocmemBackend',
+)
+class OutboxTests(CatalogFixtureMixin, ShopAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        sms.outbox.clear()
+
+    def place_order(self):
+        response = self.client.post('/api/orders/', {
+            'customer_name': 'Kupac Čović', 'customer_phone': '0641234567',
+            'items': [{'product_id': self.firiket.id, 'quantity': 2}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.get(id=response.data['id'])
+
+    def test_order_is_queued_not_sent(self):
+        order = self.place_order()
+        self.assertEqual((mail.outbox, sms.outbox), ([], []))
+        email = OutboxMessage.objects.get(kind='order_email')
+        self.assertEqual((email.order_id, email.status), (order.id, 'pending'))
+        self.assertIn('Firiket Obični (6m) x2 = 700.00 RSD', email.payload['body'])
+        self.assertEqual(
+            [m.payload['to'] for m in OutboxMessage.objects.filter(kind='order_sms')],
+            ['+381641234567', '+381601112223']
+        )
+
+        call_command('process_outbox', once=True, threads=1, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, f'Nova narudžbina #{order.id}')
+        self.assertEqual(mail.outbox[0].to, ['vlasnik@example.com'])
+        self.assertEqual([m.to for m in sms.outbox], ['+381641234567', '+381601112223'])
+        # SMS bez dijakritika (GSM-7)
+        self.assertIn(f'Nova narudzbina #{order.id}: Kupac Covic, 0641234567, 700.00 RSD', sms.outbox[1].text)
+
+        order.refresh_from_db()
+        self.assertTrue(order.email_sent and order.sms_sent)
+        self.assertEqual(
+            set(OutboxMessage.objects.values_list('status', 'attempts', 'lock_token')), {('sent', 1, '')}
+        )
+        self.assertEqual(
+            sorted(OutboxMessage.objects.filter(kind='order_sms').values_list('reference', flat=True)),
+            ['locmem-1', 'locmem-2']
+        )
+
+        # Poslate poruke se ne šalju ponovo
+        self.assertEqual(notifications.drain(), (0, 0))
+        self.assertEqual((len(mail.outbox), len(sms.outbox)), (1, 2))
+
+    def test_failure_is_retried_with_backoff(self):
+        order = self.place_order()
+        with mock.patch('shop.notifications.send_mail', side_effect=OSError('SMTP nedostupan')), \
+                self.assertLogs('shop.notifications', 'WARNING'):
+            self.assertEqual(notifications.drain(), (2, 1))
+            # Sledeći pokušaj tek posle backoff-a
+            self.assertEqual(notifications.drain(), (0, 0))
+        message = OutboxMessage.objects.get(kind='order_email')
+        self.assertEqual((message.status, message.attempts), ('pending', 1))
+        self.assertIn('SMTP nedostupan', message.last_error)
+        self.assertGreater(message.available_at, timezone.now() + timedelta(seconds=29))
+
+        OutboxMessage.objects.update(available_at=timezone.now())
+        self.assertEqual(notifications.drain(), (1, 0))
+        order.refresh_from_db()
+        self.assertTrue(order.email_sent)
+
+    def test_sms_flag_waits_for_every_recipient(self):
+        order = self.place_order()
+        rejected = lambda backend, messages: [None, RuntimeError('nepostojeći broj')]  # noqa: E731
+        with mock.patch.object(sms.LocmemBackend, 'send_messages', rejected), \
+                self.assertLogs('shop.notifications', 'WARNING'):
+            self.assertEqual(notifications.drain(), (2, 1))
+        order.refresh_from_db()
+        self.assertEqual((order.email_sent, order.sms_sent), (True, False))
+
+        OutboxMessage.objects.update(available_at=timezone.now())
+        self.assertEqual(notifications.drain(), (1, 0))
+        order.refresh_from_db()
+        self.assertTrue(order.sms_sent)
+
+    def test_gives_up_after_max_attempts(self):
+        self.place_order()
+        with override_settings(SHOP_OUTBOX_RETRY_DELAY=0, SHOP_OUTBOX_MAX_ATTEMPTS=3), \
+                mock.patch('shop.notifications.send_mail', side_effect=OSError), \
+                self.assertLogs('shop.notifications', 'WARNING'):
+            self.assertEqual(notifications.drain(), (2, 3))
+        message = OutboxMessage.objects.get(kind='order_email')
+        self.assertEqual((message.status, message.attempts), ('failed', 3))
+        self.assertFalse(Order.objects.get().email_sent)
+
+    def test_leased_message_is_not_claimed_twice(self):
+        self.place_order()
+        self.assertEqual(len(notifications.claim(10)), 3)
+        self.assertEqual(notifications.claim(10), [])
+        # Worker je pao; posle isteka zakupa poruke preuzima drugi
+        OutboxMessage.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(len(notifications.claim(10)), 3)
+
+    def test_failed_order_leaves_no_message(self):
+        response = self.client.post('/api/orders/', {
+            'customer_name': 'Kupac', 'customer_phone': '0641234567',
+            'items': [{'product_id': self.siljak.id, 'quantity': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(OutboxMessage.objects.exists())
+
+
+class SMSGatewayTests(SimpleTestCase):
+    """HTTPGatewayBackend protiv lokalnog HTTP servera"""
+
+    def setUp(self):
+        self.requests = []
+        self.connections = set()
+        test = self
+
+        class Gateway(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                test.requests.append((self.headers['Authorization'], body))
+                test.connections.add(self.client_address)
+                results = [
+                    {'status': 'rejected', 'error': 'nepostojeći broj'} if m['to'] == '+000'
+                    else {'status': 'accepted', 'id': f"gw-{m['to']}"}
+                    for m in body['messages']
+                ]
+                content = json.dumps({'results': results}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Gateway)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/send'
+
+    def test_batches_over_one_connection(self):
+        backend = sms.HTTPGatewayBackend(URL=self.url, TOKEN='tajna', BATCH_SIZE=100, RATE_LIMIT=1000)
+        messages = [sms.SMSMessage(f'+381{n}', 'Poruka') for n in range(250)] + [sms.SMSMessage('+000', 'x')]
+        results = backend.send_messages(messages[:200])
+        results += backend.send_messages(messages[200:])
+        backend.close()
+
+        self.assertEqual([len(body['messages']) for _, body in self.requests], [100, 100, 51])
+        self.assertEqual({auth for auth, _ in self.requests}, {'Bearer tajna'})
+        self.assertEqual(len(self.connections), 1)
+        self.assertEqual(results[:250], [None] * 250)
+        self.assertIn('nepostojeći broj', str(results[250]))
+        self.assertEqual(messages[7].reference, 'gw-+3817')
+
+    def test_gateway_error_fails_whole_batch(self):
+        backend = sms.HTTPGatewayBackend(URL=self.url.replace('/send', ''), TOKEN='tajna', RATE_LIMIT=1000)
+        self.server.RequestHandlerClass.do_POST = lambda handler: handler.send_error(503)
+        results = backend.send_messages([sms.SMSMessage('+3811', 'a'), sms.SMSMessage('+3812', 'b')])
+        self.assertEqual(len(results), 2)
+        self.assertTrue(all('HTTP 503' in str(error) for error in results))
+
+    def test_refuses_without_url_or_token(self):
+        for config in [{'URL': self.url}, {'TOKEN': 'tajna'}, {'URL': '', 'TOKEN': ''}]:
+            with override_settings(SHOP_SMS_GATEWAY=config):
+                results = sms.HTTPGatewayBackend(RATE_LIMIT=1000).send_messages([sms.SMSMessage('+3811', 'a')])
+            self.assertIn('nisu podešeni', str(results[0]))
+        self.assertEqual(self.requests, [])
+
+    def test_rate_limiter(self):
+        now = [0.0]
+        waits = []
+        limiter = sms.RateLimiter(10, clock=lambda: now[0], sleep=waits.append)
+        limiter.acquire(10)
+        limiter.acquire(5)
+        now[0] += 1
+        limiter.acquire(10)
+        # Prvih 10 odmah, sledećih 5 čeka pola sekunde, zatim je bucket ponovo 5 u minusu
+        self.assertEqual(waits, [0.5, 0.5])
+
+
+class OutboxWorkerThreadTests(TransactionTestCase):
+    """Više niti nad istim outbox-om: svaka poruka se pošalje tačno jednom"""
+
+    def test_thread_pool_sends_each_message_once(self):
+        orders = Order.objects.bulk_create(
+            [Order(customer_name=f'Kupac {n}', customer_phone='0641234567', total_amount=100) for n in range(40)]
+        )
+        OutboxMessage.objects.bulk_create([
+            OutboxMessage(kind='order_email', order=order, payload={
+                'subject': f'Narudžbina {order.id}', 'body': '', 'recipients': ['vlasnik@example.com'],
+            })
+            for order in orders
+        ])
+        self.assertEqual(notifications.drain(threads=4, batch=7), (40, 0))
+        self.assertEqual(sorted(m.subject for m in mail.outbox), sorted(f'Narudžbina {o.id}' for o in orders))
+        self.assertEqual(Order.objects.filter(email_sent=True).count(), 40)
+
+
+class IdempotencyTests(CatalogFixtureMixin, ShopAPITestCase):
+    url = '/api/orders/'
+
+    def post(self, key, quantity=2, product=None):
+        return self.client.post(self.url, {
+            'customer_name': 'Kupac', 'customer_phone': '0641234567',
+            'items': [{'product_id': (product or self.firiket).id, 'quantity': quantity}],
+        }, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay_returns_first_response(self):
+        first = self.post('kljuc-1')
+        self.assertEqual(first.status_code, 201)
+        with self.assertNumQueries(1):
+            second = self.post('kljuc-1')
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OutboxMessage.objects.filter(kind='order_email').count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get().order_id, first.data['id'])
+
+        # Bez ključa svaki zahtev je nova narudžbina
+        self.client.post(self.url, {
+            'customer_name': 'Kupac', 'customer_phone': '0641234567',
+            'items': [{'product_id': self.firiket.id, 'quantity': 2}],
+        }, format='json')
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_same_key_different_body(self):
+        self.post('kljuc-1', quantity=2)
+        response = self.post('kljuc-1', quantity=3)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failed_request_does_not_use_key(self):
+        self.assertEqual(self.post('kljuc-1', product=self.siljak).status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        Product.objects.filter(id=self.siljak.id).update(in_stock=True)
+        self.assertEqual(self.post('kljuc-1', product=self.siljak).status_code, 201)
+
+    def test_concurrent_duplicate_collapses_on_unique_key(self):
+        first = self.post('kljuc-1')
+        # Drugi zahtev nije video ključ pri proveri, pa pada na unique indeksu
+        with mock.patch.object(idempotency, 'lookup', return_value=None):
+            second = self.post('kljuc-1')
+        self.assertEqual((second.status_code, second.data['id']), (201, first.data['id']))
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_expired_key_is_reused_and_purged(self):
+        self.post('kljuc-1')
+        self.post('kljuc-2')
+        IdempotencyKey.objects.filter(key='kljuc-1').update(expires_at=timezone.now())
+        self.assertEqual(self.post('kljuc-1', quantity=5).status_code, 201)
+        self.assertEqual(Order.objects.count(), 3)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.post('kljuc-3')
+        # Dve serije + prazna provera; svaka serija je SELECT i jedan DELETE
+        with self.assertNumQueries(5):
+            self.assertEqual(idempotency.purge(batch_size=1), 2)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['kljuc-3'])
+
+    def test_key_length(self):
+        self.assertEqual(self.post('').status_code, 400)
+        self.assertEqual(self.post('x' * 101).status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class ConcurrentIdempotencyTests(TransactionTestCase):
+    """Isti ključ iz više niti istovremeno: jedna narudžbina, isti odgovor svima"""
+
+    def test_duplicates_collapse(self):
+        category = Category.objects.create(name='Profili')
+        product = Product.objects.create(name='Firiket', price=Decimal('100.00'), category=category)
+        get_cache().clear()
+        responses = []
+        barrier = threading.Barrier(6)
+
+        def submit():
+            try:
+                barrier.wait()
+                responses.append(APIClient().post('/api/orders/', {
+                    'customer_name': 'Kupac', 'customer_phone': '0641234567',
+                    'items': [{'product_id': product.id, 'quantity': 1}],
+                }, format='json', HTTP_IDEMPOTENCY_KEY='isti-kljuc'))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([r.status_code for r in responses], [201] * 6)
+        self.assertEqual(len({r.data['id'] for r in responses}), 1)
+        self.assertEqual(Order.objects.count(), 1)
+
+class StockTests(CatalogFixtureMixin, ShopAPITestCase):
+    url = '/api/orders/'
+
+    def setUp(self):
+        super().setUp()
+        self.variant = ProductVariant.objects.create(product=self.flah, name='20×5mm', stock_quantity=5)
+        Product.objects.filter(id=self.firiket.id).update(stock_quantity=10)
+        self.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'lozinka')
+
+    def order(self, *items):
+        return self.client.post(self.url, {
+            'customer_name': 'Kupac', 'customer_phone': '0641234567',
+            'items': [dict(zip(('product_id', 'variant_id', 'quantity'), item)) for item in items],
+        }, format='json')
+
+    def stock(self, obj):
+        obj.refresh_from_db()
+        return obj.stock_quantity, obj.in_stock
+
+    def test_order_takes_stock_from_variant_or_product(self):
+        response = self.order((self.flah.id, self.variant.id, 2), (self.firiket.id, None, 3))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.stock(self.variant), (3, True))
+        self.assertEqual(self.stock(self.firiket), (7, True))
+        # Flah nema praćenu zalihu (0); stavka sa varijantom ga ne dira
+        self.assertEqual(self.stock(self.flah), (0, True))
+        self.assertEqual(
+            sorted(OrderItem.objects.values_list('stock_reserved', flat=True)), [2, 3]
+        )
+
+    def test_variant_stock_rules(self):
+        # Varijanta sa 0 na stanju se ne prati; ni zaliha proizvoda se ne gleda
+        untracked = ProductVariant.objects.create(product=self.firiket, name='Bez lagera')
+        response = self.order((self.firiket.id, untracked.id, 50))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['items'][0]['quantity'], 50)
+        self.assertEqual(self.stock(untracked), (0, True))
+        self.assertEqual(self.stock(self.firiket), (10, True))
+        self.assertEqual(OrderItem.objects.get(variant=untracked).stock_reserved, 0)
+
+        # Isključena varijanta se ne prodaje ni kada je proizvod na stanju
+        ProductVariant.objects.filter(id=untracked.id).update(in_stock=False)
+        self.assertEqual(self.order((self.firiket.id, untracked.id, 1)).status_code, 400)
+
+    def test_last_piece_marks_out_of_stock(self):
+        # Ista varijanta u dve stavke se sabira
+        response = self.order((self.flah.id, self.variant.id, 3), (self.flah.id, self.variant.id, 2))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.stock(self.variant), (0, False))
+        self.assertEqual(self.order((self.flah.id, self.variant.id, 1)).status_code, 400)
+
+    def test_oversell_rejected_without_side_effects(self):
+        response = self.order((self.firiket.id, None, 2), (self.flah.id, self.variant.id, 6))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stock(self.firiket), (10, True))
+        self.assertEqual(self.stock(self.variant), (5, True))
+        self.assertFalse(Order.objects.exists())
+
+    def test_only_short_rows_are_reported(self):
+        # Prva varijanta prolazi i posle skidanja ima manje nego što je traženo;
+        # ne sme da se pojavi u poruci, a zaliha joj ostaje netaknuta
+        other = ProductVariant.objects.create(product=self.flah, name='20×8mm', stock_quantity=2)
+        original = inventory.check_available
+
+        def sell_in_between(stock, quantity):
+            original(stock, quantity)
+            ProductVariant.objects.filter(id=other.id).update(stock_quantity=1)
+
+        with mock.patch.object(inventory, 'check_available', sell_in_between):
+            response = self.order((self.flah.id, self.variant.id, 3), (self.flah.id, other.id, 2))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('20×8mm', str(response.data))
+        self.assertNotIn('20×5mm', str(response.data))
+        self.assertEqual(self.stock(self.variant), (5, True))
+        self.assertEqual(self.stock(other), (1, True))
+
+    def test_stock_changed_after_validation(self):
+        # Kupac je video 5 komada, ali je neko kupio 4 pre upisa
+        original = inventory.check_available
+
+        def sell_in_between(stock, quantity):
+            original(stock, quantity)
+            ProductVariant.objects.filter(id=self.variant.id).update(stock_quantity=1)
+
+        with mock.patch.object(inventory, 'check_available', sell_in_between):
+            response = self.order((self.firiket.id, None, 2), (self.flah.id, self.variant.id, 3))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('20×5mm', str(response.data))
+        self.assertEqual(self.stock(self.firiket), (10, True))
+        self.assertFalse(Order.objects.exists())
+
+    def test_cancel_restores_stock_once(self):
+        order_id = self.order((self.flah.id, self.variant.id, 5), (self.firiket.id, None, 1)).data['id']
+        self.client.force_authenticate(self.admin)
+        url = f'{self.url}{order_id}/update_status/'
+        for _ in range(2):
+            response = self.client.post(url, {'status': 'cancelled'}, format='json')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock(self.variant), (5, True))
+        self.assertEqual(self.stock(self.firiket), (10, True))
+
+        # Vraćanje otkazane narudžbine ponovo uzima zalihu, ako je ima
+        self.assertEqual(self.client.post(url, {'status': 'pending'}, format='json').status_code, 200)
+        self.assertEqual(self.stock(self.variant), (0, False))
+        self.client.post(url, {'status': 'cancelled'}, format='json')
+        Product.objects.filter(id=self.firiket.id).update(stock_quantity=0, in_stock=False)
+        response = self.client.post(url, {'status': 'confirmed'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.get(id=order_id).status, 'cancelled')
+        self.assertEqual(self.stock(self.variant), (5, True))
+
+    def test_cancel_keeps_manual_out_of_stock(self):
+        order_id = self.order((self.firiket.id, None, 3), (self.flah.id, self.variant.id, 5)).data['id']
+        self.assertEqual(
+            dict(OrderItem.objects.values_list('variant_id', 'stock_sold_out')),
+            {None: False, self.variant.id: True}
+        )
+        # Admin je povukao proizvod iz prodaje posle narudžbine
+        Product.objects.filter(id=self.firiket.id).update(stock_quantity=0, in_stock=False)
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(f'{self.url}{order_id}/update_status/', {'status': 'cancelled'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock(self.firiket), (3, False))
+        # Varijantu je isključila baš ova prodaja
+        self.assertEqual(self.stock(self.variant), (5, True))
+
+    def test_stock_change_invalidates_catalog_cache(self):
+        url = f'/api/products/{self.firiket.id}/'
+        self.assertEqual(self.client.get(url).data['stock_quantity'], 10)
+        self.order((self.firiket.id, None, 4))
+        self.assertEqual(self.client.get(url).data['stock_quantity'], 6)
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Istovremene narudžbine iz više niti ne smeju prodati više nego što ima"""
+
+    def test_no_oversell(self):
+        category = Category.objects.create(name='Profili')
+        product = Product.objects.create(
+            name='Firiket', price=Decimal('100.00'), category=category, stock_quantity=15
+        )
+        get_cache().clear()
+        results = []
+
+        def buy():
+            client = APIClient()
+            try:
+                for _ in range(3):
+                    results.append(client.post('/api/orders/', {
+                        'customer_name': 'Kupac', 'customer_phone': '0641234567',
+                        'items': [{'product_id': product.id, 'quantity': 2}],
+                    }, format='json').status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        sold = sum(OrderItem.objects.values_list('stock_reserved', flat=True))
+        self.assertEqual(results.count(201), 7)
+        self.assertEqual(results.count(400), 11)
+        self.assertEqual(sold, 14)
+        self.assertEqual((product.stock_quantity, product.in_stock), (1, True))
+
+
+class OrderListTests(ShopAPITestCase):
+    url = '/api/orders/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass')
+        product = Product.objects.create(
+            name='Firiket', description='Opis', price=Decimal('100.00'),
+            category=Category.objects.create(name='Profili')
+        )
+        cls.orders = []
+        for i, (name, phone, status) in enumerate([
+            ('Petar Petrović', '064 123 4567', 'pending'),
+            ('Marko Marković', '+381 63 555 111', 'confirmed'),
+            ('Jovana Jović', '00381641239999', 'cancelled'),
+        ]):
+            order = Order.objects.create(
+                customer_name=name, customer_phone=phone, customer_email=f'kupac{i}@example.com',
+                status=status, total_amount=Decimal('100.00')
+            )
+            for _ in range(i + 1):
+                OrderItem.objects.create(
+                    order=order, product=product, quantity=1, unit_price=Decimal('100.00'), product_name='Firiket'
+                )
+            cls.orders.append(order)
+        # Prva narudžbina je od pre mesec dana
+        Order.objects.filter(id=cls.orders[0].id).update(created_at=timezone.now() - timedelta(days=30))
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.admin)
+
+    def ids(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return {row['id'] for row in response.data['results']}
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        response = self.client.post(f'{self.url}{self.orders[0].id}/update_status/', {'status': 'completed'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_status_filter(self):
+        first, second, third = self.orders
+        self.assertEqual(self.ids(status='pending,confirmed'), {first.id, second.id})
+        self.assertEqual(self.ids(status='cancelled'), {third.id})
+        self.assertEqual(self.client.get(self.url, {'status': 'nepoznat'}).status_code, 400)
+
+    def test_date_filter(self):
+        today = timezone.now().date()
+        self.assertEqual(self.ids(date_from=today - timedelta(days=1)), {self.orders[1].id, self.orders[2].id})
+        self.assertEqual(self.ids(date_to=today - timedelta(days=30)), {self.orders[0].id})
+        response = self.client.get(self.url, {'date_from': today, 'date_to': today - timedelta(days=1)})
+        self.assertEqual(response.status_code, 400)
+
+    def test_phone_prefix_in_any_format(self):
+        first, second, third = self.orders
+        for phone in ['0641', '+381 64 1', '00381-641', '641']:
+            self.assertEqual(self.ids(phone=phone), {first.id, third.id}, phone)
+        self.assertEqual(self.ids(phone='063 555'), {second.id})
+        self.assertEqual(self.ids(phone='0641239'), {third.id})
+        self.assertEqual(self.ids(phone='abc'), set())
+
+    def test_search(self):
+        first, second, third = self.orders
+        self.assertEqual(self.ids(search='marko'), {second.id})
+        self.assertEqual(self.ids(search='kupac2@'), {third.id})
+        self.assertEqual(self.ids(search=f'#{first.id}'), {first.id})
+        self.assertEqual(self.ids(search='063 555'), {second.id})
+
+    def test_phone_digits_follow_updates(self):
+        order = self.orders[1]
+        order.customer_phone = '011/222-333'
+        order.save(update_fields=['customer_phone'])
+        self.assertEqual(self.ids(phone='011 222'), {order.id})
+
+    def test_paginated_with_items_in_constant_queries(self):
+        response = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual([row['id'] for row in response.data['results']], [self.orders[2].id, self.orders[1].id])
+        self.assertEqual(len(response.data['results'][0]['items']), 3)
+        # Stranica + jedan upit za stavke svih narudžbina
+        with self.assertNumQueries(2):
+            response = self.client.get(response.data['next'])
+        self.assertEqual([row['id'] for row in response.data['results']], [self.orders[0].id])
+        self.assertIsNone(response.data['next'])
+
+    def test_summary_has_item_count_without_items(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'summary': '1'})
+        rows = {row['id']: row for row in response.data['results']}
+        self.assertEqual({pk: row['item_count'] for pk, row in rows.items()},
+                         {order.id: i + 1 for i, order in enumerate(self.orders)})
+        self.assertNotIn('items', rows[self.orders[0].id])
+        # Detalj i dalje vraća stavke
+        detail = self.client.get(f'{self.url}{self.orders[0].id}/', {'summary': '1'})
+        self.assertEqual(len(detail.data['items']), 1)
+
+
+class ExportTests(ShopAPITestCase):
+    url = '/api/orders/export/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass')
+        product = Product.objects.create(
+            name='Firiket', description='Opis', price=Decimal('100.00'),
+            category=Category.objects.create(name='Profili')
+        )
+        cls.orders = []
+        for i, status in enumerate(['pending', 'completed', 'completed']):
+            order = Order.objects.create(
+                customer_name=f'Kupac "Č" {i}', customer_phone='0641234567',
+                status=status, total_amount=Decimal('250.50')
+            )
+            for n in range(2):
+                OrderItem.objects.create(
+                    order=order, product=product, quantity=n + 1,
+                    unit_price=Decimal('100.25'), product_name='Firiket, 6m'
+                )
+            cls.orders.append(order)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.admin)
+
+    def download(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_orders(self):
+        response, content = self.download()
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="narudzbine-orders-', response['Content-Disposition'])
+        rows = list(csv.DictReader(content.lstrip('\ufeff').splitlines()))
+        self.assertEqual([int(row['id']) for row in rows], [order.id for order in self.orders])
+        self.assertEqual(rows[0]['customer_name'], 'Kupac "Č" 0')
+        self.assertEqual(rows[0]['total_amount'], '250.50')
+
+    def test_jsonl_items_with_filters(self):
+        response, content = self.download(rows='items', type='jsonl', status='completed')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), 4)
+        self.assertEqual({row['order_id'] for row in rows}, {self.orders[1].id, self.orders[2].id})
+        self.assertEqual(rows[0]['order_status'], 'completed')
+        self.assertEqual(rows[1]['total_price'], '200.50')
+        self.assertEqual(rows[1]['product_name'], 'Firiket, 6m')
+
+    def test_items_in_one_query_and_several_chunks(self):
+        with mock.patch.object(export, 'WRITE_SIZE', 2), CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'rows': 'items'})
+            chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(''.join(chunk.decode() for chunk in chunks).count('\r\n'), 7)
+        selects = [q for q in queries if q['sql'].startswith('SELECT') and 'shop_orderitem' in q['sql']]
+        self.assertEqual(len(selects), 1)
+
+    def test_invalid_params_and_permissions(self):
+        self.assertEqual(self.client.get(self.url, {'type': 'xlsx'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'status': 'nepoznat'}).status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_orders', '--rows', 'items', '--type', 'jsonl', '--status', 'pending', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+
+        with tempfile.NamedTemporaryFile(suffix='.csv') as output:
+            call_command('export_orders', '--output', output.name, stderr=StringIO())
+            rows = list(csv.reader(output.read().decode('utf-8-sig').splitlines()))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0], [column for column, _ in export.ORDER_COLUMNS])
+
+
+class ReportTests(CatalogFixtureMixin, ShopAPITestCase):
+    url = '/api/reports/sales/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass')
+        cls.variant = ProductVariant.objects.create(product=cls.flah, name='20×5mm', price_adjustment=Decimal('10'))
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.admin)
+
+    def order(self, *lines):
+        response = self.client.post('/api/orders/', {
+            'customer_name': 'Kupac', 'customer_phone': '0641234567',
+            'items': [
+                {'product_id': product.id, 'variant_id': variant and variant.id, 'quantity': quantity}
+                for product, variant, quantity in lines
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def set_status(self, order_id, new_status):
+        return self.client.post(f'/api/orders/{order_id}/update_status/', {'status': new_status}, format='json')
+
+    def report(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def snapshot(self):
+        return (
+            sorted(DailyOrderStats.objects.filter(order_count__gt=0).values_list('date', 'status', 'order_count', 'revenue')),
+            sorted(DailyItemSales.objects.filter(quantity__gt=0).values_list('date', 'product_id', 'variant_id', 'quantity', 'revenue')),
+        )
+
+    def test_incremental_matches_rebuild(self):
+        first = self.order((self.firiket, None, 2), (self.flah, self.variant, 1))
+        second = self.order((self.firiket, None, 1))
+        third = self.order((self.flah, None, 3))
+        self.set_status(first, 'confirmed')
+        self.set_status(second, 'cancelled')
+        self.set_status(third, 'cancelled')
+        self.set_status(third, 'pending')
+        incremental = self.snapshot()
+
+        call_command('rebuild_reports', stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_rebuild_moves_changed_history(self):
+        order_id = self.order((self.firiket, None, 1))
+        # Izmena mimo API-ja (npr. uvoz starih narudžbina)
+        Order.objects.filter(id=order_id).update(created_at=timezone.now() - timedelta(days=40))
+        call_command('rebuild_reports', '--days', '7', stdout=StringIO())
+        self.assertEqual(self.report()['totals']['orders'], 0)
+        old = timezone.localdate() - timedelta(days=40)
+        self.assertEqual(self.report(date_from=old, date_to=old)['totals'], {'orders': 1, 'revenue': '350.00'})
+
+    def test_rollups_follow_status_changes(self):
+        first = self.order((self.firiket, None, 2), (self.flah, self.variant, 1))
+        incremental = self.snapshot()
+        reports.rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+        self.set_status(first, 'cancelled')
+        data = self.report(group='product')
+        self.assertEqual(data['rows'], [])
+        self.assertEqual(data['totals'], {'orders': 0, 'revenue': '0.00'})
+        status_rows = {row['status']: row for row in self.report(group='status')['rows']}
+        self.assertEqual(status_rows['cancelled'], {'status': 'cancelled', 'orders': 1, 'revenue': '1110.00'})
+        self.assertEqual(status_rows['pending']['orders'], 0)
+
+        self.set_status(first, 'confirmed')
+        self.set_status(first, 'completed')
+        self.assertEqual(self.report(group='product')['totals'], {'orders': 1, 'revenue': '1110.00'})
+        incremental = self.snapshot()
+        reports.rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_groups(self):
+        self.order((self.firiket, None, 2), (self.flah, self.variant, 1))
+        self.order((self.flah, None, 1))
+        today = timezone.localdate()
+
+        days = self.report(group='day', date_from=today - timedelta(days=2), date_to=today)['rows']
+        self.assertEqual(days, [
+            {'date': (today - timedelta(days=2)).isoformat(), 'orders': 0, 'revenue': '0.00'},
+            {'date': (today - timedelta(days=1)).isoformat(), 'orders': 0, 'revenue': '0.00'},
+            {'date': today.isoformat(), 'orders': 2, 'revenue': '1510.00'},
+        ])
+        categories = self.report(group='category')['rows']
+        self.assertEqual(
+            [(row['category'], row['quantity'], row['revenue']) for row in categories],
+            [('Profili i Cevi', 4, '1510.00')]
+        )
+        products = self.report(group='product')['rows']
+        self.assertEqual(
+            [(row['product_name'], row['quantity'], row['revenue']) for row in products],
+            [('Flah vučeni', 2, '810.00'), ('Firiket Obični (6m)', 2, '700.00')]
+        )
+        variants = self.report(group='variant', limit=2)['rows']
+        self.assertEqual(
+            [(row['product_id'], row['variant_id'], row['variant_name'], row['revenue']) for row in variants],
+            [(self.firiket.id, 0, '', '700.00'), (self.flah.id, self.variant.id, '20×5mm', '410.00')]
+        )
+
+    def test_query_count_does_not_depend_on_history(self):
+        self.order((self.firiket, None, 1))
+        with self.assertNumQueries(2):
+            self.report(group='product')
+        with self.assertNumQueries(3):
+            self.report(group='category')
+
+    def test_invalid_params(self):
+        self.assertEqual(self.client.get(self.url, {'group': 'sat'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'date_from': '2025-02-01', 'date_to': '2025-01-01'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'date_from': '2020-01-01', 'date_to': '2025-01-01'}).status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+class BulkStatusTests(CatalogFixtureMixin, ShopAPITestCase):
+    url = '/api/orders/bulk_status/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass')
+
+    def setUp(self):
+        super().setUp()
+        Product.objects.filter(id=self.firiket.id).update(stock_quantity=10)
+
+    def place(self, count, quantity=1):
+        ids = []
+        for _ in range(count):
+            response = self.client.post('/api/orders/', {
+                'customer_name': 'Kupac', 'customer_phone': '0641234567',
+                'items': [{'product_id': self.firiket.id, 'quantity': quantity}, {'product_id': self.flah.id, 'quantity': 1}],
+            }, format='json')
+            self.assertEqual(response.status_code, 201)
+            ids.append(response.data['id'])
+        self.client.force_authenticate(self.admin)
+        return ids
+
+    def bulk(self, **data):
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def updates(self, queries):
+        return [q['sql'] for q in queries if q['sql'].startswith('UPDATE "shop_order"')]
+
+    def test_one_update_per_target_status(self):
+        ids = self.place(4)
+        with CaptureQueriesContext(connection) as queries:
+            data = self.bulk(ids=ids, status='confirmed')
+        self.assertEqual(data['updated'], 4)
+        self.assertEqual({(r['id'], r['from'], r['to'], r['result']) for r in data['results']},
+                         {(pk, 'pending', 'confirmed', 'updated') for pk in ids})
+        self.assertEqual(len(self.updates(queries)), 1)
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'confirmed'})
+
+    def test_single_order_allows_any_transition(self):
+        order_id, = self.place(1, quantity=3)
+        url = f'/api/orders/{order_id}/update_status/'
+        Order.objects.filter(id=order_id).update(status='completed')
+        self.assertEqual(self.bulk(ids=[order_id], status='cancelled')['results'][0]['result'], 'invalid_transition')
+
+        # Pojedinačno: completed -> cancelled vraća zalihu, cancelled -> processing je ponovo uzima
+        response = self.client.post(url, {'status': 'cancelled'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Product.objects.get(id=self.firiket.id).stock_quantity, 10)
+        response = self.client.post(url, {'status': 'processing'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.get(id=order_id).status, 'processing')
+        self.assertEqual(Product.objects.get(id=self.firiket.id).stock_quantity, 7)
+        response = self.client.post(url, {'status': 'nepostojeci'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_update_rejects_status_change(self):
+        order_id, = self.place(1)
+        url = f'/api/orders/{order_id}/'
+        response = self.client.patch(url, {'status': 'cancelled', 'admin_notes': 'x'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('update_status', str(response.data['status']))
+        self.assertEqual(Order.objects.get(id=order_id).status, 'pending')
+        self.assertEqual(Product.objects.get(id=self.firiket.id).stock_quantity, 9)
+
+        # Nepromenjen status (npr. ceo objekat nazad kroz PUT) ne smeta
+        response = self.client.patch(url, {'status': 'pending', 'admin_notes': 'x'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.get(id=order_id).admin_notes, 'x')
+
+    def test_query_count_does_not_grow_with_orders(self):
+        few, many = self.place(2), self.place(8)
+        counts = []
+        for ids in (few, many):
+            with CaptureQueriesContext(connection) as queries:
+                self.bulk(ids=ids, status='cancelled')
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_mixed_changes_and_per_order_results(self):
+        first, second, third = self.place(3, quantity=2)
+        Order.objects.filter(id=third).update(status='completed')
+        with CaptureQueriesContext(connection) as queries:
+            data = self.bulk(changes=[
+                {'id': first, 'status': 'cancelled'},
+                {'id': second, 'status': 'processing'},
+                {'id': third, 'status': 'pending'},
+                {'id': 999999, 'status': 'confirmed'},
+            ])
+        self.assertEqual(len(self.updates(queries)), 2)
+        results = {r['id']: r['result'] for r in data['results']}
+        self.assertEqual(results, {
+            first: 'updated', second: 'updated', third: 'invalid_transition', 999999: 'not_found',
+        })
+        self.assertEqual(Order.objects.get(id=third).status, 'completed')
+        # Zaliha otkazane narudžbine je vraćena
+        self.assertEqual(Product.objects.get(id=self.firiket.id).stock_quantity, 10 - 2 * 2)
+
+    def test_cancel_restores_stock_and_queues_sms_in_batches(self):
+        ids = self.place(3, quantity=3)
+        self.assertEqual(Product.objects.get(id=self.firiket.id).stock_quantity, 1)
+        with CaptureQueriesContext(connection) as queries:
+            self.bulk(ids=ids, status='cancelled')
+        product_updates = [q for q in queries if q['sql'].startswith('UPDATE "shop_product"')]
+        self.assertEqual(len(product_updates), 1)
+        self.assertEqual(Product.objects.get(id=self.firiket.id).stock_quantity, 10)
+        cancelled = [m.order_id for m in OutboxMessage.objects.filter(kind='order_sms') if 'otkazana' in m.payload['text']]
+        self.assertEqual(sorted(cancelled), sorted(ids))
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('INSERT INTO "shop_outboxmessage"')]), 1)
+
+    def test_restore_without_stock_fails_only_that_order(self):
+        first, second = self.place(2, quantity=4)
+        self.bulk(ids=[first, second], status='cancelled')
+        # Posle otkazivanja neko je kupio 7 komada; ima dovoljno samo za jednu
+        Product.objects.filter(id=self.firiket.id).update(stock_quantity=4)
+        data = self.bulk(ids=[first, second], status='pending')
+        results = {r['id']: r['result'] for r in data['results']}
+        self.assertEqual(sorted(results.values()), ['out_of_stock', 'updated'])
+        failed = next(r for r in data['results'] if r['result'] == 'out_of_stock')
+        self.assertIn('Firiket', failed['error'])
+        self.assertEqual(Order.objects.get(id=failed['id']).status, 'cancelled')
+        self.assertEqual(Product.objects.get(id=self.firiket.id).stock_quantity, 0)
+
+    def test_rollups_match_rebuild(self):
+        ids = self.place(4)
+        self.bulk(changes=[
+            {'id': ids[0], 'status': 'cancelled'}, {'id': ids[1], 'status': 'cancelled'},
+            {'id': ids[2], 'status': 'completed'},
+        ])
+        self.bulk(ids=[ids[0]], status='pending')
+        incremental = list(DailyOrderStats.objects.filter(order_count__gt=0).values_list('status', 'order_count'))
+        sales = list(DailyItemSales.objects.filter(quantity__gt=0).values_list('product_id', 'quantity'))
+        reports.rebuild()
+        self.assertEqual(
+            list(DailyOrderStats.objects.values_list('status', 'order_count')), incremental
+        )
+        self.assertEqual(list(DailyItemSales.objects.values_list('product_id', 'quantity')), sales)
+
+    def test_validation_and_permissions(self):
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.post(self.url, {'ids': [1]}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(self.url, {'ids': [1], 'status': 'x'}, format='json').status_code, 400)
+        response = self.client.post(self.url, {'ids': list(range(501)), 'status': 'confirmed'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.post(self.url, {'ids': [1], 'status': 'confirmed'}, format='json').status_code, 401)
+
+
+class ArchiveTests(CatalogFixtureMixin, ShopAPITestCase):
+    url = '/api/archived-orders/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass')
+
+    def place(self, *statuses):
+        ids = []
+        for new_status in statuses:
+            response = self.client.post('/api/orders/', {
+                'customer_name': 'Kupac', 'customer_phone': '0641234567',
+                'items': [{'product_id': self.firiket.id, 'quantity': 2}, {'product_id': self.flah.id, 'quantity': 1}],
+            }, format='json')
+            self.assertEqual(response.status_code, 201)
+            ids.append(response.data['id'])
+            if new_status != 'pending':
+                orders.change_statuses({ids[-1]: new_status})
+        # Poruke su poslate, a narudžbine poslednji put menjane pre godinu dana
+        OutboxMessage.objects.update(status='sent')
+        Order.objects.filter(id__in=ids).update(updated_at=timezone.now() - timedelta(days=365))
+        self.client.force_authenticate(self.admin)
+        return ids
+
+    def archive(self, *args):
+        call_command('archive_orders', *args, stdout=StringIO())
+
+    def test_moves_old_finished_orders_with_items(self):
+        pending, completed, cancelled, recent = self.place('pending', 'completed', 'cancelled', 'completed')
+        Order.objects.filter(id=recent).update(updated_at=timezone.now())
+        original = Order.objects.get(id=completed)
+        item_ids = set(OrderItem.objects.filter(order_id__in=[completed, cancelled]).values_list('id', flat=True))
+
+        self.archive()
+        self.assertEqual(set(Order.objects.values_list('id', flat=True)), {pending, recent})
+        self.assertEqual(set(ArchivedOrder.objects.values_list('id', flat=True)), {completed, cancelled})
+        self.assertEqual(set(ArchivedOrderItem.objects.values_list('id', flat=True)), item_ids)
+        self.assertFalse(OrderItem.objects.filter(id__in=item_ids).exists())
+        archived = ArchivedOrder.objects.get(id=completed)
+        self.assertEqual((archived.created_at, archived.updated_at, archived.total_amount),
+                         (original.created_at, original.updated_at, original.total_amount))
+        self.assertTrue(OutboxMessage.objects.filter(order=None).exists())
+
+    def test_pending_outbox_keeps_order_hot(self):
+        completed, = self.place('completed')
+        OutboxMessage.objects.filter(order_id=completed).update(status='pending')
+        self.archive()
+        self.assertTrue(Order.objects.filter(id=completed).exists())
+        self.assertFalse(ArchivedOrder.objects.exists())
+
+    def test_batches_resume_with_flat_query_count(self):
+        ids = self.place(*['completed'] * 5)
+        self.archive('--batch', '2', '--max-batches', '1')
+        self.assertEqual(list(ArchivedOrder.objects.order_by('id').values_list('id', flat=True)), ids[:2])
+
+        before = archive.cutoff()
+        with CaptureQueriesContext(connection) as small:
+            archive.archive_batch(before, batch_size=1)
+        with CaptureQueriesContext(connection) as large:
+            archive.archive_batch(before, batch_size=2)
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(ArchivedOrder.objects.count(), 5)
+        self.assertEqual(archive.archive_batch(before), (0, 0, None))
+
+    def test_reports_include_archived_orders(self):
+        self.place('completed', 'cancelled', 'pending')
+        self.client.force_authenticate(self.admin)
+        before = self.client.get('/api/reports/sales/', {'group': 'product'}).data
+        self.archive()
+        self.assertEqual(self.client.get('/api/reports/sales/', {'group': 'product'}).data, before)
+
+        call_command('rebuild_reports', stdout=StringIO())
+        self.assertEqual(self.client.get('/api/reports/sales/', {'group': 'product'}).data, before)
+        self.assertEqual(DailyOrderStats.objects.get(status='completed').order_count, 1)
+
+    def test_archived_endpoint_is_read_only(self):
+        completed, cancelled = self.place('completed', 'cancelled')
+        self.archive()
+
+        response = self.client.get(self.url, {'summary': 1, 'status': 'completed'})
+        self.assertEqual([row['id'] for row in response.data['results']], [completed])
+        self.assertEqual(response.data['results'][0]['item_count'], 2)
+        response = self.client.get(f'{self.url}{cancelled}/')
+        self.assertEqual(len(response.data['items']), 2)
+        self.assertIsNotNone(response.data['archived_at'])
+        response = self.client.get(f'{self.url}export/', {'rows': 'items'})
+        self.assertEqual(len(list(csv.reader(b''.join(response.streaming_content).decode('utf-8-sig').splitlines()))), 5)
+
+        self.assertEqual(self.client.post(self.url, {}, format='json').status_code, 405)
+        self.assertEqual(self.client.delete(f'{self.url}{completed}/').status_code, 405)
+        # Arhivirana narudžbina više ne menja status
+        response = self.client.post(f'/api/orders/{completed}/update_status/', {'status': 'processing'}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_archive_does_not_block_product_deletion(self):
+        completed, = self.place('completed')
+        self.archive()
+        flah_id = self.flah.id
+        self.flah.delete()
+
+        item = ArchivedOrderItem.objects.get(order_id=completed, product_id=flah_id)
+        self.assertEqual(item.product_name, 'Flah vučeni')
+        response = self.client.get(f'{self.url}{completed}/')
+        self.assertEqual({row['product'] for row in response.data['items']}, {self.firiket.id, flah_id})
+        response = self.client.get(f'{self.url}export/', {'rows': 'items'})
+        self.assertEqual(len(b''.join(response.streaming_content).decode('utf-8-sig').splitlines()), 3)
+        call_command('rebuild_reports', stdout=StringIO())
+        self.assertTrue(DailyItemSales.objects.filter(product_id=flah_id, quantity=1).exists())
+
+
+class EffectivePriceTests(CatalogFixtureMixin, ShopAPITestCase):
+    """effective_price kolone moraju pratiti current_price / final_price"""
+
+    def setUp(self):
+        super().setUp()
+        self.variant = ProductVariant.objects.create(product=self.flah, name='20×5mm', price_adjustment=Decimal('15'))
+
+    def prices(self):
+        products = dict(Product.objects.values_list('id', 'effective_price'))
+        variants = dict(ProductVariant.objects.values_list('id', 'effective_price'))
+        return products, variants
+
+    def assertInSync(self):
+        products, variants = self.prices()
+        for product in Product.objects.all():
+            self.assertEqual(products[product.id], product.current_price, product.name)
+        for variant in ProductVariant.objects.select_related('product'):
+            self.assertEqual(variants[variant.id], variant.product.current_price + variant.price_adjustment, variant.name)
+
+    def test_save_cascades_to_variants(self):
+        self.assertEqual(self.variant.final_price, Decimal('415'))
+        self.flah.on_sale = False
+        self.flah.save()
+        self.assertInSync()
+        self.assertEqual(self.prices()[1][self.variant.id], Decimal('515'))
+
+        self.flah.sale_price = Decimal('300')
+        self.flah.on_sale = True
+        self.flah.save(update_fields=['on_sale', 'sale_price'])
+        self.assertInSync()
+
+        variant = ProductVariant.objects.get(id=self.variant.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(variant.final_price, Decimal('315'))
+
+    def test_save_without_price_change_skips_variants(self):
+        product = Product.objects.get(id=self.flah.id)
+        product.name = 'Flah'
+        with CaptureQueriesContext(connection) as queries:
+            product.save()
+        self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE "shop_productvariant"')])
+
+    def test_queryset_update(self):
+        # Filter više ne pogađa iste redove posle izmene
+        Product.objects.filter(on_sale=True).update(on_sale=False)
+        self.assertInSync()
+        Product.objects.filter(category=self.cat_profili).update(price=F('price') * 2)
+        self.assertInSync()
+        ProductVariant.objects.filter(product=self.flah).update(price_adjustment=Decimal('-50'))
+        self.assertInSync()
+        self.assertEqual(self.prices()[1][self.variant.id], Decimal('950'))
+
+    def test_bulk_create_and_bulk_update(self):
+        created = Product.objects.bulk_create([
+            Product(name='Novi', description='', price=Decimal('70'), sale_price=Decimal('60'), on_sale=True,
+                    category=self.cat_ukrasni),
+        ])
+        ProductVariant.objects.bulk_create([
+            ProductVariant(product_id=created[0].id, name='A', price_adjustment=Decimal('5')),
+            ProductVariant(product=self.firiket, name='B', price_adjustment=Decimal('1')),
+        ])
+        self.assertInSync()
+
+        self.firiket.price = Decimal('360')
+        Product.objects.bulk_update([self.firiket], ['price'])
+        self.variant.price_adjustment = Decimal('0')
+        ProductVariant.objects.bulk_update([self.variant], ['price_adjustment'])
+        self.assertInSync()
+
+    def test_moving_variant_by_product_id(self):
+        ProductVariant.objects.filter(id=self.variant.id).update(product_id=self.firiket.id)
+        self.assertInSync()
+        self.variant.product_id = self.flah.id
+        ProductVariant.objects.bulk_update([self.variant], ['product_id'])
+        self.assertInSync()
+        variant = ProductVariant.objects.get(id=self.variant.id)
+        variant.product_id = self.firiket.id
+        variant.save(update_fields=['product_id'])
+        self.assertInSync()
+
+    def test_stock_only_save_skips_product(self):
+        variant = ProductVariant.objects.get(id=self.variant.id)
+        variant.stock_quantity = 3
+        with CaptureQueriesContext(connection) as queries:
+            variant.save(update_fields=['stock_quantity'])
+        # Ostali upiti su indeks pretrage (signal), koji ne čita cene
+        self.assertFalse([q for q in queries if 'effective_price' in q['sql']])
+        self.assertEqual(ProductVariant.objects.get(id=self.variant.id).stock_quantity, 3)
+
+    def test_price_change_reaches_cached_list(self):
+        url = '/api/products/'
+        self.assertEqual(self.client.get(url, {'min_price': '380'}).data[0]['max_final_price'], '415.00')
+        Product.objects.filter(id=self.flah.id).update(sale_price=Decimal('390'))
+        row = self.client.get(url, {'min_price': '380'}).data[0]
+        self.assertEqual((row['current_price'], row['min_final_price'], row['max_final_price']),
+                         ('390.00', '405.00', '405.00'))
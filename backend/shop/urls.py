@@ -2,12 +2,16 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     current_user,
+    catalog_cache_stats,
+    admin_stats,
+    sales_report,
     CategoryViewSet,
     SubcategoryViewSet,
     ProductViewSet,
     ProductVariantViewSet,
     ProductImageViewSet,
-    OrderViewSet
+    OrderViewSet,
+    ArchivedOrderViewSet
 )
 
 router = DefaultRouter()
@@ -17,8 +21,12 @@ router.register('products', ProductViewSet, basename='product')
 router.register('product-variants', ProductVariantViewSet, basename='product-variant')
 router.register('product-images', ProductImageViewSet, basename='product-image')
 router.register('orders', OrderViewSet, basename='order')
+router.register('archived-orders', ArchivedOrderViewSet, basename='archived-order')
 
 urlpatterns = [
     path('auth/user/', current_user, name='current_user'),
+    path('cache-stats/', catalog_cache_stats, name='catalog_cache_stats'),
+    path('admin-stats/', admin_stats, name='admin_stats'),
+    path('reports/sales/', sales_report, name='sales_report'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
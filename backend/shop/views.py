@@ -2,19 +2,30 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
-from django.core.mail import send_mail
+from rest_framework.exceptions import NotFound, ValidationError
 from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.template.loader import render_to_string
+from django.db.models import Count, OuterRef, Prefetch, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 
 from .models import (
     Category, Subcategory, Product, ProductVariant,
-    ProductImage, Order, OrderItem
+    ProductImage, Order, OrderItem, ArchivedOrder, ArchivedOrderItem
 )
 from .serializers import (
-    CategorySerializer, SubcategorySerializer, ProductSerializer,
+    CategorySerializer, SubcategorySerializer, ProductSerializer, ProductListSerializer,
     ProductVariantSerializer, ProductImageSerializer,
-    OrderSerializer, OrderCreateSerializer
+    OrderSerializer, OrderSummarySerializer, OrderCreateSerializer, BulkStatusSerializer,
+    ArchivedOrderSerializer, ArchivedOrderSummarySerializer, requested_fields
 )
+from .filters import (
+    OrderFilterBackend, ProductFilterBackend, ProductOrderingFilter, ProductSearchFilter, parse_id_list
+)
+from .pagination import OptionalPageNumberPagination, KeysetPagination, OrderPagination
+from .cache import CatalogCacheMixin, cache_stats, get_cache, get_version, make_cache_key
+from .facets import compute_facets
+from . import export, fastpath, idempotency, orders, precomputed, reports, search, suggest
 
 
 # User info endpoint
@@ -29,20 +40,110 @@ def current_user(request):
     })
 
 
+# Statistika keša kataloga
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def catalog_cache_stats(request):
+    return Response(cache_stats())
+
+
+# Brojači za admin panel
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_stats(request):
+    cache = get_cache()
+    key = f"shop:admin-stats:{get_version('catalog')}:{get_version('orders')}"
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_admin_stats()
+        cache.set(key, stats, getattr(settings, 'SHOP_ADMIN_STATS_CACHE_TIMEOUT', 30))
+    return Response(stats)
+
+
+# Izveštaji prodaje iz dnevnih zbirova (shop.reports)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def sales_report(request):
+    params = reports.SalesReportSerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    return Response(reports.sales_report(**params.validated_data))
+
+
+def compute_admin_stats():
+    """Svi brojači iz četiri agregatna upita"""
+    products = Product.objects.aggregate(
+        total=Count('id'),
+        out_of_stock=Count('id', filter=Q(in_stock=False)),
+        on_sale=Count('id', filter=Q(on_sale=True)),
+    )
+
+    by_status = {
+        code: {'count': 0, 'revenue': fastpath.decimal_str(0)}
+        for code, _ in Order.STATUS_CHOICES
+    }
+    orders_total = 0
+    revenue_total = 0
+    rows = Order.objects.order_by().values('status').annotate(
+        count=Count('id'), revenue=Sum('total_amount')
+    )
+    for row in rows:
+        by_status[row['status']] = {
+            'count': row['count'],
+            'revenue': fastpath.decimal_str(row['revenue'] or 0),
+        }
+        orders_total += row['count']
+        # Otkazane narudžbine ne ulaze u prihod
+        if row['status'] != 'cancelled':
+            revenue_total += row['revenue'] or 0
+
+    return {
+        'categories': Category.objects.count(),
+        'subcategories': Subcategory.objects.count(),
+        'products': products['total'],
+        'out_of_stock': products['out_of_stock'],
+        'on_sale': products['on_sale'],
+        'orders': {
+            'total': orders_total,
+            'revenue': fastpath.decimal_str(revenue_total),
+            'by_status': by_status,
+        },
+    }
+
+
 # Category ViewSet
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'tree']:
             return [permissions.AllowAny()]
         return [IsAdminUser()]
 
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        """Kategorije -> potkategorije sa brojem proizvoda, za početnu stranu"""
+        return self.precomputed_response(
+            request, 'category-tree', precomputed.build_category_tree, namespace='category-tree'
+        )
+
+    def get_queryset(self):
+        return Category.objects.annotate(
+            product_count=Count('products', distinct=True)
+        ).prefetch_related(
+            Prefetch('subcategories', queryset=Subcategory.objects.select_related('category'))
+        )
+
+    def build_list_response(self, request, *args, **kwargs):
+        if not fastpath.is_enabled():
+            return super().build_list_response(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        return Response(fastpath.serialize_categories(queryset))
+
 
 # Subcategory ViewSet
-class SubcategoryViewSet(viewsets.ModelViewSet):
-    queryset = Subcategory.objects.all()
+class SubcategoryViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
+    queryset = Subcategory.objects.select_related('category')
     serializer_class = SubcategorySerializer
 
     def get_permissions(self):
@@ -52,18 +153,142 @@ class SubcategoryViewSet(viewsets.ModelViewSet):
 
 
 # Product ViewSet
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    pagination_class = OptionalPageNumberPagination
+    filter_backends = [ProductFilterBackend, ProductSearchFilter, ProductOrderingFilter]
+    ordering_fields = ['created_at', 'name', 'price', 'effective_price']
+    ordering = ['-created_at', '-id']
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'featured', 'facets', 'suggest']:
             return [permissions.AllowAny()]
         return [IsAdminUser()]
 
+    # Parametri koji ne menjaju skup proizvoda ne ulaze u ključ faceta
+    facet_ignored_params = ['page', 'page_size', 'cursor', 'ordering', 'fields', 'expand']
+
+    def get_cache_key(self, request, **kwargs):
+        if self.action != 'facets':
+            return super().get_cache_key(request, **kwargs)
+        params = request.query_params.copy()
+        for name in self.facet_ignored_params:
+            params.pop(name, None)
+        return make_cache_key(self.cache_namespace, self.basename, self.action, params=params)
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        # Pretraga je skraćena na najrelevantnije; i keširan odgovor to javlja
+        query = ProductSearchFilter().get_query(request)
+        if response.status_code == 200 and search.is_truncated(query):
+            response['X-Search-Truncated'] = str(search.get_limit())
+        return response
+
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """Predlozi dok korisnik kuca: proizvodi, kategorije i dimenzije, bez upita u bazu"""
+        limit = request.query_params.get('limit')
+        try:
+            limit = max(1, min(int(limit), 20)) if limit else None
+        except ValueError:
+            raise ValidationError({'limit': 'Očekuje se ceo broj.'})
+        return Response(suggest.suggest(request.query_params.get('q', ''), limit))
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Facet brojači za trenutne filtere (kategorije, akcija, lager, raspon cena)"""
+        return self.cached_response(
+            lambda request: Response(compute_facets(self.filter_queryset(self.get_queryset()))),
+            request
+        )
+
+    @action(detail=False, methods=['get'])
+    def featured(self, request):
+        """Izdvojeni proizvodi za početnu stranu"""
+        return self.precomputed_response(
+            request, 'featured-products', precomputed.build_featured_products, finalize=fastpath.absolute_media
+        )
+
+    @property
+    def paginator(self):
+        # ?cursor= uključuje keyset paginaciju, ?page/?page_size numerisane strane
+        if not hasattr(self, '_paginator'):
+            if KeysetPagination.cursor_query_param in self.request.query_params:
+                if self.request.query_params.get('ordering'):
+                    raise ValidationError({'ordering': 'Cursor paginacija ne podržava ordering.'})
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = OptionalPageNumberPagination()
+        return self._paginator
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return ProductListSerializer
+        return ProductSerializer
+
+    def build_list_response(self, request, *args, **kwargs):
+        if not fastpath.is_enabled():
+            return super().build_list_response(request, *args, **kwargs)
+
+        # Polja određuje serializer (uključujući ?fields/?expand), redove .values()
+        field_names = list(self.get_serializer().fields)
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        rows = queryset.values(*fastpath.product_columns(field_names))
+
+        page = self.paginate_queryset(rows)
+        data = fastpath.serialize_products(page if page is not None else rows, field_names, request)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def get_queryset(self):
+        if self.action == 'facets':
+            return Product.objects.all()
+
+        queryset = Product.objects.select_related('category', 'subcategory')
+
+        if self.action != 'list':
+            return queryset.prefetch_related('variants', 'images')
+
+        only, expand = requested_fields(self.request)
+        wanted = only | expand
+        queryset = queryset.with_list_summary()
+        for relation in ['variants', 'images']:
+            if relation in wanted:
+                queryset = queryset.prefetch_related(relation)
+        return queryset
+
+
+class ProductBatchMixin:
+    """
+    ?product_ids=1,2,3 vraća redove za više proizvoda jednim upitom,
+    grupisane po proizvodu: {"<product_id>": [...]}
+    """
+
+    def get_product_ids(self):
+        return parse_id_list(self.request.query_params.get('product_ids'), 'product_ids')
+
+    def build_list_response(self, request, *args, **kwargs):
+        product_ids = self.get_product_ids()
+        if product_ids is None:
+            return super().build_list_response(request, *args, **kwargs)
+
+        model = self.get_queryset().model
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            product_id__in=product_ids
+        ).order_by('product_id', *model._meta.ordering)
+        instances = list(queryset)
+        data = self.get_serializer(instances, many=True).data
+
+        grouped = {product_id: [] for product_id in product_ids}
+        for instance, row in zip(instances, data):
+            grouped[instance.product_id].append(row)
+        return Response(grouped)
+
 
 # ProductVariant ViewSet
-class ProductVariantViewSet(viewsets.ModelViewSet):
+class ProductVariantViewSet(ProductBatchMixin, CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = ProductVariant.objects.all()
     serializer_class = ProductVariantSerializer
 
@@ -73,7 +298,7 @@ class ProductVariantViewSet(viewsets.ModelViewSet):
         return [IsAdminUser()]
 
     def get_queryset(self):
-        queryset = ProductVariant.objects.all()
+        queryset = ProductVariant.objects.select_related('product')
         product_id = self.request.query_params.get('product_id')
         if product_id:
             queryset = queryset.filter(product_id=product_id)
@@ -81,7 +306,7 @@ class ProductVariantViewSet(viewsets.ModelViewSet):
 
 
 # ProductImage ViewSet
-class ProductImageViewSet(viewsets.ModelViewSet):
+class ProductImageViewSet(ProductBatchMixin, CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = ProductImage.objects.all()
     serializer_class = ProductImageSerializer
 
@@ -99,88 +324,121 @@ class ProductImageViewSet(viewsets.ModelViewSet):
 
 
 # Order ViewSet
-class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all()
+class OrderListMixin:
+    """
+    Lista i izvoz narudžbina, aktivnih ili arhiviranih: filteri, keyset
+    paginacija i ?summary=1 (bez stavki, sa item_count)
+    """
+    pagination_class = OrderPagination
+    filter_backends = [OrderFilterBackend]
+    item_model = OrderItem
+    summary_serializer_class = OrderSummarySerializer
+
+    def is_summary(self):
+        return self.action == 'list' and self.request.query_params.get('summary') in ('1', 'true')
+
+    def get_queryset(self):
+        if self.is_summary():
+            # Bez stavki; broj stavki je podupit koji se računa samo za redove strane
+            item_count = self.item_model.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+                count=Count('id')
+            ).values('count')
+            return self.queryset.model.objects.annotate(item_count=Coalesce(Subquery(item_count), 0))
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.is_summary():
+            return self.summary_serializer_class
+        return super().get_serializer_class()
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Izvoz za knjigovodstvo, strimovan: ?type=csv|jsonl, ?rows=orders|items,
+        uz iste filtere kao lista (?status, ?date_from, ?date_to...)
+        """
+        table = request.query_params.get('rows', 'orders')
+        fmt = request.query_params.get('type', 'csv')
+        if table not in export.TABLES or fmt not in export.FORMATS:
+            return Response(
+                {'error': f"rows: {', '.join(export.TABLES)}; type: {', '.join(export.FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        queryset = self.filter_queryset(self.queryset.model.objects.all())
+        response = StreamingHttpResponse(export.stream(queryset, table, fmt), content_type=export.FORMATS[fmt])
+        response['Content-Disposition'] = f'attachment; filename="{export.filename(table, fmt)}"'
+        return response
+
+
+class OrderViewSet(OrderListMixin, viewsets.ModelViewSet):
+    queryset = Order.objects.prefetch_related('items')
     serializer_class = OrderSerializer
 
     def get_permissions(self):
-        # Samo admini mogu videti sve narudžbine
-        if self.action in ['list', 'retrieve', 'update', 'partial_update', 'destroy']:
-            return [IsAdminUser()]
-        # CREATE je javno dostupan (korisnici kreiraju narudžbine)
-        return [permissions.AllowAny()]
+        # CREATE je javno dostupan (korisnici kreiraju narudžbine); sve ostalo
+        # (i akcije poput update_status) samo admini
+        if self.action == 'create':
+            return [permissions.AllowAny()]
+        return [IsAdminUser()]
 
     def get_serializer_class(self):
         if self.action == 'create':
             return OrderCreateSerializer
-        return OrderSerializer
+        return super().get_serializer_class()
 
     def create(self, request, *args, **kwargs):
+        # Sa zaglavljem Idempotency-Key ponovljen zahtev dobija prvi odgovor
+        return idempotency.run(request, self.create_order)
+
+    def create_order(self, request):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        # Email vlasniku i SMS-ovi idu u outbox u istoj transakciji; šalje ih process_outbox
         order = serializer.save()
 
-        # Pošalji email notifikaciju vlasniku
-        self.send_order_notification(order)
-
-        # TODO: Pošalji SMS korisniku i vlasniku (implementirati kasnije)
-
-        return Response(
+        response = Response(
             OrderSerializer(order).data,
             status=status.HTTP_201_CREATED
         )
+        return response, order
 
-    def send_order_notification(self, order):
-        """Pošalji email notifikaciju vlasniku o novoj narudžbini"""
-        try:
-            subject = f'Nova narudžbina #{order.id}'
-            message = f"""
-Nova narudžbina je primljena!
-
-Narudžbina: #{order.id}
-Kupac: {order.customer_name}
-Telefon: {order.customer_phone}
-Email: {order.customer_email or 'Nije ostavljen'}
-Ukupno: {order.total_amount} RSD
-
-Stavke:
-"""
-            for item in order.items.all():
-                variant_info = f" ({item.variant_name})" if item.variant_name else ""
-                message += f"- {item.product_name}{variant_info} x{item.quantity} = {item.total_price} RSD\n"
-
-            if order.notes:
-                message += f"\nNapomena kupca: {order.notes}"
-
-            # Email za vlasnike
-            recipient_list = ['office@betapack.co.rs']  # TODO: prebaciti u settings
-
-            send_mail(
-                subject,
-                message,
-                settings.DEFAULT_FROM_EMAIL,
-                recipient_list,
-                fail_silently=True,
-            )
-
-            order.email_sent = True
-            order.save(update_fields=['email_sent'])
-
-        except Exception as e:
-            print(f"Email send error: {e}")
-
-    @action(detail=True, methods=['post'], permission_classes=[IsAdminUser])
+    @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
         """Ažuriraj status narudžbine"""
-        order = self.get_object()
-        new_status = request.data.get('status')
-
-        if new_status in dict(Order.STATUS_CHOICES):
-            order.status = new_status
-            order.save()
-            return Response({'status': 'success', 'new_status': order.status})
-
-        return Response(
-            {'error': 'Invalid status'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
\ No newline at end of file
+        try:
+            order_id = int(pk)
+        except ValueError:
+            raise NotFound
+        # Admin ispravlja jednu narudžbinu: svaki prelaz je dozvoljen, kao i ranije
+        result = orders.change_statuses({order_id: request.data.get('status')}, validate_transitions=False)[0]
+        if result['result'] == 'not_found':
+            raise NotFound
+        if result['result'] in ('updated', 'unchanged'):
+            return Response({'status': 'success', 'new_status': result['to']})
+        return Response({'error': result['error']}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['post'])
+    def bulk_status(self, request):
+        """
+        Promena statusa više narudžbina odjednom; rezultat za svaku narudžbinu
+        (vidi shop.orders.change_statuses), neuspeh jedne ne utiče na ostale
+        """
+        serializer = BulkStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = orders.change_statuses(serializer.validated_data['changes'])
+        return Response({
+            'updated': sum(result['result'] == 'updated' for result in results),
+            'results': results,
+        })
+
+
+class ArchivedOrderViewSet(OrderListMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Arhivirane narudžbine (shop.archive), samo za čitanje: isti filteri,
+    paginacija i izvoz kao /api/orders/
+    """
+    queryset = ArchivedOrder.objects.prefetch_related('items')
+    serializer_class = ArchivedOrderSerializer
+    permission_classes = [IsAdminUser]
+    item_model = ArchivedOrderItem
+    summary_serializer_class = ArchivedOrderSummarySerializer
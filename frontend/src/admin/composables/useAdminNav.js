@@ -11,7 +11,8 @@ export function useAdminNav() {
         { id: 'categories', label: 'Kategorije', icon: '📁' },
         { id: 'subcategories', label: 'Podkategorije', icon: '📂' },
         { id: 'products', label: 'Proizvodi', icon: '📦' },
-        { id: 'orders', label: 'Narudžbine', icon: '🛒' }
+        { id: 'orders', label: 'Narudžbine', icon: '🛒' },
+        { id: 'reports', label: 'Izveštaji', icon: '📊' }
     ]
 
     return { activeView, setView, views }
@@ -1,25 +1,32 @@
 import { defineStore } from 'pinia'
 import { api } from '@/services/api'
+import { useAuthStore } from '@/store/auth'
 
 export const useAdminStatsStore = defineStore('adminStats', {
     state: () => ({
         categories: 0,
         subcategories: 0,
-        products: 0
+        products: 0,
+        outOfStock: 0,
+        onSale: 0,
+        orders: null
     }),
 
     actions: {
         async refresh() {
+            const auth = useAuthStore()
             try {
-                const [cats, subs, prods] = await Promise.all([
-                    api.get('/categories/'),
-                    api.get('/subcategories/'),
-                    api.get('/products/')
-                ])
+                // Jedan agregatni endpoint umesto preuzimanja celih lista
+                const { data } = await api.get('/admin-stats/', {
+                    headers: { Authorization: `Bearer ${auth.accessToken}` }
+                })
 
-                this.categories = cats.data.length
-                this.subcategories = subs.data.length
-                this.products = prods.data.length
+                this.categories = data.categories
+                this.subcategories = data.subcategories
+                this.products = data.products
+                this.outOfStock = data.out_of_stock
+                this.onSale = data.on_sale
+                this.orders = data.orders
 
             } catch (e) {
                 console.error("Greška pri učitavanju brojača:", e)
@@ -13,7 +13,7 @@ export const useProductStore = defineStore('adminProducts', {
         async fetch() {
             this.loading = true
             try {
-                const res = await api.get('products/')
+                const res = await api.get('products/', { params: { expand: 'description' } })
                 this.list = res.data
             } catch (e) {
                 console.error('Greška fetch proizvoda:', e)
@@ -9,9 +9,10 @@ export const useCategoryStore = defineStore('categories', {
     }),
 
     actions: {
+        // Stablo kategorija sa brojem proizvoda, unapred izračunato na serveru
         async fetchCategories() {
             try {
-                const r = await axios.get(`${API_URL}/categories/`)
+                const r = await axios.get(`${API_URL}/categories/tree/`)
                 this.categories = r.data
             } catch (e) {
                 console.error('Greška kategorije:', e)
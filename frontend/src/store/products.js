@@ -2,53 +2,59 @@ import { defineStore } from 'pinia'
 import axios from 'axios'
 
 const API_URL = 'http://127.0.0.1:8000/api'
+export const PAGE_SIZE = 24
+
+let lastRequest = 0
 
 export const useProductStore = defineStore('products', {
     state: () => ({
         products: [],
+        count: 0,
+        // Pretraga je skraćena na ovoliko najrelevantnijih (X-Search-Truncated), null = nije
+        searchLimit: null,
+        featured: [],
+        // Pun proizvod (opis, varijante, slike) po ID-ju, samo za otvorene kartice
+        details: {},
         loading: false
     }),
 
-    getters: {
-        filteredProducts: (state) => (filters) => {
-            let res = [...state.products]
-
-            if (filters.category) {
-                res = res.filter(p => p.category === filters.category)
-            }
-
-            if (filters.search) {
-                const q = filters.search.toLowerCase()
-                res = res.filter(p =>
-                    p.name.toLowerCase().includes(q) ||
-                    p.description.toLowerCase().includes(q) ||
-                    p.category_name.toLowerCase().includes(q)
-                )
-            }
-
-            if (filters.minPrice) {
-                res = res.filter(p => parseFloat(p.current_price) >= filters.minPrice)
-            }
-            if (filters.maxPrice) {
-                res = res.filter(p => parseFloat(p.current_price) <= filters.maxPrice)
+    actions: {
+        // params: category, subcategory, min_price, max_price, on_sale,
+        // featured, in_stock, search, ordering, page, page_size, fields, expand
+        // Filtrira, sortira i deli na strane server; products je tražena strana
+        async fetchProducts(params = {}) {
+            const request = ++lastRequest
+            this.loading = true
+            try {
+                // Kompaktna lista: kartice koriste primary_image i raspon cena varijanti
+                const r = await axios.get(`${API_URL}/products/`, {
+                    params: { page_size: PAGE_SIZE, ...params }
+                })
+                // Odgovor za stare filtere ne sme da pregazi noviji
+                if (request !== lastRequest) return
+                this.products = r.data.results
+                this.count = r.data.count
+                const limit = r.headers['x-search-truncated']
+                this.searchLimit = limit ? parseInt(limit) : null
+            } finally {
+                if (request === lastRequest) this.loading = false
             }
+        },
 
-            if (filters.showOnlyOnSale) {
-                res = res.filter(p => p.on_sale)
+        async fetchProduct(id) {
+            if (!this.details[id]) {
+                const r = await axios.get(`${API_URL}/products/${id}/`)
+                this.details[id] = r.data
             }
+            return this.details[id]
+        },
 
-            return res
-        }
-    },
-
-    actions: {
-        async fetchProducts() {
-            this.loading = true
+        async fetchFeatured() {
             try {
-                const r = await axios.get(`${API_URL}/products/`)
-                this.products = r.data
-            } finally {
-                this.loading = false
+                const r = await axios.get(`${API_URL}/products/featured/`)
+                this.featured = r.data
+            } catch (e) {
+                console.error('Greška izdvojeni proizvodi:', e)
             }
         }
     }